@@ -0,0 +1,139 @@
+"""
+Benchmark codec G.711 và bộ resample dùng cho RTP.
+
+Đo:
+    - throughput mã hóa/giải mã μ-law và A-law (Msample/s, theo gói 20 ms và
+      theo khối lớn), so với audioop nếu Python còn module này
+    - throughput resample AUDIO_RATE <-> 8 kHz theo từng chunk như khi chạy thật
+    - chất lượng: SNR khứ hồi G.711, SNR khứ hồi resample và độ suy giảm tần số
+      trên Nyquist của 8 kHz (alias), so với nội suy tuyến tính (bản cũ)
+Kết quả in ra dạng JSON.
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.codecs --seconds 10
+"""
+import argparse
+import json
+import time
+import warnings
+import numpy as np
+from config.config import config
+from src.resample import StreamResampler, resample
+from src.rtp_codec import PCMA, PCMU
+
+def speech_like(seconds, rate, seed=1):
+    """Tín hiệu thử: vài họa âm điều biên cộng tiếng ồn nhỏ, biên độ kiểu giọng nói"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 4 * t)
+    signal = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((180, 360, 720, 1500, 2900)))
+    signal = 6000 * envelope * signal + rng.normal(0, 200, len(t))
+    return np.clip(signal, -32768, 32767).astype(np.int16).tobytes()
+
+def tone(freq, seconds, rate, amplitude=10000):
+    t = np.arange(int(seconds * rate)) / rate
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.int16).tobytes()
+
+def snr_db(reference, signal):
+    reference = np.frombuffer(reference, dtype=np.int16).astype(np.float64)
+    signal = np.frombuffer(signal, dtype=np.int16).astype(np.float64)[:len(reference)]
+    reference = reference[:len(signal)]
+    noise = np.sum((reference - signal) ** 2)
+    return round(10 * np.log10(np.sum(reference ** 2) / noise), 1) if noise else None
+
+def rms(pcm):
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float64)
+    return float(np.sqrt(np.mean(samples ** 2))) if len(samples) else 0.0
+
+def linear_resample(pcm, src_rate, dst_rate):
+    """Nội suy tuyến tính, không lọc chống alias (cách resample trước đây)"""
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+    count = int(len(samples) * dst_rate / src_rate)
+    positions = np.arange(count) * (src_rate / dst_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.int16).tobytes()
+
+def throughput(function, chunks, samples):
+    """Msample/s khi gọi function lần lượt trên mọi chunk"""
+    start = time.perf_counter()
+    for chunk in chunks:
+        function(chunk)
+    return round(samples / (time.perf_counter() - start) / 1e6, 2)
+
+def split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+def codec_report(args):
+    audioop = None
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        try:
+            import audioop
+        except ImportError:
+            pass
+
+    pcm = speech_like(args.seconds, 8000)
+    samples = len(pcm) // 2
+    packet = 8000 * config.RTP_PACKET_MS // 1000
+    report = {}
+    for codec, reference in ((PCMU, 'ulaw'), (PCMA, 'alaw')):
+        payload = codec.encode(pcm)
+        result = {
+            'encode_packet_msamples_s': throughput(codec.encode, split(pcm, 2 * packet), samples),
+            'decode_packet_msamples_s': throughput(codec.decode, split(payload, packet), samples),
+            'encode_block_msamples_s': throughput(codec.encode, split(pcm, 2 * args.block), samples),
+            'decode_block_msamples_s': throughput(codec.decode, split(payload, args.block), samples),
+            'round_trip_snr_db': snr_db(pcm, codec.decode(payload)),
+        }
+        if audioop is not None:
+            lin2x = getattr(audioop, f'lin2{reference}')
+            x2lin = getattr(audioop, f'{reference}2lin')
+            result['matches_audioop'] = (payload == lin2x(pcm, 2)
+                                         and codec.decode(payload) == x2lin(payload, 2))
+            result['audioop_encode_packet_msamples_s'] = throughput(
+                lambda chunk: lin2x(chunk, 2), split(pcm, 2 * packet), samples)
+            result['audioop_decode_packet_msamples_s'] = throughput(
+                lambda chunk: x2lin(chunk, 2), split(payload, packet), samples)
+        report[codec.name] = result
+    return report
+
+def resample_report(args):
+    rate = config.AUDIO_RATE
+    pcm = speech_like(args.seconds, rate)
+    samples = len(pcm) // 2
+    report = {}
+
+    # Hướng bot -> caller: chunk TTS ở AUDIO_RATE; hướng caller -> bot: từng gói 20 ms ở 8 kHz
+    down = StreamResampler(rate, 8000)
+    report[f'{rate}_to_8000_msamples_s'] = throughput(down.process, split(pcm, 2 * args.block), samples)
+    narrow = resample(pcm, rate, 8000)
+    up = StreamResampler(8000, rate)
+    report[f'8000_to_{rate}_msamples_s'] = throughput(
+        up.process, split(narrow, 2 * 8000 * config.RTP_PACKET_MS // 1000), len(narrow) // 2)
+
+    # Khứ hồi chỉ so được phần dưới 4 kHz: lọc tham chiếu bằng chính đường xuống/lên
+    band_limited = resample(resample(pcm, rate, 8000), 8000, rate)
+    report['round_trip_snr_db'] = snr_db(band_limited, resample(resample(band_limited, rate, 8000), 8000, rate))
+    report['linear_round_trip_snr_db'] = snr_db(
+        band_limited, linear_resample(linear_resample(band_limited, rate, 8000), 8000, rate))
+
+    # Tone 5 kHz không biểu diễn được ở 8 kHz: sau khi hạ rate phải gần như biến mất (thay vì thành alias 3 kHz)
+    alias = tone(5000, 1.0, rate)
+    for name, function in (('alias_rejection_db', resample), ('linear_alias_rejection_db', linear_resample)):
+        residue = rms(function(alias, rate, 8000))
+        report[name] = round(20 * np.log10(rms(alias) / residue), 1) if residue else None
+    return report
+
+def main(args):
+    report = {
+        'seconds': args.seconds,
+        'block_samples': args.block,
+        'codecs': codec_report(args),
+        'resample': resample_report(args),
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark codec G.711 và resample")
+    parser.add_argument('--seconds', type=float, default=10.0, help="Độ dài audio thử (giây)")
+    parser.add_argument('--block', type=int, default=4096, help="Số sample mỗi khối khi đo theo khối lớn")
+    main(parser.parse_args())
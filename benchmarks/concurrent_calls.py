@@ -0,0 +1,165 @@
+"""
+Benchmark số cuộc gọi đồng thời cho RTPServer.
+
+Tạo N caller giả lập, mỗi caller có socket UDP và SSRC riêng, gửi một đoạn
+"tiếng nói" rồi im lặng theo nhịp thời gian thực. Server trả lời mỗi utterance
+bằng một đoạn audio ngắn. Kết quả in ra dạng JSON.
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.concurrent_calls --calls 200 --turns 2
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import statistics
+import struct
+import time
+from config.config import config
+from src.rtp_handler import build_rtp_header
+from src.rtp_codec import CODECS, Encoder, get_codec
+from src.rtp_server import RTPServer
+
+def make_chunk(chunk_size, amplitude):
+    """Một chunk PCM 16-bit: sóng sin 440 Hz (amplitude > 0) hoặc im lặng"""
+    samples = [int(amplitude * math.sin(2 * math.pi * 440 * i / config.AUDIO_RATE))
+               for i in range(chunk_size)]
+    return struct.pack(f'<{chunk_size}h', *samples)
+
+class CallerProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.reply_packets = 0
+        self.listen_from = None     # Chỉ tính phản hồi tới sau lúc này (hết tiếng nói của lượt)
+        self.first_reply_time = None
+        self.last_reply_time = None
+
+    def datagram_received(self, data, addr):
+        now = time.perf_counter()
+        self.reply_packets += 1
+        if self.listen_from is None or now < self.listen_from:
+            return
+        self.last_reply_time = now
+        if self.first_reply_time is None:
+            self.first_reply_time = now
+
+async def run_caller(server_addr, codec, speech_chunk, silence_chunk, args, results):
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        CallerProtocol, local_addr=(config.RTP_LOCAL_IP, 0))
+    ssrc = random.getrandbits(32)
+    seq = random.getrandbits(16)
+    timestamp = random.getrandbits(32)
+    packet_time = config.AUDIO_CHUNK / config.AUDIO_RATE
+    next_send = time.perf_counter()
+
+    async def send(chunk):
+        nonlocal seq, timestamp, next_send
+        transport.sendto(build_rtp_header(seq, timestamp, ssrc, payload_type=codec.payload_type) + chunk,
+                         server_addr)
+        seq = (seq + 1) & 0xFFFF
+        timestamp = (timestamp + codec.samples(chunk)) & 0xFFFFFFFF
+        next_send += packet_time
+        await asyncio.sleep(max(0, next_send - time.perf_counter()))
+
+    try:
+        for _ in range(args.turns):
+            protocol.listen_from = None
+            protocol.first_reply_time = None
+            protocol.last_reply_time = None
+            for _ in range(args.speech_chunks):
+                await send(speech_chunk)
+            last_speech_time = time.perf_counter()
+            protocol.listen_from = last_speech_time
+
+            # Như một cuộc gọi thật, caller vẫn gửi im lặng trong lúc chờ và nghe phản hồi;
+            # lượt sau chỉ bắt đầu khi phản hồi đã dứt reply_gap giây (không nói đè lên bot)
+            deadline = last_speech_time + args.reply_timeout
+            while time.perf_counter() < deadline:
+                await send(silence_chunk)
+                if (protocol.last_reply_time is not None
+                        and time.perf_counter() - protocol.last_reply_time > args.reply_gap):
+                    break
+
+            if protocol.first_reply_time is not None:
+                results['reply_latency'].append(protocol.first_reply_time - last_speech_time)
+            else:
+                results['missed_replies'] += 1
+        results['reply_packets'] += protocol.reply_packets
+    finally:
+        transport.close()
+
+async def measure_loop_lag(stop, lags):
+    """Đo độ trễ của event loop bằng một ticker 10 ms"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - start - 0.01)
+
+async def main(args):
+    reply = make_chunk(config.AUDIO_CHUNK * args.reply_chunks // 2, 1000)
+
+    async def on_utterance(session, audio_data, stt_stream):
+        await asyncio.sleep(args.processing_delay)
+        await session.send_audio(reply)
+
+    server = RTPServer(config.RTP_LOCAL_IP, args.port, on_utterance,
+                       chunk_size=config.AUDIO_CHUNK, sample_rate=config.AUDIO_RATE,
+                       max_calls=args.calls)
+    await server.start()
+
+    # Mỗi gói mang AUDIO_CHUNK sample tại AUDIO_RATE, mã hóa bằng codec của caller
+    codec = get_codec(args.codec)
+    speech_chunk = Encoder(codec, config.AUDIO_RATE).encode(make_chunk(config.AUDIO_CHUNK, 3000))
+    silence_chunk = codec.silence_payload(codec.samples(speech_chunk))
+    results = {'reply_latency': [], 'missed_replies': 0, 'reply_packets': 0}
+    lags = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lags))
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(
+        run_caller((config.RTP_LOCAL_IP, args.port), codec, speech_chunk, silence_chunk, args, results)
+        for _ in range(args.calls)
+    ))
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    stop.set()
+    await lag_task
+    server.close()
+
+    latency = sorted(results['reply_latency'])
+    report = {
+        'calls': args.calls,
+        'codec': codec.name,
+        'turns_per_call': args.turns,
+        'wall_time_s': round(wall, 3),
+        'cpu_time_s': round(cpu, 3),
+        'cpu_percent': round(100 * cpu / wall, 1),
+        'replies': len(latency),
+        'missed_replies': results['missed_replies'],
+        'reply_packets': results['reply_packets'],
+        'invalid_packets': server.invalid_packets,
+        'rejected_packets': server.rejected_packets,
+        'reply_latency_p50_ms': round(1000 * statistics.median(latency), 1) if latency else None,
+        'reply_latency_p95_ms': round(1000 * latency[int(0.95 * (len(latency) - 1))], 1) if latency else None,
+        'loop_lag_max_ms': round(1000 * max(lags), 1) if lags else None,
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark nhiều cuộc gọi RTP đồng thời")
+    parser.add_argument('--calls', type=int, default=100, help="Số caller đồng thời")
+    parser.add_argument('--turns', type=int, default=1, help="Số lượt nói mỗi caller")
+    parser.add_argument('--speech-chunks', type=int, default=20, help="Số chunk tiếng nói mỗi lượt")
+    parser.add_argument('--reply-chunks', type=int, default=10, help="Độ dài phản hồi (chunk)")
+    parser.add_argument('--processing-delay', type=float, default=0.2,
+                        help="Thời gian xử lý giả lập (STT + LLM + TTS), giây")
+    parser.add_argument('--codec', choices=list(CODECS), default=config.RTP_CODECS[0])
+    parser.add_argument('--reply-timeout', type=float, default=10.0)
+    parser.add_argument('--reply-gap', type=float, default=0.5,
+                        help="Phản hồi coi như đã dứt sau chừng này giây không nhận gói nào")
+    parser.add_argument('--port', type=int, default=config.BOT_PORT + 100)
+    asyncio.run(main(parser.parse_args()))
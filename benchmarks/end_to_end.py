@@ -0,0 +1,282 @@
+"""
+Benchmark end-to-end cho RTPBot, chạy offline hoàn toàn.
+
+STT, LLM (Dify) và TTS được thay bằng server giả lập (benchmarks.stub_servers,
+chạy ở process riêng để CPU của chúng không tính vào bot) với độ trễ lấy từ
+phân phối cấu hình được. N caller gửi các file WAV (hoặc một đoạn tone tổng
+hợp) vào RTPBot qua RTP loopback theo nhịp thời gian thực, rồi gửi im lặng cho
+tới khi nghe hết phản hồi.
+
+Với mỗi mức số cuộc gọi đồng thời, đo:
+    - độ trễ phía caller: từ gói tiếng nói cuối tới gói phản hồi đầu tiên
+      (gồm cả thời gian chờ im lặng của VAD)
+    - độ trễ từng mốc phía bot từ lúc hết tiếng nói (đọc từ file trace JSONL)
+    - CPU mỗi cuộc gọi (CPU của process gồm bot và các caller)
+Mức cao nhất mà không mất phản hồi và p95 của rtp_first_packet không vượt
+--max-p95-ms là số cuộc gọi đồng thời tối đa duy trì được. Kết quả in ra dạng
+JSON (và ghi vào --report nếu có) để so sánh giữa các commit.
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.end_to_end --calls 1,10,50,100 --turns 2 --wav samples/*.wav
+    python -m benchmarks.end_to_end --calls 10 --search --max-calls 400
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from config.config import config
+from benchmarks import stub_servers
+from src.load_generator import LoadGenerator, NetworkImpairment, load_corpus, percentile, summarize
+from src.rtp_codec import CODECS, get_codec
+
+async def measure_loop_lag(stop, lags):
+    """Đo độ trễ của event loop bằng một ticker 10 ms"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - start - 0.01)
+
+class TraceReader:
+    """Đọc các lượt mới được ghi vào file trace JSONL của bot"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding='utf-8') as f:
+            f.seek(self.offset)
+            data = f.read()
+            self.offset = f.tell()
+        return [json.loads(line) for line in data.splitlines() if line]
+
+def stage_report(records):
+    """Percentile độ trễ từng mốc (ms từ speech_end) của các lượt trả lời xong"""
+    from src.tracing import STAGES
+
+    stages = {}
+    for record in records:
+        if record['status'] != 'ok':
+            continue
+        for stage, ms in record['latency_ms'].items():
+            stages.setdefault(stage, []).append(ms / 1000)
+    return {stage: summarize(stages[stage]) for stage in STAGES[1:] if stage in stages}
+
+def upload_report(records):
+    """Kích thước upload STT của các lượt (trước và sau khi cắt im lặng/resample/mã hóa)"""
+    uploads = [record['info']['stt_upload'] for record in records if 'stt_upload' in record.get('info', {})]
+    if not uploads:
+        return None
+    original = sum(upload['original_bytes'] for upload in uploads)
+    sent = sum(upload['sent_bytes'] for upload in uploads)
+    return {
+        'requests': len(uploads),
+        'format': uploads[0]['format'],
+        'mean_original_bytes': original // len(uploads),
+        'mean_sent_bytes': sent // len(uploads),
+        'saved_percent': round(100 * (original - sent) / original, 1) if original else None,
+        'trimmed': summarize([upload['trimmed_ms'] for upload in uploads], scale=1),
+    }
+
+def pipeline_report():
+    """Hàng đợi giữa các stage của mỗi cuộc gọi (cộng dồn từ đầu benchmark)"""
+    from src.pipeline import metrics
+
+    return metrics.report()
+
+async def run_level(bot, calls, load, args, trace):
+    lags = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lags))
+    invalid, rejected = bot.server.invalid_packets, bot.server.rejected_packets
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    results = await load.run(calls)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    stop.set()
+    await lag_task
+
+    # Chờ bot ghi xong trace của các lượt cuối
+    await asyncio.sleep(args.cooldown)
+    records = trace.read()
+    statuses = {}
+    for record in records:
+        statuses[record['status']] = statuses.get(record['status'], 0) + 1
+    stages = stage_report(records)
+    first_packet_p95 = stages.get('rtp_first_packet', {}).get('p95_ms')
+
+    lags.sort()
+    level = {
+        'calls': calls,
+        'wall_time_s': round(wall, 3),
+        'cpu_time_s': round(cpu, 3),
+        'cpu_percent': round(100 * cpu / wall, 1),
+        'cpu_ms_per_call_second': round(1000 * cpu / (calls * wall), 2),
+        **results.report(),
+        'invalid_packets': bot.server.invalid_packets - invalid,
+        'rejected_packets': bot.server.rejected_packets - rejected,
+        'turn_status': statuses,
+        'stages': stages,
+        'stt_upload': upload_report(records),
+        'pipeline': pipeline_report(),
+        'loop_lag_p99_ms': round(1000 * percentile(lags, 99), 1) if lags else None,
+        'loop_lag_max_ms': round(1000 * lags[-1], 1) if lags else None,
+    }
+    level['sustainable'] = (
+        level['missed_replies'] == 0
+        and level['rejected_packets'] == 0
+        and first_packet_p95 is not None
+        and first_packet_p95 <= args.max_p95_ms
+    )
+    return level
+
+def stub_argv(args):
+    """Các tham số của stub_servers, chuyển tiếp nguyên giá trị cho process con"""
+    parser = argparse.ArgumentParser()
+    stub_servers.add_arguments(parser)
+    return [f"--{name.replace('_', '-')}={getattr(args, name)}" for name in vars(parser.parse_args([]))]
+
+async def start_stubs(args):
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, '-m', 'benchmarks.stub_servers', *stub_argv(args), '--until-stdin-eof',
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+    line = await asyncio.wait_for(process.stdout.readline(), timeout=30)
+    if line.strip() != b'ready':
+        raise RuntimeError("Không khởi động được stub servers")
+    return process
+
+def configure(args, trace_file, max_calls):
+    """Trỏ bot vào các stub; phải gọi trước khi import các module đọc config lúc import"""
+    config.STT_PROVIDER = "local"
+    config.TTS_PROVIDER = "local"
+    config.BOT_TYPE = "dify"
+    # Stub STT chỉ có API nhận cả file, không có websocket
+    config.STT_STREAMING = "incremental" if args.stt_streaming else None
+    config.BOT_PORT = args.port
+    config.MAX_CALLS = max_calls
+    config.TTS_CACHE_DIR = None      # Không dùng kho TTS trên đĩa giữa các lần chạy
+    config.TRACING = True
+    config.TRACE_FILE = trace_file
+    config.TRACE_METRICS_FILE = None
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def main(args):
+    levels = sorted({int(calls) for calls in args.calls.split(',')})
+    trace_dir = tempfile.TemporaryDirectory()
+    trace_file = os.path.join(trace_dir.name, 'turns.jsonl')
+    # Session của mức trước còn giữ tới khi hết RTP_SESSION_TIMEOUT
+    configure(args, trace_file, max_calls=args.max_calls * 2 + args.warmup)
+
+    from rtp_bot import RTPBot
+
+    stubs = await start_stubs(args)
+    bot = RTPBot()
+    quiet = open(os.devnull, 'w') if not args.verbose else None
+    load = LoadGenerator((config.RTP_LOCAL_IP, config.BOT_PORT), load_corpus(args.wav), turns=args.turns,
+                         codec=get_codec(args.codec),
+                         impairment=NetworkImpairment(args.jitter_ms, args.loss, args.reorder, args.seed),
+                         ramp=args.ramp, reply_timeout=args.reply_timeout, reply_gap=args.reply_gap,
+                         seed=args.seed)
+    trace = TraceReader(trace_file)
+    report = {
+        'commit': git_commit(),
+        'utterances': len(load.utterances),
+        'turns_per_call': args.turns,
+        'codec': args.codec,
+        'stt_streaming': config.STT_STREAMING,
+        'network': {'jitter_ms': args.jitter_ms, 'loss': args.loss, 'reorder': args.reorder},
+        'stubs': dict(arg.lstrip('-').split('=', 1) for arg in stub_argv(args)),
+        'max_p95_ms': args.max_p95_ms,
+        'levels': [],
+        'max_sustainable_calls': 0,
+    }
+
+    try:
+        # Log từng lượt của bot tốn CPU khi có hàng trăm cuộc gọi: mặc định bỏ đi
+        with contextlib.redirect_stdout(quiet) if quiet else contextlib.nullcontext():
+            bot_task = asyncio.create_task(bot.run())
+            while bot.server.sock is None:
+                await asyncio.sleep(0.05)
+            # Lượt khởi động: kết nối tới stub, cache TTS các câu cố định, regex đã compile
+            if args.warmup:
+                await run_level(bot, args.warmup, load, args, trace)
+
+            calls = levels[0]
+            while calls <= args.max_calls:
+                level = await run_level(bot, calls, load, args, trace)
+                report['levels'].append(level)
+                print(f"{calls} cuộc gọi: rtp_first_packet p95="
+                      f"{level['stages'].get('rtp_first_packet', {}).get('p95_ms')}ms "
+                      f"missed={level['missed_replies']} cpu={level['cpu_percent']}%",
+                      file=sys.stderr)
+                if not level['sustainable']:
+                    break
+                report['max_sustainable_calls'] = calls
+                remaining = [c for c in levels if c > calls]
+                if remaining:
+                    calls = remaining[0]
+                elif args.search:
+                    calls *= 2
+                else:
+                    break
+    finally:
+        bot.is_running = False
+        with contextlib.suppress(asyncio.CancelledError):
+            await bot_task
+        stubs.terminate()
+        await stubs.wait()
+        trace_dir.cleanup()
+        if quiet:
+            quiet.close()
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    print(output)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark end-to-end RTPBot với STT/LLM/TTS giả lập")
+    parser.add_argument('--calls', default='1,10,50', help="Các mức số cuộc gọi đồng thời, phân cách bằng dấu phẩy")
+    parser.add_argument('--search', action='store_true',
+                        help="Sau mức cuối, nhân đôi số cuộc gọi tới khi không còn duy trì được")
+    parser.add_argument('--max-calls', type=int, default=1000, help="Giới hạn trên khi --search")
+    parser.add_argument('--max-p95-ms', type=float, default=1500,
+                        help="p95 tối đa của speech_end -> rtp_first_packet để coi là duy trì được")
+    parser.add_argument('--turns', type=int, default=2, help="Số lượt nói mỗi caller")
+    parser.add_argument('--wav', nargs='*', default=[], help="Các file WAV 16-bit (hoặc thư mục) làm câu nói của caller")
+    parser.add_argument('--codec', choices=list(CODECS), default=config.RTP_CODECS[0], help="Codec RTP của caller")
+    parser.add_argument('--stt-streaming', action='store_true', help="Bật STT incremental trong lúc caller nói")
+    parser.add_argument('--jitter-ms', type=float, default=0, help="Jitter mạng giả lập phía caller (ms)")
+    parser.add_argument('--loss', type=float, default=0.0, help="Tỉ lệ mất gói giả lập")
+    parser.add_argument('--reorder', type=float, default=0.0, help="Tỉ lệ gói tới sai thứ tự giả lập")
+    parser.add_argument('--ramp', type=float, default=1.0, help="Các caller bắt đầu trong khoảng này (giây)")
+    parser.add_argument('--reply-timeout', type=float, default=15.0)
+    parser.add_argument('--reply-gap', type=float, default=0.5,
+                        help="Không nhận gói nào trong khoảng này (giây) thì coi là hết phản hồi")
+    parser.add_argument('--cooldown', type=float, default=1.0, help="Nghỉ giữa các mức (giây)")
+    parser.add_argument('--warmup', type=int, default=1, help="Số cuộc gọi khởi động (không tính kết quả)")
+    parser.add_argument('--port', type=int, default=config.BOT_PORT + 200)
+    parser.add_argument('--report', help="Ghi báo cáo JSON vào file này")
+    parser.add_argument('--verbose', action='store_true', help="Giữ log từng lượt của bot")
+    stub_servers.add_arguments(parser)
+    # SIGTERM (timeout, kill) đi qua các khối finally như Ctrl-C để dừng stub; nếu process vẫn
+    # bị giết cứng thì stub tự dừng khi pipe stdin của nó đóng
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,76 @@
+"""
+Đo thời gian khởi động (cold start) khi import entry point của bot.
+
+Mỗi lần đo chạy một process Python mới với `-X importtime`, lấy thời gian
+import tổng, các module import chậm nhất và những module nặng (openai,
+underthesea, websockets, pyaudio...) đã bị import sớm. Kết quả in ra dạng JSON
+để so sánh giữa các commit.
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.startup --module main --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ["openai", "underthesea", "websockets", "pyaudio", "pydub", "httpx", "numpy"]
+
+def parse_importtime(stderr):
+    """{module: (self_us, cumulative_us)} từ output của -X importtime"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+def run_once(module):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, env=env)
+    elapsed = time.perf_counter() - start
+    if result.returncode:
+        raise RuntimeError(f"import {module} lỗi:\n{result.stderr[-2000:]}")
+    return elapsed, parse_importtime(result.stderr)
+
+def main(args):
+    walls = []
+    imports = []
+    for _ in range(args.runs):
+        wall, modules = run_once(args.module)
+        walls.append(wall)
+        imports.append(modules)
+
+    # Lần chạy có tổng thời gian import ở mức trung vị
+    totals = [modules.get(args.module, (0, 0))[1] for modules in imports]
+    median_run = imports[totals.index(sorted(totals)[len(totals) // 2])]
+    slowest = sorted(median_run.items(), key=lambda item: item[1][1], reverse=True)
+
+    report = {
+        "module": args.module,
+        "runs": args.runs,
+        "process_wall_ms": round(statistics.median(walls) * 1000, 1),
+        "import_ms": round(statistics.median(totals) / 1000, 1),
+        "modules_imported": len(median_run),
+        "heavy_loaded": {
+            name: round(median_run[name][1] / 1000, 1) for name in HEAVY_MODULES if name in median_run
+        },
+        "slowest": [
+            {"module": name, "cumulative_ms": round(cumulative / 1000, 1), "self_ms": round(self_us / 1000, 1)}
+            for name, (self_us, cumulative) in slowest[:args.top]
+        ],
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Đo thời gian import entry point của bot")
+    parser.add_argument('--module', default="main", help="Module cần import (main, rtp_bot...)")
+    parser.add_argument('--runs', type=int, default=5, help="Số process đo")
+    parser.add_argument('--top', type=int, default=15, help="Số module chậm nhất in ra")
+    main(parser.parse_args())
@@ -0,0 +1,249 @@
+"""
+Server giả lập STT, LLM (Dify) và TTS local cho benchmark offline.
+
+Lắng nghe đúng các endpoint trong config (STT_API_URL, DIFY_API_URL,
+TTS_WEBSOCKET_URL) và trả lời theo đúng giao thức mà SpeechProcessor,
+DifyBotClient và TTSWebSocket đang dùng. Độ trễ của mỗi service lấy từ một
+phân phối cấu hình được, với seed cố định để các lần chạy so sánh được:
+    fixed:0.1               luôn 100 ms
+    uniform:0.05:0.2        đều trong [50, 200] ms
+    lognormal:0.12:0.4      trung vị 120 ms, sigma 0.4
+
+Chạy riêng (in "ready" khi đã lắng nghe):
+    python -m benchmarks.stub_servers --stt-latency lognormal:0.15:0.3
+Với --until-stdin-eof, process tự dừng khi stdin đóng (process cha đã thoát,
+kể cả khi bị kill), để không bỏ lại stub giữ các port.
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import math
+import random
+import struct
+import sys
+import uuid
+import wave
+from urllib.parse import urlsplit
+from config.config import config
+
+def parse_latency(spec):
+    """Chuỗi phân phối -> hàm sample(rng) trả về số giây"""
+    kind, *params = spec.split(':')
+    params = [float(p) for p in params]
+    if kind == 'fixed':
+        return lambda rng: params[0]
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == 'lognormal':
+        median, sigma = params
+        return lambda rng: median * math.exp(rng.gauss(0, sigma))
+    raise ValueError(f"Phân phối không hỗ trợ: {spec}")
+
+REPLY_SENTENCES = [
+    "Dạ, tôi đã ghi nhận yêu cầu của anh chị.",
+    "Đơn hàng sẽ được giao trong vòng ba ngày làm việc.",
+    "Anh chị có cần hỗ trợ thêm thông tin gì không ạ?",
+]
+
+class StubServers:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.stt_latency = parse_latency(args.stt_latency)
+        self.llm_latency = parse_latency(args.llm_latency)
+        self.tts_latency = parse_latency(args.tts_latency)
+        self.requests = {'stt': 0, 'llm': 0, 'tts': 0}
+        # Một giây tiếng ồn dùng lại cho mọi câu (không tốn CPU sinh audio mỗi request)
+        self._noise = struct.pack(f'<{config.AUDIO_RATE}h',
+                                  *(self.rng.randint(-500, 500) for _ in range(config.AUDIO_RATE)))
+        self._servers = []
+
+    # ---- HTTP tối giản (keep-alive, body theo Content-Length) ----
+
+    async def _handle_http(self, reader, writer, handler):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                body = await reader.readexactly(length) if length else b''
+                method = request_line.split(b' ', 1)[0].decode()
+                if method == 'HEAD':
+                    writer.write(b'HTTP/1.1 200 OK\r\ncontent-length: 0\r\n\r\n')
+                    await writer.drain()
+                    continue
+                await handler(body, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _write_json(writer, data):
+        payload = json.dumps(data, ensure_ascii=False).encode()
+        writer.write(b'HTTP/1.1 200 OK\r\ncontent-type: application/json\r\n'
+                     b'content-length: %d\r\n\r\n' % len(payload) + payload)
+
+    @staticmethod
+    def _audio_seconds(body):
+        """Độ dài file WAV trong body multipart; định dạng khác thì ước lượng theo PCM 16 kHz"""
+        start = body.find(b'RIFF')
+        if start >= 0:
+            try:
+                with wave.open(io.BytesIO(body[start:]), 'rb') as wav_file:
+                    return wav_file.getnframes() / wav_file.getframerate()
+            except (wave.Error, EOFError):
+                pass
+        return len(body) / (2 * 16000)
+
+    async def _stt(self, body, writer):
+        """POST STT_API_URL: transcript phụ thuộc độ dài audio (deterministic), thời gian xử lý theo độ dài"""
+        self.requests['stt'] += 1
+        seconds = self._audio_seconds(body)
+        await asyncio.sleep(self.stt_latency(self.rng) + seconds * self.args.stt_rtf)
+        self._write_json(writer, {'transcription': f"cho tôi hỏi về đơn hàng dài {seconds:.1f} giây"})
+        await writer.drain()
+
+    def _reply(self):
+        # Câu đầu khác nhau mỗi lượt để TTS cache không che mất độ trễ tới audio đầu tiên
+        sentences = [f"Mã tra cứu của anh chị là {self.rng.randrange(10**6):06d}."]
+        sentences += REPLY_SENTENCES[:self.args.reply_sentences]
+        return " ".join(sentences)
+
+    async def _dify(self, body, writer):
+        """POST DIFY_API_URL: response_mode blocking hoặc streaming (server-sent events)"""
+        self.requests['llm'] += 1
+        request = json.loads(body or b'{}')
+        conversation_id = request.get('conversation_id') or str(uuid.uuid4())
+        answer = self._reply()
+        await asyncio.sleep(self.llm_latency(self.rng))
+        if request.get('response_mode') != 'streaming':
+            self._write_json(writer, {'answer': answer, 'conversation_id': conversation_id})
+            await writer.drain()
+            return
+
+        writer.write(b'HTTP/1.1 200 OK\r\ncontent-type: text/event-stream\r\n'
+                     b'transfer-encoding: chunked\r\n\r\n')
+        for word in answer.split(' '):
+            event = {'event': 'message', 'answer': word + ' ', 'conversation_id': conversation_id}
+            self._write_chunk(writer, f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode())
+            await writer.drain()
+            await asyncio.sleep(self.args.llm_token_interval)
+        self._write_chunk(writer, f"data: {json.dumps({'event': 'message_end'})}\n\n".encode())
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    @staticmethod
+    def _write_chunk(writer, data):
+        writer.write(b'%x\r\n' % len(data) + data + b'\r\n')
+
+    # ---- TTS websocket ----
+
+    def _speech(self, text):
+        """PCM tại AUDIO_RATE, dài tts_ms_per_char mỗi ký tự (tiếng ồn nhỏ, không phải im lặng)"""
+        size = 2 * (config.AUDIO_RATE * self.args.tts_ms_per_char * len(text) // 1000)
+        while len(self._noise) < size:
+            self._noise += self._noise
+        return self._noise[:size]
+
+    async def _tts(self, websocket):
+        """
+        Mỗi request trả về các segment {index, total, audio_base64}. Các request
+        trên cùng kết nối được tổng hợp song song nhưng trả lời đúng thứ tự nhận
+        (giống server local có nhiều worker).
+        """
+        previous = None
+        tasks = set()
+        async for message in websocket:
+            self.requests['tts'] += 1
+            task = asyncio.ensure_future(self._synthesize(websocket, json.loads(message), previous))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            previous = task
+        for task in tasks:
+            task.cancel()
+
+    async def _synthesize(self, websocket, request, previous):
+        pcm = self._speech(request.get('text', ''))
+        total = max(1, self.args.tts_segments)
+        size = -(-len(pcm) // total) or 1
+        await asyncio.sleep(self.tts_latency(self.rng))
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        for index in range(total):
+            segment = pcm[index * size:(index + 1) * size]
+            await websocket.send(json.dumps({
+                'index': index,
+                'total': total,
+                'status': 'success',
+                'audio_base64': base64.b64encode(segment).decode(),
+            }))
+            if index < total - 1:
+                await asyncio.sleep(self.args.tts_segment_interval)
+
+    async def start(self):
+        import websockets
+
+        for url, handler in ((config.STT_API_URL, self._stt), (config.DIFY_API_URL, self._dify)):
+            parts = urlsplit(url)
+            server = await asyncio.start_server(
+                lambda r, w, handler=handler: self._handle_http(r, w, handler),
+                parts.hostname, parts.port)
+            self._servers.append(server)
+
+        parts = urlsplit(config.TTS_WEBSOCKET_URL)
+        self._servers.append(await websockets.serve(self._tts, parts.hostname, parts.port, max_size=None))
+
+    def close(self):
+        for server in self._servers:
+            server.close()
+
+def add_arguments(parser):
+    parser.add_argument('--stt-latency', default='lognormal:0.15:0.3', help="Phân phối độ trễ STT (giây)")
+    parser.add_argument('--stt-rtf', type=float, default=0.1,
+                        help="Thời gian xử lý STT thêm vào mỗi giây audio nhận được (real-time factor)")
+    parser.add_argument('--llm-latency', default='lognormal:0.35:0.3', help="Độ trễ tới token đầu của LLM")
+    parser.add_argument('--llm-token-interval', type=float, default=0.02, help="Giây giữa hai token LLM")
+    parser.add_argument('--tts-latency', default='lognormal:0.12:0.3', help="Độ trễ tới segment đầu của TTS")
+    parser.add_argument('--tts-segments', type=int, default=2, help="Số segment audio mỗi request TTS")
+    parser.add_argument('--tts-segment-interval', type=float, default=0.05)
+    parser.add_argument('--tts-ms-per-char', type=int, default=60, help="Độ dài audio TTS mỗi ký tự (ms)")
+    parser.add_argument('--reply-sentences', type=int, default=2, help="Số câu cố định trong mỗi phản hồi LLM")
+    parser.add_argument('--seed', type=int, default=1)
+
+async def wait_stdin_eof():
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    await reader.read()
+
+async def serve(args):
+    servers = StubServers(args)
+    await servers.start()
+    print("ready", flush=True)
+    try:
+        if args.until_stdin_eof:
+            await wait_stdin_eof()
+        else:
+            await asyncio.Event().wait()
+    finally:
+        servers.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Server giả lập STT/LLM/TTS cho benchmark offline")
+    add_arguments(parser)
+    parser.add_argument('--until-stdin-eof', action='store_true', help="Dừng khi stdin đóng (chạy bởi benchmark)")
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,223 @@
+"""
+Benchmark throughput của TextNormalizer so với bản cũ (chép nguyên văn bên dưới).
+
+Đo số câu/giây cho: bản cũ, bản mới khi cache miss (mỗi câu là câu mới) và
+bản mới khi cache hit (bot lặp lại câu đã gặp). Kết quả in ra dạng JSON.
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.text_normalizer --sentences 20000
+"""
+import argparse
+import json
+import re
+import time
+from datetime import datetime
+from underthesea import text_normalize as TTSnorm
+from src.text_normalizer import TextNormalizer, _normalize_cached
+
+SAMPLES = [
+    "Xin chào! Tôi có thể giúp gì cho bạn hôm nay? 😀",
+    "Giá gói cước là 1.500.000đ, giảm 20% còn 1.200.000 VNĐ.",
+    "Lịch hẹn của bạn là 8h30 ngày 05/03/2024, vui lòng đến sớm 15 phút.",
+    "Bạn có thể gọi tổng đài 0912 345 678 để được hỗ trợ 24/7.",
+    "Lãi suất hiện tại là 6,5% một năm, kỳ hạn 12 tháng...",
+    "Dịch vụ AI của chúng tôi phục vụ hơn 2500 khách hàng ⭐⭐⭐",
+    "Đơn hàng số 102 sẽ được giao trong 3 ngày làm việc.",
+    "Cảm ơn bạn đã liên hệ, chúc bạn một ngày tốt lành! ❤️",
+]
+
+# ---- Bản cũ (trước khi compile pattern và mở rộng đọc số) ----
+class LegacyTextNormalizer:
+    # Định nghĩa các từ điển chuyển đổi số
+    DIGITS = {
+        '0': 'không', '1': 'một', '2': 'hai', '3': 'ba', '4': 'bốn',
+        '5': 'năm', '6': 'sáu', '7': 'bảy', '8': 'tám', '9': 'chín'
+    }
+    
+    TENS = {
+        '1': 'mười',
+        '2': 'hai mươi',
+        '3': 'ba mươi',
+        '4': 'bốn mươi',
+        '5': 'năm mươi',
+        '6': 'sáu mươi',
+        '7': 'bảy mươi',
+        '8': 'tám mươi',
+        '9': 'chín mươi'
+    }
+
+    @staticmethod
+    def number_to_words(number):
+        """Convert a number to Vietnamese words"""
+        if not isinstance(number, str):
+            number = str(number)
+            
+        # Xử lý số có 1 chữ số
+        if len(number) == 1:
+            return LegacyTextNormalizer.DIGITS[number]
+            
+        # Xử lý số có 2 chữ số
+        if len(number) == 2:
+            if number[0] == '1':
+                if number[1] == '0':
+                    return 'mười'
+                if number[1] == '5':
+                    return 'mười lăm'
+                return f"mười {LegacyTextNormalizer.DIGITS[number[1]]}"
+            
+            if number[1] == '0':
+                return LegacyTextNormalizer.TENS[number[0]]
+            if number[1] == '5':
+                return f"{LegacyTextNormalizer.TENS[number[0]]} lăm"
+            return f"{LegacyTextNormalizer.TENS[number[0]]} {LegacyTextNormalizer.DIGITS[number[1]]}"
+            
+        # Với số lớn hơn, có thể thêm xử lý tùy nhu cầu
+        return number
+
+    @staticmethod
+    def convert_date(match):
+        """Convert date string to words"""
+        date_str = match.group(0)
+        try:
+            # Hỗ trợ cả định dạng / và -
+            if '/' in date_str:
+                date = datetime.strptime(date_str, '%d/%m/%Y')
+            else:
+                date = datetime.strptime(date_str, '%d-%m-%Y')
+                
+            day = LegacyTextNormalizer.number_to_words(date.day)
+            month = LegacyTextNormalizer.number_to_words(date.month)
+            year = LegacyTextNormalizer.number_to_words(date.year)
+            
+            return f"ngày {day} tháng {month} năm {year}"
+        except:
+            return date_str
+
+    @staticmethod
+    def normalize_numbers(text):
+        """Convert number strings like "02" to words"""
+        # Xử lý ngày tháng trước
+        text = re.sub(r'\b\d{2}[-/]\d{2}[-/]\d{4}\b', LegacyTextNormalizer.convert_date, text)
+        
+        # Sau đó xử lý các số riêng lẻ
+        def convert_number(match):
+            num = match.group(0)
+            # Bỏ các số 0 ở đầu
+            num = str(int(num))
+            return LegacyTextNormalizer.number_to_words(num)
+            
+        # Tìm và thay thế các số
+        text = re.sub(r'\b\d+\b', convert_number, text)
+        return text
+    
+    @staticmethod
+    def normalize_punctuation(text):
+        """Add spaces before punctuation and normalize multiple punctuation"""
+        text = re.sub(r'([.,!?])', r' \1', text)  # Add space before punctuation
+        text = re.sub(r'\s+([.,!?])', r' \1', text)  # Remove extra spaces
+        text = re.sub(r'\.+', '.', text)  # Replace multiple dots
+        text = re.sub(r'!+', '!', text)  # Replace multiple exclamation marks
+        text = re.sub(r'\?+', '?', text)  # Replace multiple question marks
+        return text.strip()
+
+    @staticmethod
+    def remove_emojis(text):
+        """Remove emojis and special characters from text"""
+        # Pattern để match emoji và một số ký tự đặc biệt
+        emoji_pattern = re.compile("["
+            u"\U0001F600-\U0001F64F"  # emoticons
+            u"\U0001F300-\U0001F5FF"  # symbols & pictographs
+            u"\U0001F680-\U0001F6FF"  # transport & map symbols
+            u"\U0001F1E0-\U0001F1FF"  # flags (iOS)
+            u"\U00002702-\U000027B0"
+            u"\U000024C2-\U0001F251"
+            "]+", flags=re.UNICODE)
+        return emoji_pattern.sub('', text)
+
+    @staticmethod
+    def normalize_vietnamese_text(text):
+        """Normalize Vietnamese text for TTS"""
+        # Loại bỏ emoji và ký tự đặc biệt
+        text = LegacyTextNormalizer.remove_emojis(text)
+        
+        # Chuẩn hóa cơ bản với underthesea
+        text = TTSnorm(text)
+        
+        # Xử lý số và ngày tháng
+        text = LegacyTextNormalizer.normalize_numbers(text)
+        
+        # Xử lý dấu câu
+        text = LegacyTextNormalizer.normalize_punctuation(text)
+        
+        # Các thay thế đặc biệt
+        replacements = {
+            '"': '',
+            "'": '',
+            "AI": "Ây Ai",
+            "A.I": "Ây Ai",
+            "…": "...",  # Thêm xử lý cho dấu ba chấm
+            "️": "",     # Loại bỏ variation selector
+            "⭐": "",    # Loại bỏ ngôi sao
+            "★": "",     # Loại bỏ ngôi sao khác dạng
+            "☆": "",     # Loại bỏ ngôi sao rỗng
+            "♥": "",     # Loại bỏ trái tim
+            "❤": "",     # Loại bỏ trái tim khác dạng
+        }
+        
+        for old, new in replacements.items():
+            text = text.replace(old, new)
+            
+        # Loại bỏ khoảng trắng thừa
+        text = ' '.join(text.split())
+        return text.strip()
+
+    @staticmethod
+    def check_end_conversation(text):
+        """Check if text contains end conversation marker"""
+        if "##END##" in text:
+            # Remove the marker and return cleaned text and True flag
+            return text.replace("##END##", "").strip(), True
+        return text, False 
+def make_corpus(count):
+    """count câu khác nhau (thêm số thứ tự để mọi câu đều là cache miss)"""
+    return [f"{SAMPLES[i % len(SAMPLES)]} Mã {i}." for i in range(count)]
+
+def measure(normalize, corpus):
+    start = time.perf_counter()
+    for text in corpus:
+        normalize(text)
+    elapsed = time.perf_counter() - start
+    return round(len(corpus) / elapsed, 1)
+
+def main(args):
+    corpus = make_corpus(args.sentences)
+
+    legacy = measure(LegacyTextNormalizer.normalize_vietnamese_text, corpus)
+    uncached = measure(TextNormalizer._normalize, corpus)
+
+    # Cache hit: các câu lặp lại của bot (chào hỏi, xác nhận)
+    _normalize_cached.cache_clear()
+    repeated = [SAMPLES[i % len(SAMPLES)] for i in range(args.sentences)]
+    cached = measure(TextNormalizer.normalize_vietnamese_text, repeated)
+
+    report = {
+        'sentences': args.sentences,
+        'legacy_per_s': legacy,
+        'compiled_per_s': uncached,
+        'cached_per_s': cached,
+        'compiled_speedup': round(uncached / legacy, 2),
+        'cached_speedup': round(cached / legacy, 2),
+        'samples': [
+            {'input': text,
+             'legacy': LegacyTextNormalizer.normalize_vietnamese_text(text),
+             'compiled': TextNormalizer.normalize_vietnamese_text(text)}
+            for text in SAMPLES[:args.show]
+        ],
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark throughput của TextNormalizer")
+    parser.add_argument('--sentences', type=int, default=20000, help="Số câu mỗi lượt đo")
+    parser.add_argument('--show', type=int, default=3, help="Số câu mẫu in kèm kết quả")
+    main(parser.parse_args())
@@ -8,28 +8,105 @@ class Config:
     AUDIO_FORMAT = "paInt16" #8
     AUDIO_CHANNELS = 1
     AUDIO_RATE = 24000
-    SILENCE_THRESHOLD = 300 # Giảm ngưỡng để nhạy hơn với âm thanh
-    SILENCE_CHUNKS = 60# Số chunk im lặng để dừng khi đã phát hiện tiếng nói (khoảng 2s thì dừng)
-    INITIAL_SILENCE_CHUNKS = 80 # Thời gian chờ ban đầu (khoảng 3-4s thì dừng)
+    AUDIO_INPUT_BUFFER_SECONDS = 5  # Ring buffer microphone của AudioDevice
+    AUDIO_OUTPUT_BUFFER_SECONDS = 2  # Ring buffer phát của AudioDevice
+    SILENCE_THRESHOLD = 300 # Ngưỡng biên độ cố định của VAD_MODE "energy"
+    VAD_MODE = "adaptive"  # "adaptive" (theo noise floor từng cuộc gọi), "energy" (ngưỡng cố định) hoặc "webrtc"
+    VAD_FRAME_MS = 20  # Độ dài frame VAD: 10, 20 hoặc 30 ms
+    VAD_AGGRESSIVENESS = 3  # Mức 0-3 cho webrtcvad
+    VAD_MIN_LEVEL = 100  # Biên độ trung bình tối thiểu để bắt đầu tiếng nói, dù nền yên tĩnh tới đâu
+    VAD_ONSET_DB = 9  # Tiếng nói bắt đầu khi cao hơn noise floor chừng này dB
+    VAD_OFFSET_DB = 5  # Đang nói thì chỉ cần cao hơn noise floor chừng này dB (hysteresis)
+    VAD_HANGOVER_MS = 100  # Giữ trạng thái tiếng nói thêm sau frame to cuối cùng
+    VAD_NOISE_WINDOW_MS = 2000  # Noise floor là mức thấp nhất trong khoảng này
+    ENDPOINT_SILENCE_MS = 500  # Im lặng sau tiếng nói (sau hangover) để kết thúc lượt nói
+    ENDPOINT_SHORT_SILENCE_MS = 250  # Rút ngắn khi transcript tạm là câu trọn vẹn và được ngữ điệu hoặc partial trước xác nhận
+    ENDPOINT_MIN_WORDS = 3  # Transcript tạm ngắn hơn chừng này từ không đủ tin cậy để rút ngắn
+    ENDPOINT_PROSODY_MS = 400  # Độ dài đoạn cuối tiếng nói dùng để xét ngữ điệu, 0 để tắt
+    NO_SPEECH_TIMEOUT_MS = 3500  # Chế độ microphone/RTPUser: không nói gì trong khoảng này thì dừng
+    CAPTURE_PRE_ROLL_MS = 300 # Audio giữ lại trước chunk có tiếng nói đầu tiên
+    MAX_UTTERANCE_MS = 15000 # Utterance dài hơn bị cắt thành nhiều đoạn gửi STT
     MAX_CONVERSATION_TIME = 300 # Thời gian tối đa cho mỗi cuộc trò chuyện (khoảng 5 phút)
+    BARGE_IN = True  # Cho phép người dùng ngắt lời bot đang nói
+    BARGE_IN_MIN_SPEECH_MS = 200  # Tiếng nói liên tục tối thiểu để coi là ngắt lời
+    BARGE_IN_THRESHOLD = 600  # Ngưỡng biên độ khi loa đang phát, cao hơn để tránh tiếng vọng (webrtc: cổng năng lượng)
 
     # Text-to-Speech Settings
     TTS_PROVIDER = "openai" #local
-    # TTS_VOICE = "nu-calm.wav"
+    TTS_VOICE = "nu-calm.wav"
     TTS_OPENAI_VOICE = "alloy"
     TTS_LANGUAGE = "vi"
+    TTS_OPENAI_SAMPLE_RATE = 24000  # response_format="pcm" của OpenAI: 16-bit mono 24 kHz
+    TTS_STREAM_CHUNK_BYTES = 4800  # Đọc body TTS theo từng 100 ms audio
+    TTS_WS_MAX_PENDING = 4  # Số request được gửi nối tiếp trên websocket TTS local
+    TTS_WS_RECONNECT_DELAY = 0.5  # Giây, nhân đôi sau mỗi lần kết nối lỗi
+    TTS_WS_MAX_RECONNECT_DELAY = 10
+    TTS_WS_CONNECT_ATTEMPTS = 5
+    PLAYBACK_QUEUE_CHUNKS = 50  # Số chunk PCM tối đa chờ phát
+
+    # TTS cache: LRU trong bộ nhớ + kho PCM trên đĩa (đọc qua mmap)
+    TTS_CACHE_MEMORY_BYTES = 64 * 1024 * 1024  # Dung lượng tối đa của LRU trong bộ nhớ
+    TTS_CACHE_DIR = "cache/tts"  # Thư mục kho trên đĩa, None để tắt
+    TTS_CACHE_DISK_BYTES = 256 * 1024 * 1024  # Dung lượng tối đa của kho trên đĩa, xóa file ít dùng nhất khi vượt
+    TTS_CACHE_DISK_MIN_USES = 3  # Câu được hỏi tới từng này lần mới ghi xuống đĩa (câu tổng hợp trước luôn ghi)
+    TTS_CACHE_USE_ENTRIES = 10000  # Số câu tối đa được đếm số lần dùng
+    TTS_PRERENDER_PHRASES = [  # Các câu cố định được tổng hợp trước khi khởi động
+        "Xin lỗi, tôi đang gặp sự cố kỹ thuật.",
+        "Sorry, I encountered an error while processing your request.",
+        "Xin chào, tôi có thể giúp gì cho bạn?",
+        "Cảm ơn bạn đã gọi, tạm biệt.",
+    ]
 
     # Speech-to-Text Settings
     STT_PROVIDER = "openai" #local
     STT_LANGUAGE = "vi"
     STT_MODEL = "whisper-1"
+    # STT streaming: "websocket" (server ASR streaming), "incremental" hoặc None (gửi cả utterance sau khi nói xong).
+    # "incremental" gửi lại toàn bộ phần đã nói sau mỗi STT_PARTIAL_INTERVAL_MS và mỗi lần chuyển sang im lặng:
+    # transcript sẵn sàng sớm hơn nhưng lượng audio gửi đi tăng theo bình phương độ dài utterance và số
+    # request mỗi lượt tăng vài lần, nên chỉ được dùng với STT_PROVIDER "local" (OpenAI tính tiền theo audio)
+    STT_STREAMING = None
+    STT_WEBSOCKET_URL = "ws://localhost:38000/asr/stream/?en=false"
+    STT_PARTIAL_INTERVAL_MS = 1000  # Chế độ incremental: nhận dạng lại sau mỗi 1s tiếng nói mới
+    STT_FINAL_TIMEOUT = 5  # Số giây chờ transcript cuối từ websocket
+    STT_SAMPLE_RATE = 16000  # Sample rate gửi cho STT (Whisper và ASR local xử lý ở 16 kHz)
+    STT_UPLOAD_FORMAT = "wav"  # "wav", "flac" hoặc "opus" (flac/opus cần cài soundfile)
+    STT_TRIM_SILENCE = True  # Cắt im lặng đầu/cuối utterance theo VAD trước khi gửi STT
+    STT_TRIM_PADDING_MS = 200  # Audio giữ lại quanh phần có tiếng nói khi cắt
 
     # Chatbot Settings
     END_CONVERSATION_KEYWORDS = ["tạm biệt", "goodbye", "bye", "kết thúc"]
+    SENTENCE_MIN_CHARS = 8  # Câu ngắn hơn sẽ được gộp với câu sau trước khi đưa vào TTS
+    TEXT_NORMALIZER_CACHE_SIZE = 4096  # Số câu đã chuẩn hóa được giữ trong LRU cache
+    MEMORY_TOKEN_BUDGET = 2000  # Số token lịch sử tối đa gửi cho LLM mỗi lượt
+    MEMORY_COMPACT_TOKENS = 1200  # Lịch sử vượt mức này thì tóm tắt các lượt cũ ở background
+    MEMORY_KEEP_RECENT_TOKENS = 500  # Số token các lượt gần nhất được giữ nguyên văn khi tóm tắt
+    MEMORY_SUMMARY_MAX_TOKENS = 200  # Độ dài tối đa của bản tóm tắt
+    MEMORY_SUMMARY_MODEL = None  # Model dùng để tóm tắt, None thì dùng GPT_MODEL
+    MEMORY_MAX_TOKENS = 4000  # Lịch sử giữ trong bộ nhớ mỗi cuộc gọi, phần cũ hơn bị bỏ
+    CHAT_SESSION_TTL = 600  # Giây không có lượt hội thoại nào thì xóa session chatbot
+    CHAT_SESSIONS_MAX = 1000  # Số session chatbot tối đa trong process
+    CHAT_SESSIONS_MAX_TOKENS = 2000000  # Tổng token lịch sử tối đa của mọi session
+    CHAT_SESSION_SWEEP_INTERVAL = 10  # Giây giữa hai lần dọn session hết hạn (kể cả khi không có cuộc gọi mới)
     
     # OpenAI config
     GPT_MODEL = 'gpt-4o-mini'  # hoặc model bạn đang sử dụng
     OPENAI_API_KEY = 'key'
+    OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+    # Đo độ trễ từng mốc của mỗi lượt hội thoại
+    TRACING = True
+    TRACE_FILE = "logs/turns.jsonl"  # Mỗi lượt một dòng JSON, None để tắt
+    TRACE_METRICS_FILE = "logs/callbot.prom"  # Histogram dạng Prometheus (textfile collector), None để tắt
+    TRACE_METRICS_INTERVAL = 5  # Giây giữa hai lần ghi lại file metrics
+    TRACE_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10)  # Giây
+
+    # HTTP transport dùng chung cho các provider
+    HTTP_TIMEOUT = 30  # Timeout đọc/ghi mỗi request (giây)
+    HTTP_CONNECT_TIMEOUT = 5  # Timeout mở kết nối (giây)
+    HTTP_MAX_CONNECTIONS_PER_HOST = 100  # Số kết nối đồng thời tối đa tới mỗi host
+    HTTP_MAX_KEEPALIVE_PER_HOST = 20  # Số kết nối keep-alive giữ lại cho mỗi host
+    HTTP_KEEPALIVE_EXPIRY = 60  # Giây giữ kết nối rảnh trước khi đóng
 
     # Dify config
     DIFY_API_URL = "http://127.0.0.1:25001/v1/chat-messages"
@@ -46,6 +123,31 @@ class Config:
     # Port settings
     USER_PORT = 5002               # Port user gửi/nhận
     BOT_PORT = 5006               # Port bot gửi/nhận
+
+    # Multi-call RTP server
+    MAX_CALLS = 500               # Số cuộc gọi đồng thời tối đa mỗi process
+    RTP_SESSION_TIMEOUT = 30      # Số giây không nhận gói nào thì đóng cuộc gọi
+    RTP_RECV_BUFFER = 4 * 1024 * 1024  # SO_RCVBUF của socket RTP (byte)
+    RTP_MAX_PACKET_SIZE = 2048    # Kích thước buffer nhận (byte), gói lớn hơn bị cắt
+    UTTERANCE_BUFFER_SAMPLES = 4 * 24000  # Dung lượng ban đầu của buffer utterance (tự tăng khi cần)
+    RTP_PACKET_MS = 20            # Thời lượng audio mỗi gói RTP gửi đi (ms)
+    RTP_PACER_MAX_LATE = 0.2      # Trễ quá số giây này thì pacer đặt lại lịch thay vì gửi dồn
+    RTP_CODECS = ["PCMU", "PCMA", "PCM16"]  # Codec nhận theo thứ tự ưu tiên; codec đầu tiên dùng khi chủ động gửi
+    RTP_PCM16_PAYLOAD_TYPE = 96   # Payload type động của PCM 16-bit little-endian tại AUDIO_RATE (định dạng nội bộ cũ)
+    RESAMPLE_TAPS = 32            # Số hệ số mỗi pha của bộ lọc resample (nhiều hơn: ít alias hơn, tốn CPU hơn)
+
+    # Pipeline theo stage của mỗi cuộc gọi (hàng đợi có giới hạn giữa các stage)
+    PIPELINE_AUDIO_QUEUE_MS = 1000  # Audio đã nhận chờ stage VAD tối đa; đầy thì bỏ frame cũ nhất
+    PIPELINE_SENTENCE_QUEUE = 4   # Số câu chờ giữa các stage LLM -> chuẩn hóa -> TTS
+    PIPELINE_MAX_BUFFERED_MS = 3000  # Audio phản hồi xếp sẵn trong pacer tối đa; TTS chờ khi vượt
+
+    # Jitter buffer chiều nhận
+    JITTER_MIN_DEPTH = 2          # Số gói tối thiểu chờ gói bị thiếu trước khi coi là mất
+    JITTER_MAX_DEPTH = 10         # Số gói tối đa (giới hạn độ trễ thêm vào)
+    PLC_MAX_REPEATS = 3           # Số lần lặp frame trước khi chuyển sang comfort noise
+    JITTER_SLOTS = 64             # Số ô lưu payload cấp phát trước trong jitter buffer
+    JITTER_RESYNC_PACKETS = 100   # Sequence nhảy quá chừng này gói (tới hoặc lùi) thì đồng bộ lại luồng
+    COMFORT_NOISE_LEVEL = 30      # Biên độ (độ lệch chuẩn) của comfort noise
     
     # Audio settings
     AUDIO_CHUNK = 1024            # Chunk size phải giống nhau
@@ -0,0 +1 @@
+# Thư mục gốc của repo vào sys.path để tests import được config và src như khi chạy bot
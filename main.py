@@ -1,88 +1,135 @@
 import asyncio
+import threading
 import time
+from contextlib import aclosing
 from src.audio_handler import AudioHandler
+from src.endpointer import Endpointer
 from src.speech_processor import SpeechProcessor
 from src.chatbot_client import ChatbotClient
-import websockets
-import json
-import base64
-import io
-from openai import OpenAI
+from src.chat_session import chat_sessions
+from src.tts_client import TTSClient
 from config.config import config
 from src.text_normalizer import TextNormalizer
-import sys
-import os
-
-# Khởi tạo OpenAI client
-client = OpenAI(api_key=config.OPENAI_API_KEY)
+from src.sentence_stream import prefetch
+from src.http_transport import transport, provider_urls
+from src.tts_websocket import tts_websocket
+from src.playback import PlaybackQueue
+from src import clients
+from src import tracing
 
 # Khởi tạo các handler với config
 audio_handler = AudioHandler(
     chunk=config.AUDIO_CHUNK,
     channels=config.AUDIO_CHANNELS,
     rate=config.AUDIO_RATE,
-    silence_threshold=config.SILENCE_THRESHOLD,
-    silence_chunks=config.SILENCE_CHUNKS,
-    initial_silence_chunks=config.INITIAL_SILENCE_CHUNKS
+    silence_ms=config.ENDPOINT_SILENCE_MS,
+    no_speech_timeout_ms=config.NO_SPEECH_TIMEOUT_MS
 )
 speech_processor = SpeechProcessor()
 chatbot = ChatbotClient(config)
+# Chế độ microphone chỉ có một cuộc hội thoại
+CALL_ID = "local"
+tts_client = TTSClient(sample_rate=config.AUDIO_RATE)
 
-async def text_to_speech(text: str):
+async def text_to_speech(text: str, playback):
+    """Xếp audio của một câu vào hàng đợi phát, trả về số byte đã xếp"""
+    queued = 0
     try:
-        if config.TTS_PROVIDER == "openai":
-            # Gọi API OpenAI TTS với cú pháp mới
-            # response = client.audio.speech.create(
-            #     model="tts-1",
-            #     voice=config.TTS_OPENAI_VOICE,
-            #     input=text
-            # )
-            
-            # # Lấy audio data
-            # audio_data = io.BytesIO(response.content)
-            # audio_handler.play_audio(audio_data)
-            audio_handler.play_audio(text)
-        else:
-            async with websockets.connect(config.TTS_WEBSOCKET_URL) as websocket:
-                request_data = {
-                    "text": text,
-                    "language": config.TTS_LANGUAGE,
-                    "sample_file": config.TTS_VOICE
-                }
-                await websocket.send(json.dumps(request_data))
-                
-                while True:
-                    try:
-                        response = await websocket.recv()
-                        data = json.loads(response)
-                        
-                        if "error" in data:
-                            print(f"Lỗi: {data['error']}")
-                            break
-                            
-                        if data.get("status") == "error":
-                            print(f"Lỗi xử lý câu: {data.get('error')}")
-                            continue
-                            
-                        audio_bytes = base64.b64decode(data["audio_base64"])
-                        audio_handler.play_audio(audio_bytes)
-                        
-                        if data["index"] == data["total"] - 1:
-                            break
-                            
-                    except websockets.exceptions.ConnectionClosed:
-                        print("Kết nối WebSocket bị đóng")
-                        break
-                    
+        # Xếp từng chunk PCM vào hàng đợi phát ngay khi về tới: câu/segment kế tiếp
+        # được tổng hợp trong lúc chunk trước đang phát; cache hit không gọi TTS provider
+        async for pcm in tts_client.stream(text):
+            await playback.put(pcm)
+            queued += len(pcm)
     except Exception as e:
         print(f"Lỗi khi xử lý text-to-speech: {e}")
+    return queued
+
+def prepare_tts_text(text_normalizer, text):
+    """Chuẩn hóa một câu trước khi đưa vào TTS"""
+    normalized = text_normalizer.normalize_vietnamese_text(text)
+    return normalized.replace('!','.').replace(' .','.').replace("?","").replace(" ,",",")
+
+async def speak_response(user_text, text_normalizer, playback, spoken):
+    """
+    Phát từng câu ngay khi LLM sinh xong, trả về True nếu bot yêu cầu kết thúc.
+    spoken nhận (câu, vị trí byte kết thúc của câu trong audio đã xếp phát).
+    """
+    should_end = False
+    queued = 0
+    # aclosing để hủy luôn request LLM khi bị ngắt lời
+    async with aclosing(prefetch(chatbot.stream_response(user_text, chat_sessions.get(CALL_ID)), "llm")) as sentences:
+        async for sentence in sentences:
+            # Kiểm tra marker kết thúc hội thoại
+            sentence, end = text_normalizer.check_end_conversation(sentence)
+            should_end = should_end or end
+            
+            # Chuẩn hóa text trước khi đưa vào TTS
+            normalized_sentence = prepare_tts_text(text_normalizer, sentence)
+            if not normalized_sentence:
+                continue
+            tracing.mark("normalized")
+            print(f"Bot: {normalized_sentence}")
+            queued += await text_to_speech(normalized_sentence, playback)
+            spoken.append((sentence, queued))
+
+    # Chờ phát hết trước khi ghi âm lượt tiếp theo
+    await playback.drain()
+    await asyncio.to_thread(audio_handler.device.drain)
+    return should_end
+
+async def respond(user_text, text_normalizer, playback):
+    """
+    Phát phản hồi trong khi vẫn nghe microphone để người dùng có thể ngắt lời.
+    Trả về (bot yêu cầu kết thúc, các chunk tiếng nói nếu người dùng ngắt lời).
+    """
+    spoken = []
+    if not config.BARGE_IN:
+        return await speak_response(user_text, text_normalizer, playback, spoken), None
+
+    played_from = audio_handler.device.played_bytes
+    stop = threading.Event()
+    speaker = asyncio.ensure_future(speak_response(user_text, text_normalizer, playback, spoken))
+    listener = asyncio.ensure_future(asyncio.to_thread(audio_handler.listen_for_barge_in, stop))
+    try:
+        await asyncio.wait([speaker, listener], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        stop.set()
+    barge_frames = await listener
+    if speaker.done():
+        return speaker.result(), barge_frames
+
+    # Người dùng ngắt lời: dừng LLM/TTS, bỏ audio chưa phát
+    played = audio_handler.device.played_bytes - played_from
+    speaker.cancel()
+    await asyncio.gather(speaker, return_exceptions=True)
+    playback.clear()
+    audio_handler.device.clear_output()
+
+    # Lịch sử chỉ giữ những câu đã phát hết
+    heard = [sentence for sentence, end in spoken if end <= played]
+    chatbot.record_interruption(" ".join(heard), chat_sessions.get(CALL_ID))
+    print("Người dùng ngắt lời bot")
+    return False, barge_frames
+
+def print_partial(text, is_final):
+    if not is_final and text:
+        print(f"... {text}")
 
 async def main():
     print("Bot đang lắng nghe... (Im lặng 5 giây sẽ kết thúc)")
     text_normalizer = TextNormalizer()
+    # Import module nặng trong thread song song với việc mở sẵn kết nối
+    await asyncio.gather(asyncio.to_thread(clients.preload), transport.prewarm(provider_urls()))
+    await tts_client.prerender(config.TTS_PRERENDER_PHRASES,
+                               normalize=lambda text: prepare_tts_text(text_normalizer, text))
+
+    # Stream loa mở sẵn cho cả cuộc hội thoại, phát qua hàng đợi bất đồng bộ
+    await asyncio.to_thread(audio_handler.device.start)
+    playback = PlaybackQueue(audio_handler.device.write)
     
     try:
         start_time = time.time()  # Bắt đầu đếm thời gian
+        barge_frames = None  # Phần đầu câu người dùng nói khi ngắt lời bot
         
         while True:
             # Kiểm tra thời gian
@@ -98,41 +145,68 @@ async def main():
             print(f"\n============================")
             print(f"Thời gian còn lại: {int(remaining_time)} giây")
             
-            audio_data = audio_handler.record_audio()
+            # Ghi âm ở thread riêng, đẩy từng chunk vào STT streaming ngay khi thu được
+            loop = asyncio.get_running_loop()
+            # Transcript tạm trọn câu giúp endpointer kết thúc lượt nói sớm hơn
+            endpointer = Endpointer(config.AUDIO_RATE)
+            def on_partial(text, is_final):
+                print_partial(text, is_final)
+                if stt_stream.covers_speech():
+                    endpointer.on_transcript(text)
+            stt_stream = speech_processor.open_stream(on_partial=on_partial)
+            on_chunk = None
+            if stt_stream:
+                on_chunk = lambda data, is_speech: loop.call_soon_threadsafe(stt_stream.feed, data, is_speech)
+            audio_data = await asyncio.to_thread(audio_handler.record_audio, on_chunk, barge_frames, endpointer)
+            barge_frames = None
             
             if audio_data is None:
+                if stt_stream:
+                    await stt_stream.aclose()
                 print("Không phát hiện tiếng nói, kết thúc cuộc hội thoại.")
                 break
             
-            user_text = await speech_processor.speech_to_text(audio_data)
-            print(f"Bạn: {user_text}")
-            
-            if not user_text:
-                continue
-            
-            if chatbot.should_end_conversation(user_text):
-                print("Kết thúc cuộc hội thoại.")
-                break
-            
-            bot_response = await chatbot.get_response(user_text)
-            
-            # Kiểm tra marker kết thúc hội thoại
-            bot_response, should_end = text_normalizer.check_end_conversation(bot_response)
-            
-            # Chuẩn hóa text trước khi đưa vào TTS
-            normalized_response = text_normalizer.normalize_vietnamese_text(bot_response)
-            normalized_response = normalized_response.replace('!','.').replace(' .','.').replace("?","").replace(" ,",",")
-            normalized_response = normalized_response.replace('.',',',1)
-            print(f"Bot: {normalized_response}")
-            await text_to_speech(normalized_response)
-            
-            if should_end:
-                print("Bot yêu cầu kết thúc cuộc hội thoại.")
-                break
+            # Lượt hội thoại tính từ lúc phát hiện hết tiếng nói; các task tạo ra từ đây nhận turn qua contextvar
+            turn = tracing.tracer.begin(CALL_ID)
+            token = tracing.current_turn.set(turn)
+            audio_handler.device.on_play = lambda: turn.mark("audio_played")
+            status = "error"
+            try:
+                if stt_stream:
+                    user_text = await stt_stream.finish()
+                else:
+                    user_text = await speech_processor.speech_to_text(audio_data)
+                print(f"Bạn: {user_text}")
+                
+                if not user_text:
+                    status = "empty"
+                    continue
+                
+                if chatbot.should_end_conversation(user_text):
+                    status = "ok"
+                    print("Kết thúc cuộc hội thoại.")
+                    break
+                
+                should_end, barge_frames = await respond(user_text, text_normalizer, playback)
+                status = "interrupted" if barge_frames else "ok"
+                
+                if should_end:
+                    print("Bot yêu cầu kết thúc cuộc hội thoại.")
+                    break
+            finally:
+                tracing.current_turn.reset(token)
+                audio_handler.device.on_play = None
+                tracing.tracer.finish(turn, status)
+                print(f"Độ trễ lượt {turn.turn_id}: {turn.summary()}")
             
     except Exception as e:
         print(f"Có lỗi xảy ra: {e}")
     finally:
+        await playback.aclose()
+        chat_sessions.end(CALL_ID)
+        await tts_websocket.aclose()
+        await transport.aclose()
+        tracing.tracer.close()
         print("Kết thúc chương trình")
 
 if __name__ == "__main__":
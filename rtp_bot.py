@@ -1,129 +1,152 @@
 import asyncio
-import threading
-import pyaudio
-from src.rtp_handler import RTPHandler
+from contextlib import aclosing
+from src.rtp_server import RTPServer
 from src.speech_processor import SpeechProcessor
 from src.chatbot_client import ChatbotClient
+from src.chat_session import chat_sessions
 from src.text_normalizer import TextNormalizer
+from src.sentence_stream import prefetch
+from src.http_transport import transport, provider_urls
+from src.tts_client import TTSClient
+from src.tts_websocket import tts_websocket
+from src import tracing
+from src import clients
 from config.config import config
-from pydub import AudioSegment
-import io
-import wave
-import socket
 
 class RTPBot:
     def __init__(self):
-        # Khởi tạo RTP Handler cho bot
-        self.rtp_handler = RTPHandler(
+        # RTP server cho bot, phục vụ nhiều cuộc gọi trên cùng một port
+        self.server = RTPServer(
             local_ip=config.RTP_LOCAL_IP,
             local_port=config.BOT_PORT,      # Bot lắng nghe ở 5006
-            remote_ip=config.RTP_LOCAL_IP,
-            remote_port=config.USER_PORT,    # Bot gửi đến 5002
+            on_utterance=self.process_audio,
+            on_session_end=self._on_session_end,
+            stt_stream_factory=self._open_stt_stream,
+            transcribe=self._transcribe,
             chunk_size=config.AUDIO_CHUNK,
             sample_rate=config.AUDIO_RATE
         )
-        
-        # Khởi tạo các components
+
+        # Khởi tạo các components dùng chung giữa các cuộc gọi
         self.speech_processor = SpeechProcessor()
         self.chatbot = ChatbotClient(config)
         self.text_normalizer = TextNormalizer()
-        self.audio = pyaudio.PyAudio()
+        self.tts_client = TTSClient(sample_rate=config.AUDIO_RATE)
         self.is_running = True
-        
-        # Buffer cho audio đang nhận
-        self.current_audio = []
-        self.is_receiving = False
-        self.silence_count = 0
-
-    async def process_audio(self, audio_data):
-        """Xử lý audio và tạo phản hồi"""
+
+    def _on_session_end(self, session):
+        """Cuộc gọi kết thúc: xóa lịch sử hội thoại của cuộc gọi"""
+        chat_sessions.end(session.call_id)
+
+    def _open_stt_stream(self, session):
+        """STT streaming cho utterance mới, nhận audio ngay khi caller đang nói"""
+        return self.speech_processor.open_stream(on_partial=session.on_partial, sample_rate=config.AUDIO_RATE)
+
+    async def _transcribe(self, session, audio_data, stt_stream=None):
+        """Chuyển một utterance thành text (transcript thường đã sẵn sàng nếu dùng streaming)"""
+        if stt_stream:
+            return await stt_stream.finish()
+        return await self.speech_processor.speech_to_text(audio_data)
+
+    async def _normalize(self, sentences):
+        """Stage chuẩn hóa: TextNormalizer tốn CPU nên chạy ở thread pool, không chặn các cuộc gọi khác"""
+        async for sentence in sentences:
+            sentence, _ = self.text_normalizer.check_end_conversation(sentence)
+            normalized_sentence = await asyncio.to_thread(self.text_normalizer.normalize_vietnamese_text, sentence)
+            if normalized_sentence:
+                tracing.mark("normalized")
+                yield sentence, normalized_sentence
+
+    async def _synthesize(self, session, sentences):
+        """Stage TTS: từng chunk PCM của mỗi câu, chờ khi pacer đã xếp sẵn đủ audio"""
+        max_buffered = config.PIPELINE_MAX_BUFFERED_MS / 1000
+        async for sentence, normalized_sentence in sentences:
+            print(f"Bot [{session.ssrc:#010x}]: {normalized_sentence}")
+            async for pcm in self.tts_client.stream(normalized_sentence):
+                await session.rtp_stream.drain(max_buffered)
+                yield sentence, pcm
+            yield sentence, None
+
+    async def process_audio(self, session, audio_data, stt_stream=None):
+        """
+        Xử lý audio và tạo phản hồi (bị hủy nếu caller ngắt lời).
+        Các stage LLM -> chuẩn hóa -> TTS -> pacer chạy ở task riêng, nối bằng
+        hàng đợi có giới hạn: câu sau được chuẩn hóa và tổng hợp trong lúc câu
+        trước đang phát, và stage chậm sẽ chặn dần các stage trước nó.
+        """
+        spoken = None  # (câu, future báo gói cuối của câu đã gửi), từ lúc bắt đầu gọi LLM
         try:
-            # Chuyển audio thành text
-            user_text = await self.speech_processor.speech_to_text(audio_data)
+            user_text = await self._transcribe(session, audio_data, stt_stream)
+            # Caller nói quá MAX_UTTERANCE_MS: ghép text của các đoạn đã bị cắt trước đó
+            carried = await session.take_carried_text()
+            user_text = " ".join(text for text in (carried, user_text) if text)
             if not user_text:
                 return
-                
-            print(f"User: {user_text}")
-            
-            # Lấy phản hồi từ chatbot
-            bot_response = await self.chatbot.get_response(user_text)
-            bot_response, _ = self.text_normalizer.check_end_conversation(bot_response)
-            normalized_response = self.text_normalizer.normalize_vietnamese_text(bot_response)
-            print(f"Bot: {normalized_response}")
-            
-            # Chuyển text thành speech
-            response = self.chatbot.client.audio.speech.create(
-                model="tts-1",
-                voice=config.TTS_OPENAI_VOICE,
-                input=normalized_response
-            )
-            
-            # Chuyển MP3 thành WAV
-            audio_segment = AudioSegment.from_mp3(io.BytesIO(response.content))
-            wav_io = io.BytesIO()
-            audio_segment.export(wav_io, format='wav')
-            wav_io.seek(0)
-            
-            with wave.open(wav_io, 'rb') as wav_file:
-                wav_data = wav_file.readframes(wav_file.getnframes())
-            
-            # Gửi phản hồi qua RTP
-            self.rtp_handler.send_audio(wav_data)
-            
+
+            print(f"User [{session.ssrc:#010x}]: {user_text}")
+
+            # Mỗi cuộc gọi có lịch sử hội thoại riêng, theo (địa chỉ, SSRC);
+            # aclosing để hủy luôn các stage (và request LLM) khi bị ngắt lời
+            chat = chat_sessions.get(session.call_id)
+            spoken = []
+            queue_size = config.PIPELINE_SENTENCE_QUEUE
+            sentences = prefetch(self.chatbot.stream_response(user_text, chat), "llm", queue_size)
+            normalized = prefetch(self._normalize(sentences), "normalize", queue_size)
+            audio = prefetch(self._synthesize(session, normalized), "tts", queue_size)
+            async with aclosing(audio) as chunks:
+                # Stage pacer: xếp chunk PCM vào hàng đợi gửi RTP ngay khi TTS trả về
+                async for sentence, pcm in chunks:
+                    if pcm is not None:
+                        session.queue_audio(pcm)
+                    else:
+                        spoken.append((sentence, session.queue_audio(b'', flush=True)))
+
+            # Chờ gói cuối được gửi; caller vẫn có thể ngắt lời trong lúc này
+            if spoken:
+                await spoken[-1][1]
+
+        except asyncio.CancelledError:
+            # Chỉ những câu đã gửi hết mới được coi là caller đã nghe
+            if spoken is not None:
+                heard = [sentence for sentence, done in spoken if done.done() and done.result()]
+                self.chatbot.record_interruption(" ".join(heard), chat)
+            raise
         except Exception as e:
             print(f"Lỗi khi xử lý audio: {e}")
 
     async def run(self):
         """Chạy bot"""
+        await self.server.start()
+        await asyncio.gather(asyncio.to_thread(clients.preload), transport.prewarm(provider_urls()))
+        await self.tts_client.prerender(config.TTS_PRERENDER_PHRASES,
+                                        normalize=self.text_normalizer.normalize_vietnamese_text)
         print("\nBot đang lắng nghe...")
-        buffer = []
-        silence_count = 0
-        
-        while self.is_running:
-            try:
-                data, _ = self.rtp_handler.sock.recvfrom(2060)
-                audio_data = data[12:]  # Bỏ RTP header
-                # print("--------------")
-                # print("audio_data",len(audio_data))
-                # print("config.AUDIO_CHUNK",config.AUDIO_CHUNK)
-                # print("--------------")
-                if len(audio_data) == config.AUDIO_CHUNK * 2:
-                    # Kiểm tra âm lượng
-                    volume = max(abs(int.from_bytes(audio_data[i:i+2], 'little', signed=True)) 
-                               for i in range(0, len(audio_data), 2))
-                    
-                    if volume > 300:  # Có tiếng nói
-                        silence_count = 0
-                        buffer.append(audio_data)
-                    else:
-                        silence_count += 1
-                        if buffer:  # Đã có tiếng nói trước đó
-                            buffer.append(audio_data)
-                    
-                    # Xử lý khi đủ độ im lặng
-                    if silence_count > 60 and buffer:  # ~2s im lặng
-                        await self.process_audio(b''.join(buffer))
-                        buffer = []
-                        silence_count = 0
-                        
-            except Exception as e:
-                if self.is_running:
-                    print(f"Lỗi: {e}")
+
+        # Lịch sử của các cuộc gọi đã im lặng quá CHAT_SESSION_TTL được giải phóng cả khi không có cuộc gọi mới
+        sweeper = asyncio.create_task(chat_sessions.run())
+        try:
+            while self.is_running:
+                await asyncio.sleep(1)
+        finally:
+            sweeper.cancel()
+            self.server.close()
+            await tts_websocket.aclose()
+            await transport.aclose()
+            tracing.tracer.close()
 
     def start(self):
         """Khởi động bot"""
         print("\nKhởi động Callbot...")
         print("Đang kết nối với VLC và user...")
         print("Nhấn Ctrl+C để dừng")
-        
+
         try:
             asyncio.run(self.run())
         except KeyboardInterrupt:
             print("\nĐang dừng...")
         finally:
             self.is_running = False
-            self.rtp_handler.stop()
 
 if __name__ == "__main__":
     bot = RTPBot()
-    bot.start() 
\ No newline at end of file
+    bot.start()
@@ -1,12 +1,17 @@
+import argparse
 import asyncio
+import json
 import threading
-import pyaudio
 import socket
-from src.rtp_handler import RTPHandler
+import time
+from src.rtp_handler import RTPHandler, parse_rtp_header
+from src.jitter_buffer import JitterBuffer
+from src.load_generator import LoadGenerator, NetworkImpairment, load_corpus
+from src.rtp_codec import CODECS, Decoder, get_codec, negotiate
 from config.config import config
 
 class RTPUser:
-    def __init__(self):
+    def __init__(self, codec=None):
         # Khởi tạo RTP Handler cho user
         self.rtp_handler = RTPHandler(
             local_ip=config.RTP_LOCAL_IP,
@@ -14,11 +19,12 @@ class RTPUser:
             remote_ip=config.RTP_LOCAL_IP,
             remote_port=config.BOT_PORT,     # User gửi đến 5006
             chunk_size=config.AUDIO_CHUNK,
-            sample_rate=config.AUDIO_RATE
+            sample_rate=config.AUDIO_RATE,
+            codec=codec
         )
         
-        # Khởi tạo PyAudio
-        self.audio = pyaudio.PyAudio()
+        # Dùng chung stream loa/microphone với RTP handler
+        self.device = self.rtp_handler.device
         self.is_running = True
         
         # Thread nhận audio từ bot
@@ -27,27 +33,38 @@ class RTPUser:
 
     def _receive_audio(self):
         """Nhận và phát audio từ bot"""
-        stream = self.audio.open(
-            format=pyaudio.paInt16,
-            channels=1,
-            rate=config.AUDIO_RATE,
-            output=True,
-            frames_per_buffer=config.AUDIO_CHUNK
-        )
-        
+        self.device.start()
         print("Đang lắng nghe phản hồi từ bot...")
+        streams = {}  # SSRC -> (jitter buffer, decoder) theo codec của luồng
+        # Buffer nhận cấp phát một lần, header được đọc qua memoryview
+        recv_buffer = bytearray(config.RTP_MAX_PACKET_SIZE)
+        recv_view = memoryview(recv_buffer)
         
         while self.is_running:
             try:
-                data, _ = self.rtp_handler.sock.recvfrom(2048)
-                audio_data = data[12:]  # Bỏ RTP header
-                if len(audio_data) == config.AUDIO_CHUNK:
-                    stream.write(audio_data)
+                size, _ = self.rtp_handler.sock.recvfrom_into(recv_buffer)
+                data = recv_view[:size]
+                header = parse_rtp_header(data)
+                if header is None:
+                    continue
+                stream = streams.get(header.ssrc)
+                if stream is None:
+                    codec = negotiate(header.payload_type)
+                    if codec is None:
+                        continue
+                    stream = streams[header.ssrc] = (JitterBuffer(codec.clock_rate), Decoder(codec, config.AUDIO_RATE))
+                jitter_buffer, decoder = stream
+                if header.payload_type != decoder.codec.payload_type:
+                    continue
+                pcm = decoder.codec.decode(data[header.header_size:])
+                for frame in jitter_buffer.put(header, pcm, time.monotonic()):
+                    self.device.write(decoder.resample(frame))
             except Exception as e:
                 if self.is_running:
                     print(f"Lỗi khi nhận audio: {e}")
         
-        stream.close()
+        for ssrc, (jitter_buffer, decoder) in streams.items():
+            print(f"Thống kê RTP từ SSRC {ssrc:#010x} ({decoder.codec.name}): {jitter_buffer.stats()}")
 
     def start(self):
         """Bắt đầu ghi âm và gửi"""
@@ -69,6 +86,46 @@ class RTPUser:
             self.is_running = False
             self.rtp_handler.stop()
 
+async def run_load(args):
+    """Chế độ không cần microphone/loa: giả lập nhiều caller từ các file WAV"""
+    load = LoadGenerator(
+        (args.bot_ip, args.bot_port), load_corpus(args.wav),
+        turns=args.turns,
+        codec=get_codec(args.codec),
+        impairment=NetworkImpairment(args.jitter_ms, args.loss, args.reorder, args.seed),
+        ramp=args.ramp,
+        reply_timeout=args.reply_timeout,
+        reply_gap=args.reply_gap,
+        record_dir=args.record_dir,
+        seed=args.seed
+    )
+    print(f"Giả lập {args.calls} cuộc gọi tới {args.bot_ip}:{args.bot_port}...")
+    started = time.perf_counter()
+    results = await load.run(args.calls)
+    report = {'calls': args.calls, 'wall_time_s': round(time.perf_counter() - started, 3), **results.report()}
+    print(json.dumps(report, indent=2))
+
 if __name__ == "__main__":
-    user = RTPUser()
-    user.start() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Người dùng RTP: microphone/loa, hoặc giả lập nhiều cuộc gọi với --calls")
+    parser.add_argument('--calls', type=int, default=0, help="Số caller giả lập đồng thời (0: dùng microphone)")
+    parser.add_argument('--wav', nargs='*', default=[], help="Các file WAV 16-bit (hoặc thư mục) làm câu nói")
+    parser.add_argument('--turns', type=int, default=1, help="Số lượt nói mỗi caller")
+    parser.add_argument('--codec', choices=list(CODECS), default=config.RTP_CODECS[0], help="Codec RTP chiều gửi")
+    parser.add_argument('--jitter-ms', type=float, default=0, help="Jitter mạng giả lập (ms)")
+    parser.add_argument('--loss', type=float, default=0.0, help="Tỉ lệ mất gói giả lập")
+    parser.add_argument('--reorder', type=float, default=0.0, help="Tỉ lệ gói tới sai thứ tự giả lập")
+    parser.add_argument('--ramp', type=float, default=1.0, help="Các caller bắt đầu trong khoảng này (giây)")
+    parser.add_argument('--reply-timeout', type=float, default=15.0)
+    parser.add_argument('--reply-gap', type=float, default=0.5,
+                        help="Không nhận gói nào trong khoảng này (giây) thì coi là hết phản hồi")
+    parser.add_argument('--record-dir', help="Ghi audio phản hồi của bot, mỗi lượt một file WAV")
+    parser.add_argument('--bot-ip', default=config.RTP_LOCAL_IP)
+    parser.add_argument('--bot-port', type=int, default=config.BOT_PORT)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    if args.calls:
+        asyncio.run(run_load(args))
+    else:
+        user = RTPUser(get_codec(args.codec))
+        user.start() 
\ No newline at end of file
@@ -0,0 +1,219 @@
+import atexit
+import threading
+import time
+from config.config import config
+
+class RingBuffer:
+    """
+    Ring buffer byte cho đúng một producer và một consumer (không dùng lock).
+    Producer chỉ tăng _written, consumer chỉ tăng _consumed; mỗi bên chỉ đọc
+    bộ đếm của bên kia nên callback của PortAudio không bao giờ phải chờ.
+    Khi đầy, phần dữ liệu mới không vừa sẽ bị bỏ và được đếm vào overruns.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._written = 0
+        self._consumed = 0
+        self.overruns = 0
+
+    def available(self):
+        return self._written - self._consumed
+
+    def free(self):
+        return self.capacity - self.available()
+
+    def write(self, data):
+        """(Producer) Ghi tối đa free() byte, trả về số byte đã ghi"""
+        data = memoryview(data).cast('B')
+        n = min(len(data), self.free())
+        if n < len(data):
+            self.overruns += len(data) - n
+        pos = self._written % self.capacity
+        first = min(n, self.capacity - pos)
+        self._view[pos:pos + first] = data[:first]
+        self._view[:n - first] = data[first:n]
+        # Cập nhật bộ đếm sau khi đã copy xong để consumer không đọc dữ liệu dở
+        self._written += n
+        return n
+
+    def read(self, n):
+        """(Consumer) Đọc tối đa n byte"""
+        n = min(n, self.available())
+        pos = self._consumed % self.capacity
+        first = min(n, self.capacity - pos)
+        data = bytes(self._view[pos:pos + first]) + bytes(self._view[:n - first])
+        self._consumed += n
+        return data
+
+    def read_into(self, out):
+        """(Consumer) Đọc vào buffer có sẵn, trả về số byte đã đọc"""
+        out = memoryview(out).cast('B')
+        n = min(len(out), self.available())
+        pos = self._consumed % self.capacity
+        first = min(n, self.capacity - pos)
+        out[:first] = self._view[pos:pos + first]
+        out[first:n] = self._view[:n - first]
+        self._consumed += n
+        return n
+
+    def skip(self, keep=0):
+        """(Consumer) Bỏ dữ liệu cũ, chỉ giữ lại keep byte mới nhất"""
+        excess = self.available() - keep
+        if excess > 0:
+            self._consumed += excess
+
+class AudioDevice:
+    """
+    Một stream PyAudio full-duplex ở callback mode, mở một lần và giữ suốt
+    vòng đời process. Callback ghi microphone vào input ring và lấy audio phát
+    từ output ring (thiếu thì phát im lặng), nên việc ghi âm/phát ở các lượt
+    hội thoại không phải mở lại stream và không mất những frame đầu.
+    """
+
+    def __init__(self, rate, channels=1, chunk=None, input_seconds=None, output_seconds=None):
+        self.rate = rate
+        self.channels = channels
+        self.chunk = chunk or config.AUDIO_CHUNK
+        self.frame_bytes = 2 * channels
+        bytes_per_second = rate * self.frame_bytes
+        self.input = RingBuffer(int(bytes_per_second * (input_seconds or config.AUDIO_INPUT_BUFFER_SECONDS)))
+        self.output = RingBuffer(int(bytes_per_second * (output_seconds or config.AUDIO_OUTPUT_BUFFER_SECONDS)))
+
+        self._input_ready = threading.Event()
+        self._output_space = threading.Event()
+        self._clear_output = False
+        self.underruns = 0
+        self.played_bytes = 0        # Tổng số byte audio thật (không tính im lặng đệm) đã phát
+        self.on_play = None          # Hàm gọi một lần khi audio thật bắt đầu phát (từ thread callback)
+        self._stream = None
+
+    def start(self):
+        if self._stream is None:
+            import pyaudio
+            self._stream = _pyaudio().open(
+                format=pyaudio.paInt16,
+                channels=self.channels,
+                rate=self.rate,
+                input=True,
+                output=True,
+                frames_per_buffer=self.chunk,
+                stream_callback=self._callback
+            )
+            self._continue = pyaudio.paContinue
+            self._stream.start_stream()
+        return self
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        if in_data:
+            self.input.write(in_data)
+            self._input_ready.set()
+
+        if self._clear_output:
+            self.output.skip()
+            self._clear_output = False
+        wanted = frame_count * self.frame_bytes
+        out_data = self.output.read(wanted)
+        self.played_bytes += len(out_data)
+        if out_data and self.on_play is not None:
+            on_play, self.on_play = self.on_play, None
+            on_play()
+        if len(out_data) < wanted:
+            if out_data:
+                self.underruns += 1
+            out_data += bytes(wanted - len(out_data))
+        self._output_space.set()
+        return out_data, self._continue
+
+    def flush_input(self, keep=0):
+        """Bỏ audio microphone cũ, chỉ giữ keep byte mới nhất"""
+        self.input.skip(keep)
+
+    def _wait_input(self, nbytes, timeout):
+        self.start()
+        while self.input.available() < nbytes:
+            self._input_ready.clear()
+            if self.input.available() >= nbytes:
+                break
+            if not self._input_ready.wait(timeout):
+                return False
+        return True
+
+    def read(self, nbytes, timeout=None):
+        """Đọc đúng nbytes từ microphone (chờ nếu chưa đủ), b'' nếu hết timeout"""
+        if not self._wait_input(nbytes, timeout):
+            return b''
+        return self.input.read(nbytes)
+
+    def read_into(self, out, timeout=None):
+        """Đọc đầy buffer out từ microphone (không cấp phát), 0 nếu hết timeout"""
+        if not self._wait_input(len(out), timeout):
+            return 0
+        return self.input.read_into(out)
+
+    def write(self, pcm):
+        """Xếp PCM vào output ring, chờ khi ring đầy; trả về ngay khi đã xếp xong"""
+        self.start()
+        view = memoryview(pcm).cast('B')
+        while view:
+            n = min(len(view), self.output.free())
+            if n:
+                self.output.write(view[:n])
+                view = view[n:]
+            if view:
+                self._output_space.clear()
+                if not self.output.free():
+                    self._output_space.wait(0.1)
+
+    def drain(self, timeout=None):
+        """Chờ tới khi output ring đã phát hết, trả về False nếu hết timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.output.available():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            self._output_space.clear()
+            if self.output.available():
+                self._output_space.wait(0.05)
+        return True
+
+    def clear_output(self):
+        """Bỏ audio đang chờ phát (callback thực hiện ở lần gọi kế tiếp)"""
+        self._clear_output = True
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+
+_pa = None
+_devices = {}
+_lock = threading.Lock()
+
+def _pyaudio():
+    global _pa
+    if _pa is None:
+        import pyaudio
+        _pa = pyaudio.PyAudio()
+    return _pa
+
+def get_audio_device(rate=None, channels=1, chunk=None):
+    """AudioDevice dùng chung trong process cho mỗi (rate, channels)"""
+    rate = rate or config.AUDIO_RATE
+    with _lock:
+        device = _devices.get((rate, channels))
+        if device is None:
+            device = _devices[(rate, channels)] = AudioDevice(rate, channels, chunk)
+        return device
+
+@atexit.register
+def close_all():
+    global _pa
+    for device in _devices.values():
+        device.close()
+    _devices.clear()
+    if _pa is not None:
+        _pa.terminate()
+        _pa = None
@@ -1,82 +1,108 @@
-import pyaudio
 import numpy as np
-import wave
-from array import array
-import io
-from openai import OpenAI
 from config.config import config
-from pydub import AudioSegment
-import tempfile
+from . import clients
+from .tts_cache import tts_cache
+from .resample import StreamResampler
+from .vad import create_vad
+from .audio_device import get_audio_device
+from .capture import UtteranceCapture
 
 class AudioHandler:
     def __init__(self, chunk=1024, channels=1, rate=16000, 
-                 silence_threshold=300, silence_chunks=100, 
-                 initial_silence_chunks=80):
+                 silence_threshold=None, silence_ms=None,
+                 no_speech_timeout_ms=None):
         self.CHUNK = chunk
-        self.FORMAT = pyaudio.paInt16
         self.CHANNELS = channels
         self.RATE = rate
         self.SILENCE_THRESHOLD = silence_threshold
-        self.SILENCE_CHUNKS = silence_chunks
-        self.INITIAL_SILENCE_CHUNKS = initial_silence_chunks
-        self.p = pyaudio.PyAudio()
-        self.client = OpenAI(api_key=config.OPENAI_API_KEY)
-
-    def record_audio(self):
-        stream = self.p.open(
-            format=self.FORMAT,
-            channels=self.CHANNELS,
-            rate=self.RATE,
-            input=True,
-            frames_per_buffer=self.CHUNK
-        )
+        self.SILENCE_MS = silence_ms or config.ENDPOINT_SILENCE_MS
+        self.NO_SPEECH_TIMEOUT_MS = no_speech_timeout_ms or config.NO_SPEECH_TIMEOUT_MS
+        # Stream microphone/loa dùng chung, mở một lần cho cả process
+        self.device = get_audio_device(rate, channels, chunk)
+
+    @property
+    def client(self):
+        return clients.sync_openai()
+
+    def record_audio(self, on_chunk=None, initial_frames=None, endpointer=None):
+        """
+        Ghi âm một utterance từ microphone.
+        on_chunk(data, is_speech) được gọi cho mỗi chunk từ lúc bắt đầu nói,
+        dùng để đẩy audio vào STT streaming trong khi vẫn đang ghi.
+        initial_frames: các chunk đã đọc khi người dùng ngắt lời bot, được xử lý
+        trước để không mất phần đầu câu.
+        endpointer: Endpointer của lượt này, để bên gọi đưa transcript tạm vào.
+        """
+        # Stream đã chạy sẵn: chỉ bỏ audio cũ còn trong ring buffer
+        self.device.start()
+        if not initial_frames:
+            self.device.flush_input()
+        pending = list(initial_frames or [])
 
         print("* Đang lắng nghe...")
-        frames = []
-        silent_chunks = 0
-        has_speech = False
-        max_volume = 0
+        capture = UtteranceCapture(self.RATE, silence_ms=self.SILENCE_MS, endpointer=endpointer)
+        chunk = memoryview(bytearray(self.CHUNK * 2 * self.CHANNELS))
+        silent_samples = 0
+        vad = create_vad(self.RATE, threshold=self.SILENCE_THRESHOLD)
 
         while True:
             try:
-                data = stream.read(self.CHUNK, exception_on_overflow=False)
-                array_data = array('h', data)
-                
-                volume = sum(abs(x) for x in array_data) / len(array_data)
-                max_volume = max(max_volume, volume)
-                
-                # In thông tin âm lượng khi vượt ngưỡng hoặc mỗi 20 chunk
-                # if volume > self.SILENCE_THRESHOLD or silent_chunks % 20 == 0:
-                #     print(f"Âm lượng hiện tại: {volume:.2f}, Ngưỡng: {self.SILENCE_THRESHOLD}")
-
-                if volume > self.SILENCE_THRESHOLD:
-                    silent_chunks = 0
-                    has_speech = True
-                    frames.append(data)
+                # Đọc thẳng vào chunk cấp phát sẵn, không tạo bytes mới mỗi lần
+                if pending:
+                    data = pending.pop(0)
                 else:
-                    silent_chunks += 1
-                    if has_speech:
-                        frames.append(data)
-
-                if has_speech and silent_chunks > self.SILENCE_CHUNKS:
-                    print(f"Dừng ghi âm: {silent_chunks} chunk im lặng sau tiếng nói")
-                    break
-                elif not has_speech and silent_chunks > self.INITIAL_SILENCE_CHUNKS:
-                    print(f"Không phát hiện tiếng nói sau {silent_chunks} chunk")
-                    print(f"Âm lượng tối đa: {max_volume:.2f}, Ngưỡng: {self.SILENCE_THRESHOLD}")
-                    stream.stop_stream()
-                    stream.close()
-                    return None
+                    self.device.read_into(chunk)
+                    data = chunk
+
+                is_speech = vad.is_speech(data)
+                audio, utterance = capture.push(data, is_speech)
+
+                if on_chunk and audio is not None:
+                    # on_chunk có thể xử lý ở thread khác: đưa bản copy
+                    on_chunk(bytes(audio), is_speech)
+
+                if utterance is not None:
+                    print(f"Dừng ghi âm: {capture.end_reason}")
+                    return utterance
+
+                if not capture.active:
+                    silent_samples += len(data) // (2 * self.CHANNELS)
+                    if silent_samples * 1000 > self.NO_SPEECH_TIMEOUT_MS * self.RATE:
+                        print(f"Không phát hiện tiếng nói sau {1000 * silent_samples // self.RATE} ms")
+                        return None
 
             except Exception as e:
                 print(f"Lỗi khi ghi âm: {e}")
-                break
-
-        stream.stop_stream()
-        stream.close()
+                return None
 
-        if has_speech and len(frames) > 0:
-            return b''.join(frames)
+    def listen_for_barge_in(self, stop):
+        """
+        Nghe microphone trong lúc bot đang phát cho tới khi stop được set.
+        Trả về các chunk tiếng nói nếu người dùng nói liên tục đủ
+        BARGE_IN_MIN_SPEECH_MS (ngắt lời), ngược lại None.
+        """
+        self.device.start()
+        self.device.flush_input()
+        # Ngưỡng cao hơn lúc ghi âm thường để tiếng bot vọng từ loa không bị tính
+        # (với webrtc là cổng năng lượng trước quyết định của webrtcvad)
+        vad = create_vad(self.RATE, threshold=config.BARGE_IN_THRESHOLD)
+        chunk_bytes = self.CHUNK * 2 * self.CHANNELS
+        min_samples = config.BARGE_IN_MIN_SPEECH_MS * self.RATE // 1000
+        frames = []
+        speech_samples = 0
+        while not stop.is_set():
+            data = self.device.read(chunk_bytes, timeout=0.1)
+            if not data:
+                continue
+            if vad.is_speech(data):
+                frames.append(data)
+                # Đếm theo số sample thực nhận, không giả định mỗi lần đọc đúng CHUNK sample
+                speech_samples += len(data) // (2 * self.CHANNELS)
+                if speech_samples >= min_samples:
+                    return frames
+            else:
+                frames = []
+                speech_samples = 0
         return None
 
     def play_audio(self, audio_data):
@@ -86,20 +112,15 @@ class AudioHandler:
             self._play_openai_audio(audio_data)
 
     def _play_local_audio(self, audio_data):
-        stream = self.p.open(
-            format=self.FORMAT,
-            channels=self.CHANNELS,
-            rate=self.RATE,
-            output=True
-        )
-        
-        if isinstance(audio_data, bytes):
-            stream.write(audio_data)
+        if isinstance(audio_data, (bytes, bytearray, memoryview)):
+            self.play_pcm(audio_data)
         else:
-            stream.write(audio_data.read())
-            
-        stream.stop_stream()
-        stream.close()
+            self.play_pcm(audio_data.read())
+
+    def play_pcm(self, pcm):
+        """Phát PCM 16-bit mono tại self.RATE, chờ tới khi phát xong"""
+        self.device.write(pcm)
+        self.device.drain()
 
     def _play_openai_audio(self, text_input):
         try:
@@ -110,52 +131,33 @@ class AudioHandler:
                 else:
                     text_input = text_input.decode('utf-8')
 
-            # Gọi API OpenAI TTS
-            response = self.client.audio.speech.create(
+            # Câu đã tổng hợp trước đó được phát thẳng từ cache
+            key = tts_cache.key(text_input, config.TTS_OPENAI_VOICE, "openai", self.RATE)
+            pcm = tts_cache.get(key)
+            if pcm is not None:
+                self.play_pcm(pcm)
+                return
+
+            # Gọi API OpenAI TTS, nhận PCM thô và phát ngay khi từng chunk về tới
+            resampler = StreamResampler(config.TTS_OPENAI_SAMPLE_RATE, self.RATE)
+            parts = []
+            with self.client.audio.speech.with_streaming_response.create(
                 model="tts-1",
                 voice=config.TTS_OPENAI_VOICE,
-                input=text_input
-            )
-            
-            # Chuyển đổi MP3 sang WAV
-            audio_data = io.BytesIO(response.content)
-            audio_segment = AudioSegment.from_mp3(audio_data)
-            
-            # Tạo temporary file để lưu WAV
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_wav:
-                audio_segment.export(temp_wav.name, format='wav')
-                
-                # Mở file WAV để phát
-                wave_obj = wave.open(temp_wav.name, 'rb')
-                
-                # Mở stream với thông số từ wave file
-                stream = self.p.open(
-                    format=self.p.get_format_from_width(wave_obj.getsampwidth()),
-                    channels=wave_obj.getnchannels(),
-                    rate=wave_obj.getframerate(),
-                    output=True
-                )
-                test1 = self.p.get_format_from_width(wave_obj.getsampwidth())
-                test2 = wave_obj.getnchannels()
-                test3 = wave_obj.getframerate()
-                print(test1)
-                print(test2)
-                print(test3)
-                
-                # Đọc và phát audio theo từng chunk
-                chunk_size = 1024
-                data = wave_obj.readframes(chunk_size)
-                while data:
-                    stream.write(data)
-                    data = wave_obj.readframes(chunk_size)
-                
-                # Dọn dẹp
-                stream.stop_stream()
-                stream.close()
-                wave_obj.close()
+                input=text_input,
+                response_format="pcm"
+            ) as response:
+                for chunk in response.iter_bytes(config.TTS_STREAM_CHUNK_BYTES):
+                    pcm = resampler.process(chunk)
+                    if pcm:
+                        parts.append(pcm)
+                        self.device.write(pcm)
+            tail = resampler.flush()
+            if tail:
+                parts.append(tail)
+                self.device.write(tail)
+            self.device.drain()
+            tts_cache.put(key, b''.join(parts))
             
         except Exception as e:
             print(f"Lỗi khi sử dụng OpenAI TTS: {e}")
-
-    def __del__(self):
-        self.p.terminate() 
\ No newline at end of file
@@ -0,0 +1,121 @@
+import numpy as np
+from config.config import config
+from .utterance_buffer import UtteranceBuffer
+from .endpointer import Endpointer
+
+class UtteranceCapture:
+    """
+    Tách utterance từ luồng chunk PCM 16-bit mono đã có quyết định VAD.
+    Khi chưa có tiếng nói, audio được giữ trong một ring pre-roll cố định để
+    utterance bắt đầu sớm hơn chunk có tiếng nói đầu tiên (không mất phần đầu
+    từ). Utterance kết thúc khi endpointer báo hết lượt nói (thời gian im lặng
+    tính bằng ms, có thể rút ngắn), hoặc bị cắt khi dài tới max_utterance_ms
+    để vừa với một request STT; bộ nhớ của cả hai được cấp phát trước theo
+    các giới hạn này.
+    """
+
+    def __init__(self, sample_rate, silence_ms=None, pre_roll_ms=None, max_utterance_ms=None, endpointer=None):
+        self.sample_rate = sample_rate
+        self.endpointer = endpointer or Endpointer(sample_rate, silence_ms)
+        pre_roll_ms = config.CAPTURE_PRE_ROLL_MS if pre_roll_ms is None else pre_roll_ms
+        max_utterance_ms = max_utterance_ms or config.MAX_UTTERANCE_MS
+        self.max_samples = sample_rate * max_utterance_ms // 1000
+
+        self._pre_roll = np.zeros(sample_rate * pre_roll_ms // 1000, dtype=np.int16)
+        self._pre_roll_pos = 0
+        self._pre_roll_filled = 0
+
+        # Một buffer cho mọi utterance của cuộc gọi (dư 200 ms cho chunk vượt giới hạn);
+        # utterance hoàn chỉnh được copy ra nên buffer dùng lại được ngay
+        self._buffer = UtteranceBuffer(self.max_samples + sample_rate // 5)
+        self._active = False
+        self.forced_splits = 0
+        self.forced = False          # Utterance gần nhất bị cắt vì quá dài (caller vẫn đang nói)
+        self.end_reason = None       # Vì sao utterance gần nhất kết thúc (để log)
+
+    @property
+    def active(self):
+        """Đang trong một utterance"""
+        return self._active
+
+    def push(self, pcm, is_speech):
+        """
+        Đưa một chunk vào, trả về (audio, utterance):
+        audio là phần cần chuyển cho STT streaming ứng với chunk này (pre-roll
+        cộng chunk ở đầu utterance, None khi chưa có tiếng nói); utterance là
+        bytes của utterance vừa hoàn chỉnh hoặc None.
+        """
+        if not self._active:
+            if not is_speech:
+                self._remember(pcm)
+                return None, None
+            # Bắt đầu utterance: pre-roll rồi tới chunk hiện tại
+            self._active = True
+            self._buffer.clear()
+            self._buffer.append(self._take_pre_roll())
+            self._buffer.append(pcm)
+            audio = bytes(self._buffer.view())
+        else:
+            self._buffer.append(pcm)
+            audio = pcm
+
+        if self.endpointer.push(len(pcm) // 2, is_speech, self._buffer.samples):
+            self.end_reason = f"{self.endpointer.silence_elapsed_ms} ms im lặng sau tiếng nói ({self.endpointer.reason})"
+            self.forced = False
+            return audio, self._finish()
+        if len(self._buffer) // 2 >= self.max_samples:
+            # Nói quá dài: cắt thành đoạn vừa một request STT. Lượt nói chưa kết thúc nên
+            # đoạn sau bắt đầu ngay ở chunk kế tiếp (dù là im lặng) và endpointer vẫn đếm tiếp
+            self.forced_splits += 1
+            self.end_reason = f"utterance dài tới {1000 * self.max_samples // self.sample_rate} ms"
+            self.forced = True
+            utterance = bytes(self._buffer.view())
+            self._buffer.clear()
+            return audio, utterance
+        return audio, None
+
+    def _finish(self):
+        utterance = bytes(self._buffer.view())
+        self._buffer.clear()
+        self._active = False
+        self.endpointer.reset()
+        return utterance
+
+    def _remember(self, pcm):
+        size = len(self._pre_roll)
+        if not size:
+            return
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        if len(samples) >= size:
+            self._pre_roll[:] = samples[-size:]
+            self._pre_roll_pos = 0
+            self._pre_roll_filled = size
+            return
+        end = self._pre_roll_pos + len(samples)
+        if end <= size:
+            self._pre_roll[self._pre_roll_pos:end] = samples
+        else:
+            first = size - self._pre_roll_pos
+            self._pre_roll[self._pre_roll_pos:] = samples[:first]
+            self._pre_roll[:end - size] = samples[first:]
+        self._pre_roll_pos = end % size
+        self._pre_roll_filled = min(size, self._pre_roll_filled + len(samples))
+
+    def _take_pre_roll(self):
+        """Pre-roll theo đúng thứ tự thời gian, sau đó làm rỗng ring"""
+        filled = self._pre_roll_filled
+        start = (self._pre_roll_pos - filled) % len(self._pre_roll) if filled else 0
+        if start + filled <= len(self._pre_roll):
+            ordered = self._pre_roll[start:start + filled]
+        else:
+            ordered = np.concatenate((self._pre_roll[start:], self._pre_roll[:self._pre_roll_pos]))
+        self._pre_roll_filled = 0
+        self._pre_roll_pos = 0
+        return ordered.tobytes()
+
+    def reset(self):
+        self._buffer.clear()
+        self._active = False
+        self.endpointer.reset()
+        self._pre_roll_filled = 0
+        self._pre_roll_pos = 0
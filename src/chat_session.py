@@ -0,0 +1,143 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from config.config import config
+from .conversation_memory import ConversationMemory
+
+class ChatSession:
+    """
+    Trạng thái chatbot của một cuộc gọi: lịch sử (OpenAI) hoặc conversation_id
+    (Dify) và trạng thái ngắt lời. Dùng __slots__ vì mỗi process giữ hàng trăm
+    session cùng lúc.
+    """
+
+    __slots__ = ('call_id', 'memory', 'conversation_id', 'streaming', 'heard', 'last_active', 'counted')
+
+    def __init__(self, call_id, memory=None):
+        self.call_id = call_id
+        self.memory = memory
+        self.conversation_id = str(uuid.uuid4())
+        self.streaming = False       # Đang stream phản hồi
+        self.heard = None            # Phần phản hồi caller đã nghe khi bị ngắt lời giữa stream
+        self.last_active = time.monotonic()
+        self.counted = 0             # Số token đã cộng vào tổng của ChatSessionManager
+
+    @property
+    def tokens(self):
+        return self.memory.tokens if self.memory is not None else 0
+
+    def reset(self):
+        """Bắt đầu hội thoại mới trên cùng cuộc gọi"""
+        self.conversation_id = str(uuid.uuid4())
+        if self.memory is not None:
+            self.memory.close()
+            self.memory = ConversationMemory()
+
+    def close(self):
+        if self.memory is not None:
+            self.memory.close()
+
+class ChatSessionManager:
+    """
+    Ánh xạ call ID -> ChatSession, theo thứ tự dùng gần nhất.
+    Session không có lượt hội thoại nào trong ttl giây bị xóa; khi vượt
+    max_sessions hoặc tổng token lịch sử vượt max_tokens, session dùng lâu
+    nhất mà không đang stream bị xóa trước. Tổng token được cộng dồn theo
+    chênh lệch của các session vừa có lượt hội thoại, không tính lại trên mọi
+    session; run() dọn định kỳ để bộ nhớ của cuộc gọi im lặng được giải phóng
+    cả khi không có cuộc gọi mới nào gọi get().
+    """
+
+    def __init__(self, ttl=None, max_sessions=None, max_tokens=None):
+        self.ttl = ttl or config.CHAT_SESSION_TTL
+        self.max_sessions = max_sessions or config.CHAT_SESSIONS_MAX
+        self.max_tokens = max_tokens or config.CHAT_SESSIONS_MAX_TOKENS
+        self._sessions = OrderedDict()
+        self._changed = {}           # call_id -> session có lượt hội thoại từ lần dọn trước
+        self.tokens = 0              # Tổng token lịch sử đã tính của mọi session
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, call_id):
+        return call_id in self._sessions
+
+    def get(self, call_id):
+        """Session của cuộc gọi (tạo mới nếu chưa có hoặc đã bị xóa), đánh dấu vừa dùng"""
+        session = self._sessions.get(call_id)
+        if session is None:
+            memory = ConversationMemory() if config.BOT_TYPE != "dify" else None
+            session = self._sessions[call_id] = ChatSession(call_id, memory)
+        else:
+            self._sessions.move_to_end(call_id)
+        session.last_active = time.monotonic()
+        # Lịch sử của session thay đổi trong lượt này: tính lại ở lần dọn kế tiếp
+        self._account(session)
+        self._changed[call_id] = session
+        self._evict(keep=session)
+        return session
+
+    def end(self, call_id):
+        session = self._sessions.pop(call_id, None)
+        if session is not None:
+            self._forget(session)
+            session.close()
+
+    def _account(self, session):
+        tokens = session.tokens
+        self.tokens += tokens - session.counted
+        session.counted = tokens
+
+    def _forget(self, session):
+        self.tokens -= session.counted
+        session.counted = 0
+        self._changed.pop(session.call_id, None)
+
+    def sweep(self):
+        """Cập nhật token của các session vừa có lượt hội thoại rồi xóa session hết hạn/vượt giới hạn"""
+        for call_id, session in list(self._changed.items()):
+            self._account(session)
+            if not session.streaming:
+                del self._changed[call_id]
+        self._evict(keep=None)
+
+    async def run(self, interval=None):
+        """Dọn session định kỳ (chạy như một task trong suốt vòng đời bot)"""
+        interval = interval or config.CHAT_SESSION_SWEEP_INTERVAL
+        while True:
+            await asyncio.sleep(interval)
+            self.sweep()
+
+    def _evict(self, keep):
+        now = time.monotonic()
+        # Session cũ nhất nằm đầu OrderedDict: dừng ở session đầu tiên còn hoạt động
+        for call_id, session in list(self._sessions.items()):
+            if now - session.last_active < self.ttl:
+                break
+            if not session.streaming:
+                self._drop(call_id)
+
+        for call_id, session in list(self._sessions.items()):
+            if len(self._sessions) <= self.max_sessions and self.tokens <= self.max_tokens:
+                break
+            if session is keep or session.streaming:
+                continue
+            self._drop(call_id)
+
+    def _drop(self, call_id):
+        session = self._sessions.pop(call_id)
+        self._forget(session)
+        session.close()
+        self.evicted += 1
+
+    def close(self):
+        for session in self._sessions.values():
+            session.close()
+        self._sessions.clear()
+        self._changed.clear()
+        self.tokens = 0
+
+# Session chatbot dùng chung trong process
+chat_sessions = ChatSessionManager()
@@ -85,18 +85,29 @@
 #         return False
 
 import os
-from openai import OpenAI
 from config.config import config
 from .dify_bot_client import DifyBotClient
+from .sentence_stream import iter_sentences
+from . import clients
+from . import tracing
+
+async def _traced_tokens(tokens):
+    """Ghi mốc gửi request, token đầu và token cuối của LLM cho lượt hiện tại"""
+    tracing.mark("llm_sent")
+    async for token in tokens:
+        tracing.mark("llm_first_token")
+        yield token
+    tracing.mark("llm_last_token")
 
 class ChatbotClient:
     """
     Manages conversation with OpenAI's GPT model.
-    Maintains conversation history and handles the chat flow.
+    Stateless across calls: conversation state lives in a ChatSession
+    (see chat_session.chat_sessions), so one client serves every call.
     """
     
     def __init__(self, config):
-        """Initialize OpenAI client and conversation history"""
+        """Initialize the bot backend"""
         self.config = config
         # Khởi tạo end_keywords cho mọi loại bot
         self.end_keywords = config.END_CONVERSATION_KEYWORDS
@@ -106,16 +117,42 @@ class ChatbotClient:
                 api_url=config.DIFY_API_URL,
                 api_key=config.DIFY_API_KEY
             )
-        else:
-            self.conversation_history = []
-            self.client = OpenAI(api_key=config.OPENAI_API_KEY)  # Sử dụng OpenAI client mới
+
+    @property
+    def client(self):
+        # Client async dùng chung trong process, trên pool kết nối chung
+        return clients.async_openai()
+
+    def _prompt(self, session):
+        memory = session.memory
+        messages = memory.prompt()
+        print(f"Prompt lịch sử: {memory.last_prompt_tokens} token "
+              f"(tiết kiệm {memory.last_saved_tokens} token)")
+        return messages
+
+    async def _summarize(self, summary, messages):
+        """Tóm tắt các lượt cũ (gộp với bản tóm tắt trước) để giữ ngữ cảnh với ít token hơn"""
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        if summary:
+            transcript = f"Tóm tắt trước đó: {summary}\n{transcript}"
+        response = await self.client.chat.completions.create(
+            model=self.config.MEMORY_SUMMARY_MODEL or self.config.GPT_MODEL,
+            messages=[
+                {"role": "system", "content": "Tóm tắt ngắn gọn cuộc hội thoại sau bằng tiếng Việt, "
+                                              "giữ lại tên, số liệu, yêu cầu và các thông tin đã thống nhất."},
+                {"role": "user", "content": transcript}
+            ],
+            max_tokens=self.config.MEMORY_SUMMARY_MAX_TOKENS
+        )
+        return response.choices[0].message.content
     
-    async def get_response(self, message):
+    async def get_response(self, message, session):
         """
         Get response from GPT model for user input.
         
         Args:
             message (str): User's message text
+            session (ChatSession): Conversation state of the call
             
         Returns:
             str: Bot's response
@@ -125,26 +162,28 @@ class ChatbotClient:
             Handles API errors gracefully
         """
         if self.config.BOT_TYPE == "dify":
-            # Reset conversation nếu là tin nhắn đầu tiên
-            if not hasattr(self, 'conversation_started'):
-                self.bot.reset_conversation()
-                self.conversation_started = True
-            return await self.bot.get_response(message)
+            tracing.mark("llm_sent")
+            try:
+                return await self.bot.get_response(message, session)
+            finally:
+                tracing.mark("llm_first_token")
+                tracing.mark("llm_last_token")
         else:
-            self.conversation_history.append({"role": "user", "content": message})
+            session.memory.append("user", message)
             
             try:
                 # Sử dụng API mới của OpenAI
-                response = self.client.chat.completions.create(
+                tracing.mark("llm_sent")
+                response = await self.client.chat.completions.create(
                     model=self.config.GPT_MODEL,
-                    messages=self.conversation_history
+                    messages=self._prompt(session)
                 )
+                tracing.mark("llm_first_token")
+                tracing.mark("llm_last_token")
                 
                 bot_response = response.choices[0].message.content
-                self.conversation_history.append({
-                    "role": "assistant", 
-                    "content": bot_response
-                })
+                session.memory.append("assistant", bot_response)
+                session.memory.compact(self._summarize)
                 
                 return bot_response
                 
@@ -152,6 +191,81 @@ class ChatbotClient:
                 print(f"Error calling OpenAI API: {e}")
                 return "Xin lỗi, tôi đang gặp sự cố kỹ thuật."
     
+    async def stream_response(self, message, session):
+        """
+        Stream phản hồi từ chatbot theo từng câu hoàn chỉnh.
+        
+        Args:
+            message (str): User's message text
+            session (ChatSession): Conversation state of the call
+            
+        Yields:
+            str: Từng câu của phản hồi, ngay khi LLM sinh xong câu đó
+            
+        Note:
+            Toàn bộ phản hồi được lưu vào lịch sử khi stream kết thúc
+        """
+        if self.config.BOT_TYPE == "dify":
+            async for sentence in iter_sentences(_traced_tokens(self.bot.stream_response(message, session))):
+                yield sentence
+            return
+
+        session.memory.append("user", message)
+        sentences = []
+        session.streaming = True
+        session.heard = None
+        try:
+            async for sentence in iter_sentences(_traced_tokens(self._stream_openai_tokens(session))):
+                sentences.append(sentence)
+                yield sentence
+        except Exception as e:
+            print(f"Error calling OpenAI API: {e}")
+            if not sentences:
+                # Câu xin lỗi chỉ để phát cho caller, không lưu vào lịch sử như lời của bot
+                yield "Xin lỗi, tôi đang gặp sự cố kỹ thuật."
+        finally:
+            # Bị ngắt lời khi đang stream: chỉ lưu phần caller đã nghe
+            content = " ".join(sentences) if session.heard is None else session.heard
+            if sentences and content:
+                session.memory.append("assistant", content)
+            session.streaming = False
+            session.heard = None
+            # Tóm tắt lượt cũ sau khi trả lời xong, không nằm trên đường trả lời
+            session.memory.compact(self._summarize)
+
+    def record_interruption(self, heard, session):
+        """
+        Ghi nhận người dùng ngắt lời: lịch sử chỉ giữ phần phản hồi đã thực sự phát.
+
+        Args:
+            heard (str): Các câu đã phát xong trước khi bị ngắt lời
+            session (ChatSession): Conversation state of the call
+        """
+        if self.config.BOT_TYPE == "dify":
+            # Lịch sử do Dify server giữ, không sửa được từ phía client
+            return
+        heard = f"{heard} ..." if heard else ""
+        if session.streaming:
+            session.heard = heard
+            return
+        last = session.memory.last
+        if last and last["role"] == "assistant":
+            if heard:
+                session.memory.replace_last(heard)
+            else:
+                session.memory.pop()
+
+    async def _stream_openai_tokens(self, session):
+        """Token stream từ OpenAI chat completions"""
+        stream = await self.client.chat.completions.create(
+            model=self.config.GPT_MODEL,
+            messages=self._prompt(session),
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
     def should_end_conversation(self, text: str) -> bool:
         """
         Check if the conversation should be ended based on user input.
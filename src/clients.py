@@ -0,0 +1,66 @@
+import importlib
+import threading
+from config.config import config
+from .http_transport import transport
+
+_clients = {}
+_lock = threading.Lock()
+
+def shared(name, factory, is_stale=None):
+    """
+    Client dùng chung trong process theo tên: factory() chỉ được gọi ở lần đầu
+    (hoặc khi is_stale(entry) cho biết client cũ không dùng được nữa). Giá trị
+    được lưu là nguyên kết quả của factory().
+    """
+    with _lock:
+        client = _clients.get(name)
+        if client is None or (is_stale is not None and is_stale(client)):
+            client = _clients[name] = factory()
+        return client
+
+def async_openai():
+    """AsyncOpenAI dùng chung, chạy trên pool kết nối của transport"""
+    def create():
+        from openai import AsyncOpenAI
+        http_client = transport.client_for(config.OPENAI_BASE_URL)
+        client = AsyncOpenAI(
+            api_key=config.OPENAI_API_KEY,
+            base_url=config.OPENAI_BASE_URL,
+            http_client=http_client
+        )
+        # Giữ http_client cạnh client trong registry thay vì gắn thuộc tính lên client
+        return client, http_client
+
+    # transport.aclose() đóng pool: tạo lại client trên pool mới
+    client, _ = shared("openai_async", create, lambda entry: entry[1].is_closed)
+    return client
+
+def sync_openai():
+    """OpenAI (đồng bộ) dùng chung, cho các thread ghi âm/phát ở chế độ local"""
+    def create():
+        from openai import OpenAI
+        return OpenAI(api_key=config.OPENAI_API_KEY, base_url=config.OPENAI_BASE_URL)
+
+    return shared("openai_sync", create)
+
+def provider_modules():
+    """Các module nặng mà cấu hình provider hiện tại sẽ cần"""
+    modules = ["underthesea"]
+    if "openai" in (config.STT_PROVIDER, config.TTS_PROVIDER) or config.BOT_TYPE != "dify":
+        modules.append("openai")
+    if config.TTS_PROVIDER == "local" or config.STT_STREAMING == "websocket":
+        modules.append("websockets")
+    if config.STT_UPLOAD_FORMAT != "wav":
+        modules.append("soundfile")
+    return modules
+
+def preload(modules=None):
+    """
+    Import trước các module nặng (chạy trong thread trong lúc chờ cuộc gọi đầu
+    tiên), để import main nhanh mà lượt hội thoại đầu không phải chờ import.
+    """
+    for name in modules or provider_modules():
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"Không import được {name}: {e}")
@@ -0,0 +1,169 @@
+import asyncio
+from config.config import config
+
+# Token thêm cho mỗi message (role, phân cách) theo định dạng chat
+MESSAGE_OVERHEAD = 4
+
+def token_counter(model=None):
+    """
+    Hàm đếm token cho model: dùng tiktoken nếu có cài, nếu không thì ước lượng
+    theo số ký tự (ước lượng dư một chút để không vượt budget).
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return lambda text: len(text) // 3 + 1
+    try:
+        encoding = tiktoken.encoding_for_model(model or config.GPT_MODEL)
+    except KeyError:
+        encoding = tiktoken.get_encoding("o200k_base")
+    return lambda text: len(encoding.encode(text))
+
+_counter = None
+
+def _default_counter():
+    # Mọi hội thoại dùng chung một bộ đếm (tạo encoding tiktoken một lần)
+    global _counter
+    if _counter is None:
+        _counter = token_counter()
+    return _counter
+
+class ConversationMemory:
+    """
+    Lịch sử hội thoại gửi cho LLM, giới hạn theo số token.
+    Số token của mỗi message được tính một lần khi thêm vào. Prompt chỉ gồm
+    bản tóm tắt và các message mới nhất vừa token_budget; khi lịch sử vượt
+    compact_tokens, các lượt cũ được tóm tắt ở background (không chặn lượt
+    hội thoại hiện tại), chỉ giữ nguyên văn khoảng keep_recent_tokens gần nhất.
+    Lịch sử giữ trong bộ nhớ không vượt max_tokens: message cũ nhất bị bỏ.
+    """
+
+    __slots__ = ('token_budget', 'compact_tokens', 'keep_recent_tokens', 'max_tokens', 'count_tokens',
+                 'messages', '_tokens', '_kept_tokens', 'summary', '_summary_tokens', '_compaction',
+                 'history_tokens', 'last_prompt_tokens', 'last_saved_tokens', 'compactions')
+
+    def __init__(self, token_budget=None, compact_tokens=None, keep_recent_tokens=None,
+                 max_tokens=None, count_tokens=None):
+        self.token_budget = token_budget or config.MEMORY_TOKEN_BUDGET
+        self.compact_tokens = compact_tokens or config.MEMORY_COMPACT_TOKENS
+        self.keep_recent_tokens = keep_recent_tokens or config.MEMORY_KEEP_RECENT_TOKENS
+        self.max_tokens = max_tokens or config.MEMORY_MAX_TOKENS
+        self.count_tokens = count_tokens or _default_counter()
+
+        self.messages = []
+        self._tokens = []            # Số token của từng message, cùng thứ tự với messages
+        self._kept_tokens = 0        # Tổng của _tokens
+        self.summary = None
+        self._summary_tokens = 0
+        self._compaction = None
+
+        self.history_tokens = 0      # Số token nếu gửi toàn bộ lịch sử (không tóm tắt/cắt)
+        self.last_prompt_tokens = 0
+        self.last_saved_tokens = 0
+        self.compactions = 0
+
+    def __len__(self):
+        return len(self.messages)
+
+    @property
+    def tokens(self):
+        """Số token của bản tóm tắt và các message đang giữ"""
+        return self._summary_tokens + self._kept_tokens
+
+    @property
+    def last(self):
+        return self.messages[-1] if self.messages else None
+
+    def append(self, role, content):
+        tokens = self.count_tokens(content) + MESSAGE_OVERHEAD
+        self.messages.append({"role": role, "content": content})
+        self._tokens.append(tokens)
+        self._kept_tokens += tokens
+        self.history_tokens += tokens
+        # Phần quá cũ không bao giờ được gửi lại nữa (tóm tắt chậm hoặc lỗi): bỏ khỏi bộ nhớ
+        while self._kept_tokens > self.max_tokens and len(self.messages) > 1:
+            self._kept_tokens -= self._tokens.pop(0)
+            self.messages.pop(0)
+
+    def replace_last(self, content):
+        tokens = self.count_tokens(content) + MESSAGE_OVERHEAD
+        self.history_tokens += tokens - self._tokens[-1]
+        self._kept_tokens += tokens - self._tokens[-1]
+        self.messages[-1] = {"role": self.messages[-1]["role"], "content": content}
+        self._tokens[-1] = tokens
+
+    def pop(self):
+        tokens = self._tokens.pop()
+        self.history_tokens -= tokens
+        self._kept_tokens -= tokens
+        return self.messages.pop()
+
+    def prompt(self):
+        """Các message gửi cho LLM: bản tóm tắt + các message mới nhất vừa token_budget"""
+        budget = self.token_budget - self._summary_tokens
+        used = 0
+        start = len(self.messages)
+        while start > 0 and (used + self._tokens[start - 1] <= budget or start == len(self.messages)):
+            # Message mới nhất (câu người dùng vừa nói) luôn được gửi
+            start -= 1
+            used += self._tokens[start]
+
+        messages = self.messages[start:]
+        if self.summary:
+            messages = [self._summary_message()] + messages
+            used += self._summary_tokens
+        self.last_prompt_tokens = used
+        self.last_saved_tokens = self.history_tokens - used
+        return messages
+
+    def _summary_message(self):
+        return {"role": "system", "content": f"Tóm tắt phần trước của cuộc hội thoại: {self.summary}"}
+
+    def compact(self, summarize):
+        """
+        Bắt đầu tóm tắt các lượt cũ ở background nếu lịch sử đã vượt compact_tokens.
+        summarize(summary_cũ, messages) là coroutine trả về bản tóm tắt mới.
+        """
+        if self._compaction is not None and not self._compaction.done():
+            return self._compaction
+        if self.tokens <= self.compact_tokens:
+            return None
+        self._compaction = asyncio.create_task(self._compact(summarize))
+        return self._compaction
+
+    async def _compact(self, summarize):
+        # Giữ nguyên văn các message gần nhất (ít nhất một lượt hỏi-đáp)
+        kept = 0
+        count = len(self.messages)
+        while count > 0 and (kept + self._tokens[count - 1] <= self.keep_recent_tokens
+                             or len(self.messages) - count < 2):
+            count -= 1
+            kept += self._tokens[count]
+        if count == 0:
+            return
+        old = self.messages[:count]
+
+        try:
+            summary = await summarize(self.summary, old)
+        except Exception as e:
+            # Prompt vẫn được giới hạn bằng cửa sổ token, thử lại ở lượt sau
+            print(f"Lỗi khi tóm tắt lịch sử hội thoại: {e}")
+            return
+        if not summary:
+            return
+
+        # Trong lúc tóm tắt chỉ phần cuối lịch sử có thể thay đổi; bỏ kết quả nếu phần đầu đã khác
+        if len(self.messages) < count or any(a is not b for a, b in zip(old, self.messages)):
+            return
+        self._kept_tokens -= sum(self._tokens[:count])
+        del self.messages[:count]
+        del self._tokens[:count]
+        self.summary = summary
+        self._summary_tokens = self.count_tokens(self._summary_message()["content"]) + MESSAGE_OVERHEAD
+        self.compactions += 1
+
+    def close(self):
+        """Hủy việc tóm tắt đang chạy (khi kết thúc cuộc gọi)"""
+        if self._compaction is not None:
+            self._compaction.cancel()
+            self._compaction = None
@@ -1,6 +1,5 @@
-import requests
 import json
-import uuid
+from .http_transport import transport
 
 class DifyBotClient:
     def __init__(self, api_url, api_key):
@@ -10,21 +9,19 @@ class DifyBotClient:
             'Authorization': f'Bearer {api_key}',
             'Content-Type': 'application/json'
         }
-        # Tạo conversation_id mới khi khởi tạo bot
-        self.conversation_id = str(uuid.uuid4())
 
-    async def get_response(self, query, user_id="default-user"):
+    async def get_response(self, query, session, user_id="default-user"):
         payload = {
             "inputs": {},
             "query": query,
             "response_mode": "blocking",
-            "conversation_id": self.conversation_id,  # Sử dụng conversation_id đã tạo
+            "conversation_id": session.conversation_id,  # conversation_id riêng của cuộc gọi
             "user": user_id,
             "files": []
         }
 
         try:
-            response = requests.post(
+            response = await transport.post(
                 self.api_url,
                 headers=self.headers,
                 json=payload
@@ -35,7 +32,7 @@ class DifyBotClient:
             
             # Cập nhật conversation_id từ response nếu có
             if 'conversation_id' in response_data:
-                self.conversation_id = response_data['conversation_id']
+                session.conversation_id = response_data['conversation_id']
             
             return response_data.get('answer', '')
             
@@ -43,6 +40,37 @@ class DifyBotClient:
             print(f"Error calling Dify API: {str(e)}")
             return "Sorry, I encountered an error while processing your request."
 
-    def reset_conversation(self):
-        """Reset conversation bằng cách tạo conversation_id mới"""
-        self.conversation_id = str(uuid.uuid4()) 
\ No newline at end of file
+    async def stream_response(self, query, session, user_id="default-user"):
+        """Stream token trả lời bằng response_mode "streaming" (server-sent events)"""
+        payload = {
+            "inputs": {},
+            "query": query,
+            "response_mode": "streaming",
+            "conversation_id": session.conversation_id,
+            "user": user_id,
+            "files": []
+        }
+
+        async def events():
+            async with transport.stream('POST', self.api_url, headers=self.headers, json=payload) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line.startswith('data:'):
+                        yield json.loads(line[5:])
+
+        answered = False
+        try:
+            async for event in events():
+                # Cập nhật conversation_id từ response nếu có
+                if event.get('conversation_id'):
+                    session.conversation_id = event['conversation_id']
+
+                if event.get('event') in ('message', 'agent_message') and event.get('answer'):
+                    answered = True
+                    yield event['answer']
+                elif event.get('event') == 'error':
+                    raise RuntimeError(event.get('message', 'unknown error'))
+        except Exception as e:
+            print(f"Error calling Dify API: {str(e)}")
+            if not answered:
+                yield "Sorry, I encountered an error while processing your request."
@@ -0,0 +1,135 @@
+import re
+import numpy as np
+from config.config import config
+
+# Tiểu từ cuối câu thường gặp khi nói tiếng Việt (câu hỏi, lời lịch sự)
+FINAL_PARTICLES = frozenset({
+    "ạ", "nhé", "nha", "nhá", "không", "chưa", "vậy", "thế", "hả", "à", "ha", "nhỉ", "đó", "đấy", "thôi", "rồi",
+})
+# Câu kết thúc bằng từ nối thì người nói gần như chắc chắn còn nói tiếp
+CONTINUATION_WORDS = frozenset({
+    "và", "với", "nhưng", "hoặc", "hay", "là", "thì", "mà", "của", "để", "vì", "nên", "rằng", "cho", "ở",
+    "các", "những", "nếu", "khi", "còn", "and", "or", "but", "the", "to", "of",
+})
+_WORDS = re.compile(r"\w+")
+
+def sentence_complete(text):
+    """Transcript tạm có vẻ đã là một câu trọn vẹn (dấu kết câu hoặc tiểu từ cuối câu)"""
+    text = text.strip()
+    words = _WORDS.findall(text.lower())
+    if not words or words[-1] in CONTINUATION_WORDS or text.endswith(('...', '…', ',')):
+        return False
+    return text[-1] in '.?!' or words[-1] in FINAL_PARTICLES
+
+def estimate_pitch(samples, sample_rate, min_pitch=70, max_pitch=400, voicing=0.4):
+    """F0 (Hz) theo tự tương quan (tính bằng FFT), None nếu đoạn không đủ hữu thanh"""
+    x = samples.astype(np.float32)
+    x -= x.mean()
+    size = 1 << (2 * len(x) - 1).bit_length()
+    spectrum = np.fft.rfft(x, size)
+    correlation = np.fft.irfft(spectrum * np.conj(spectrum), size)[:len(x)]
+    low = sample_rate // max_pitch
+    high = min(len(x) - 1, sample_rate // min_pitch)
+    if correlation[0] <= 0 or high <= low:
+        return None
+    lag = low + int(np.argmax(correlation[low:high]))
+    if correlation[lag] < voicing * correlation[0]:
+        return None
+    return sample_rate / lag
+
+def falling_contour(samples, sample_rate, pitch_fall=0.08):
+    """
+    Ngữ điệu kết câu ở cuối đoạn tiếng nói: F0 của nửa sau thấp hơn nửa đầu
+    ít nhất pitch_fall và năng lượng giảm. Chỉ là gợi ý: thanh huyền/nặng của
+    tiếng Việt cũng làm F0 đi xuống, nên chỉ dùng để rút ngắn thời gian chờ.
+    """
+    half = len(samples) // 2
+    if half < 2 * sample_rate // 70:
+        return False
+    first, second = samples[:half], samples[half:2 * half]
+    first_pitch = estimate_pitch(first, sample_rate)
+    second_pitch = estimate_pitch(second, sample_rate)
+    if first_pitch is None or second_pitch is None:
+        return False
+    first_energy = np.mean(np.abs(first.astype(np.int32)))
+    second_energy = np.mean(np.abs(second.astype(np.int32)))
+    return second_pitch < first_pitch * (1 - pitch_fall) and second_energy < first_energy
+
+class Endpointer:
+    """
+    Quyết định người nói đã hết lượt theo thời gian im lặng (ms) sau tiếng nói.
+    Mặc định chờ silence_ms; rút còn short_silence_ms khi transcript tạm của
+    STT streaming trong lúc im lặng là một câu trọn vẹn đủ min_words từ VÀ
+    được xác nhận bởi ngữ điệu kết câu của đoạn tiếng nói vừa dứt (xét
+    prosody_ms cuối, một lần mỗi quãng im lặng) hoặc trùng với partial trước
+    đó. Dấu câu cuối không đủ làm bằng chứng: Whisper thêm dấu chấm vào gần
+    như mọi hypothesis. Tiếng nói trở lại thì các gợi ý này bị bỏ.
+    """
+
+    def __init__(self, sample_rate, silence_ms=None, short_silence_ms=None, prosody_ms=None, min_words=None):
+        self.sample_rate = sample_rate
+        self.silence_ms = silence_ms or config.ENDPOINT_SILENCE_MS
+        self.short_silence_ms = min(self.silence_ms, short_silence_ms or config.ENDPOINT_SHORT_SILENCE_MS)
+        prosody_ms = config.ENDPOINT_PROSODY_MS if prosody_ms is None else prosody_ms
+        self.prosody_samples = sample_rate * prosody_ms // 1000
+        self.min_words = config.ENDPOINT_MIN_WORDS if min_words is None else min_words
+        self.reset()
+
+    def reset(self):
+        """Bắt đầu utterance mới"""
+        self._last_partial = None
+        self._clear_hints()
+
+    def _clear_hints(self):
+        self.silence_samples = 0
+        self.final_prosody = False
+        self.final_transcript = False
+        self.stable_transcript = False
+
+    @property
+    def silence_elapsed_ms(self):
+        return 1000 * self.silence_samples // self.sample_rate
+
+    @property
+    def confident(self):
+        """Transcript tạm là câu trọn vẹn và được một tín hiệu độc lập xác nhận"""
+        return self.final_transcript and (self.final_prosody or self.stable_transcript)
+
+    @property
+    def timeout_ms(self):
+        return self.short_silence_ms if self.confident else self.silence_ms
+
+    @property
+    def reason(self):
+        """Lý do của thời gian chờ hiện tại (để log)"""
+        if not self.confident:
+            return "im lặng"
+        return "transcript + ngữ điệu" if self.final_prosody else "transcript ổn định"
+
+    def push(self, samples, is_speech, audio=None):
+        """
+        Cập nhật với một chunk samples sample, trả về True khi hết lượt nói.
+        audio: mảng int16 của utterance tới hết chunk này, dùng để xét ngữ điệu.
+        """
+        if is_speech:
+            self._clear_hints()
+            return False
+        if self.silence_samples == 0 and audio is not None and self.prosody_samples:
+            # Chunk im lặng đầu tiên: đoạn ngay trước nó là phần cuối của tiếng nói
+            end = len(audio) - samples
+            if end >= self.prosody_samples:
+                self.final_prosody = falling_contour(audio[end - self.prosody_samples:end], self.sample_rate)
+        self.silence_samples += samples
+        return self.silence_elapsed_ms >= self.timeout_ms
+
+    def on_transcript(self, text):
+        """Transcript tạm bao phủ toàn bộ phần đã nói (gọi được từ thread khác)"""
+        words = _WORDS.findall(text.lower())
+        # So theo từ, bỏ dấu câu: Whisper có thể thêm/bớt dấu chấm giữa hai lần nhận dạng
+        stable = bool(words) and words == self._last_partial
+        self._last_partial = words
+        if not self.silence_samples:
+            return
+        if len(words) >= self.min_words and sentence_complete(text):
+            self.final_transcript = True
+            self.stable_transcript = self.stable_transcript or stable
@@ -0,0 +1,74 @@
+import asyncio
+from urllib.parse import urlsplit
+import httpx
+from config.config import config
+
+class HTTPTransport:
+    """
+    Lớp HTTP async dùng chung cho mọi provider (STT, Dify, OpenAI).
+    Mỗi host có một httpx.AsyncClient riêng với pool kết nối keep-alive,
+    giới hạn số kết nối và timeout, nên nhiều lượt hội thoại có thể chạy
+    song song mà không chặn event loop hay mở lại kết nối mỗi request.
+    """
+
+    def __init__(self, max_connections_per_host=None, max_keepalive_per_host=None,
+                 keepalive_expiry=None, timeout=None, connect_timeout=None):
+        self.limits = httpx.Limits(
+            max_connections=max_connections_per_host or config.HTTP_MAX_CONNECTIONS_PER_HOST,
+            max_keepalive_connections=max_keepalive_per_host or config.HTTP_MAX_KEEPALIVE_PER_HOST,
+            keepalive_expiry=keepalive_expiry or config.HTTP_KEEPALIVE_EXPIRY
+        )
+        self.timeout = httpx.Timeout(
+            timeout or config.HTTP_TIMEOUT,
+            connect=connect_timeout or config.HTTP_CONNECT_TIMEOUT
+        )
+        self._clients = {}
+
+    @staticmethod
+    def origin(url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def client_for(self, url):
+        """httpx.AsyncClient dùng chung cho host của url"""
+        origin = self.origin(url)
+        client = self._clients.get(origin)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+            self._clients[origin] = client
+        return client
+
+    async def post(self, url, **kwargs):
+        return await self.client_for(url).post(url, **kwargs)
+
+    def stream(self, method, url, **kwargs):
+        return self.client_for(url).stream(method, url, **kwargs)
+
+    async def prewarm(self, urls):
+        """Mở sẵn kết nối (TCP/TLS) tới các host trước cuộc gọi đầu tiên"""
+        async def warm(origin):
+            try:
+                await self.client_for(origin).head(origin)
+            except httpx.HTTPError as e:
+                print(f"Không prewarm được {origin}: {e}")
+
+        origins = {self.origin(url) for url in urls}
+        await asyncio.gather(*(warm(origin) for origin in origins))
+
+    async def aclose(self):
+        clients, self._clients = self._clients, {}
+        await asyncio.gather(*(client.aclose() for client in clients.values()))
+
+def provider_urls():
+    """Các endpoint sẽ dùng theo cấu hình provider hiện tại"""
+    urls = []
+    if config.STT_PROVIDER == "local":
+        urls.append(config.STT_API_URL)
+    if config.BOT_TYPE == "dify":
+        urls.append(config.DIFY_API_URL)
+    if "openai" in (config.STT_PROVIDER, config.TTS_PROVIDER) or config.BOT_TYPE != "dify":
+        urls.append(config.OPENAI_BASE_URL)
+    return urls
+
+# Transport dùng chung trong process
+transport = HTTPTransport()
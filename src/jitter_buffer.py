@@ -0,0 +1,221 @@
+import math
+import numpy as np
+from config.config import config
+
+class JitterBuffer:
+    """
+    Jitter buffer thích ứng cho một luồng RTP (payload PCM 16-bit).
+    Gói được sắp xếp lại theo sequence number; khi thiếu gói, buffer chờ
+    tối đa target_depth gói tới sau rồi coi là mất và che lỗi bằng cách lặp
+    lại frame trước (giảm dần âm lượng) hoặc chèn comfort noise.
+    target_depth tự điều chỉnh theo jitter (RFC 3550) và độ lệch thứ tự đo được.
+    Sequence nhảy quá resync_packets (SSRC khởi động lại, đổi luồng, NAT treo
+    lâu) được xác nhận bằng gói liền sau như RFC 3550 (MAX_DROPOUT/MAX_MISORDER)
+    rồi đồng bộ lại, thay vì che lỗi từng sequence bị thiếu hoặc coi mọi gói
+    sau đó là tới muộn.
+    Payload được copy vào kho frame cấp phát trước (mỗi sequence một ô theo
+    seq % slots); frame trả về là memoryview vào kho, chỉ hợp lệ tới lần put kế tiếp.
+    """
+
+    def __init__(self, sample_rate, min_depth=None, max_depth=None, max_repeats=None, slots=None,
+                 resync_packets=None):
+        self.sample_rate = sample_rate
+        self.min_depth = min_depth or config.JITTER_MIN_DEPTH
+        self.max_depth = max_depth or config.JITTER_MAX_DEPTH
+        self.max_repeats = config.PLC_MAX_REPEATS if max_repeats is None else max_repeats
+        self.target_depth = self.min_depth
+        self.resync_packets = resync_packets or config.JITTER_RESYNC_PACKETS
+
+        self._packets = {}          # seq -> (timestamp, payload)
+
+        # Kho frame: slots ô, mỗi ô đủ cho một gói lớn nhất
+        self.slots = slots or config.JITTER_SLOTS
+        self._slot_size = config.RTP_MAX_PACKET_SIZE
+        self._store = memoryview(bytearray(self.slots * self._slot_size))
+        self._slot_owner = [None] * self.slots
+        self._last_store = memoryview(bytearray(self._slot_size))
+        self.next_seq = None
+        self._expected_ts = None
+        self._last_frame = None
+        self._repeats = 0
+        self._reorder_depth = 0.0
+        self._bad_seq = None        # Sequence mong đợi sau một bước nhảy lớn chưa được xác nhận
+
+        # Thống kê
+        self.received = 0
+        self.lost = 0
+        self.late = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.resyncs = 0
+        self.concealed_samples = 0
+        self.jitter = 0.0           # Giây
+        self._last_transit = None
+
+    @staticmethod
+    def _seq_diff(a, b):
+        """a - b theo modulo 2^16, trong khoảng [-32768, 32767]"""
+        return ((a - b + 0x8000) & 0xFFFF) - 0x8000
+
+    def put(self, header, payload, arrival):
+        """Thêm một gói (arrival: thời điểm nhận, giây), trả về các frame PCM sẵn sàng theo thứ tự"""
+        if not payload or len(payload) % 2:
+            return []
+        self.received += 1
+        self._update_jitter(header.timestamp, arrival)
+
+        seq = header.sequence_number
+        if self.next_seq is None:
+            self.next_seq = seq
+            self._expected_ts = header.timestamp
+
+        offset = self._seq_diff(seq, self.next_seq)
+        frames = []
+        if abs(offset) > self.resync_packets:
+            if seq != self._bad_seq:
+                # Có thể chỉ là một gói lạc: bỏ, chờ gói liền sau xác nhận bước nhảy
+                self._bad_seq = (seq + 1) & 0xFFFF
+                self.late += 1
+                return []
+            # Hai gói liên tiếp ở vị trí mới: luồng đã bị khởi động lại, đồng bộ lại từ đây
+            frames = self._resync(seq, header.timestamp)
+            offset = 0
+        self._bad_seq = None
+        if offset < 0:
+            # Đến sau khi vị trí của nó đã được phát/che lỗi
+            self.late += 1
+            return []
+        if seq in self._packets:
+            self.duplicates += 1
+            return []
+        if offset < len(self._packets):
+            # Có gói với sequence lớn hơn đã tới trước
+            self.reordered += 1
+            self._reorder_depth = max(self._reorder_depth, len(self._packets) - offset)
+
+        self._packets[seq] = (header.timestamp, self._keep(seq, payload))
+        self._adapt()
+        frames += self._release()
+        return frames
+
+    def _resync(self, seq, timestamp):
+        """Phát nốt các gói đang chờ của luồng cũ rồi neo next_seq và timestamp mong đợi vào gói mới"""
+        self.resyncs += 1
+        frames = [bytes(frame) for frame in self._release(flush=True)]
+        self._packets.clear()
+        self._slot_owner = [None] * self.slots
+        self.next_seq = seq
+        self._expected_ts = timestamp
+        self._last_transit = None
+        return frames
+
+    def _keep(self, seq, payload):
+        """Copy payload vào ô của seq; ô đang bận hoặc payload quá lớn thì copy ra bytes"""
+        slot = seq % self.slots
+        size = len(payload)
+        if size > self._slot_size or self._slot_owner[slot] is not None:
+            return bytes(payload)
+        self._slot_owner[slot] = seq
+        start = slot * self._slot_size
+        self._store[start:start + size] = payload
+        return self._store[start:start + size]
+
+    def _remember_last(self, payload):
+        """Giữ bản copy của frame cuối để che lỗi (ô trong kho có thể bị ghi đè)"""
+        size = len(payload)
+        if size > self._slot_size:
+            self._last_frame = bytes(payload)
+            return
+        self._last_store[:size] = payload
+        self._last_frame = self._last_store[:size]
+
+    def _update_jitter(self, timestamp, arrival):
+        transit = arrival - timestamp / self.sample_rate
+        if self._last_transit is not None:
+            d = abs(transit - self._last_transit)
+            # Bỏ qua bước nhảy lớn (đầu talkspurt mới, timestamp nhảy)
+            if d < 1.0:
+                self.jitter += (d - self.jitter) / 16
+        self._last_transit = transit
+
+    def _adapt(self):
+        """Độ sâu mục tiêu theo jitter và độ lệch thứ tự (suy giảm dần theo thời gian)"""
+        packet_time = self._packet_time()
+        jitter_packets = 2 * self.jitter / packet_time if packet_time else 0
+        self._reorder_depth *= 0.995
+        depth = math.ceil(max(jitter_packets, self._reorder_depth))
+        self.target_depth = min(self.max_depth, max(self.min_depth, depth))
+
+    def _packet_time(self):
+        if self._last_frame is not None:
+            return len(self._last_frame) / 2 / self.sample_rate
+        return config.RTP_PACKET_MS / 1000
+
+    def _release(self, flush=False):
+        frames = []
+        while self._packets:
+            packet = self._packets.pop(self.next_seq, None)
+            if packet is not None:
+                timestamp, payload = packet
+                slot = self.next_seq % self.slots
+                if self._slot_owner[slot] == self.next_seq:
+                    self._slot_owner[slot] = None
+                gap = self._ts_gap(timestamp)
+                if gap > 0:
+                    # Thiếu sample theo timestamp nhưng không thiếu sequence (vd. DTX)
+                    frames.append(self._conceal(gap))
+                frames.append(payload)
+                self._remember_last(payload)
+                self._repeats = 0
+                self._expected_ts = (timestamp + len(payload) // 2) & 0xFFFFFFFF
+                self.next_seq = (self.next_seq + 1) & 0xFFFF
+                continue
+
+            if not flush and len(self._packets) <= self.target_depth:
+                break
+
+            # Gói next_seq coi như mất
+            self.lost += 1
+            self.next_seq = (self.next_seq + 1) & 0xFFFF
+            samples = len(self._last_frame) // 2 if self._last_frame else 0
+            if samples:
+                frames.append(self._conceal(samples))
+                self._expected_ts = (self._expected_ts + samples) & 0xFFFFFFFF
+        return frames
+
+    def _ts_gap(self, timestamp):
+        gap = ((timestamp - self._expected_ts + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+        # Chỉ che lỗi khoảng trống hợp lý (< 1 giây)
+        if 0 < gap < self.sample_rate:
+            return gap
+        return 0
+
+    def _conceal(self, samples):
+        """Lặp lại frame trước với âm lượng giảm dần, sau max_repeats thì dùng comfort noise"""
+        self.concealed_samples += samples
+        if self._last_frame is not None and self._repeats < self.max_repeats:
+            self._repeats += 1
+            previous = np.frombuffer(self._last_frame, dtype=np.int16)
+            repeated = np.resize(previous, samples).astype(np.float32) * (0.5 ** self._repeats)
+            return repeated.astype(np.int16).tobytes()
+        noise = np.random.normal(0, config.COMFORT_NOISE_LEVEL, samples)
+        return np.clip(noise, -32768, 32767).astype(np.int16).tobytes()
+
+    def flush(self):
+        """Trả về mọi frame còn lại (che lỗi các khoảng trống), dùng khi luồng kết thúc"""
+        return self._release(flush=True)
+
+    def stats(self):
+        expected = self.received - self.duplicates - self.late + self.lost
+        return {
+            'received': self.received,
+            'lost': self.lost,
+            'late': self.late,
+            'duplicates': self.duplicates,
+            'reordered': self.reordered,
+            'resyncs': self.resyncs,
+            'loss_rate': round(self.lost / expected, 4) if expected > 0 else 0.0,
+            'jitter_ms': round(self.jitter * 1000, 2),
+            'target_depth': self.target_depth,
+            'concealed_ms': round(1000 * self.concealed_samples / self.sample_rate, 1),
+        }
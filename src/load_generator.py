@@ -0,0 +1,285 @@
+import asyncio
+import math
+import os
+import random
+import struct
+import time
+import wave
+import numpy as np
+from config.config import config
+from .rtp_handler import build_rtp_header, parse_rtp_header
+from .jitter_buffer import JitterBuffer
+from .resample import resample
+from .rtp_codec import Encoder, get_codec
+
+def load_wav(path):
+    """PCM 16-bit mono tại AUDIO_RATE từ file WAV (lấy kênh đầu, resample nếu cần)"""
+    with wave.open(path, 'rb') as wav_file:
+        if wav_file.getsampwidth() != 2:
+            raise ValueError(f"{path}: chỉ hỗ trợ WAV 16-bit")
+        channels = wav_file.getnchannels()
+        rate = wav_file.getframerate()
+        frames = wav_file.readframes(wav_file.getnframes())
+    if channels > 1:
+        frames = np.frombuffer(frames, dtype=np.int16)[::channels].tobytes()
+    if rate != config.AUDIO_RATE:
+        frames = resample(frames, rate, config.AUDIO_RATE)
+    return frames
+
+def load_corpus(paths):
+    """Các câu nói từ danh sách file WAV hoặc thư mục chứa file WAV"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith('.wav'))
+        else:
+            files.append(path)
+    return [load_wav(path) for path in files]
+
+def make_tone(seconds=1.5, amplitude=3000):
+    """Một "câu nói" tổng hợp: sóng 220 Hz điều biên 4 Hz như nhịp âm tiết"""
+    count = int(seconds * config.AUDIO_RATE)
+    samples = [int(amplitude * (0.6 + 0.4 * math.sin(2 * math.pi * 4 * i / config.AUDIO_RATE))
+                   * math.sin(2 * math.pi * 220 * i / config.AUDIO_RATE))
+               for i in range(count)]
+    return struct.pack(f'<{count}h', *samples)
+
+def packetize(pcm, codec, packet_ms=None):
+    """Mã hóa PCM tại AUDIO_RATE bằng codec và chia thành các payload RTP packet_ms, gói cuối đệm im lặng"""
+    encoder = Encoder(codec, config.AUDIO_RATE)
+    payload = encoder.encode(pcm) + encoder.flush()
+    size = codec.clock_rate * (packet_ms or config.RTP_PACKET_MS) // 1000 * codec.sample_bytes
+    payload += codec.silence_payload(-len(payload) % size // codec.sample_bytes)
+    return [payload[i:i + size] for i in range(0, len(payload), size)]
+
+def percentile(values, p):
+    """Percentile theo nearest-rank trên list đã sort, None nếu rỗng"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, math.ceil(p / 100 * len(values)) - 1))]
+
+def summarize(values, scale=1000):
+    """p50/p95/p99/max (ms) của một list giây"""
+    values = sorted(values)
+    return {
+        'count': len(values),
+        **{f'p{p}_ms': round(scale * percentile(values, p), 1) if values else None for p in (50, 95, 99)},
+        'max_ms': round(scale * values[-1], 1) if values else None,
+    }
+
+class NetworkImpairment:
+    """
+    Mô phỏng mạng giữa caller và bot: mỗi gói bị trễ thêm ngẫu nhiên tới
+    jitter_ms, bị mất với xác suất loss, hoặc bị giữ lại để tới sau gói kế
+    tiếp với xác suất reorder.
+    """
+
+    def __init__(self, jitter_ms=0, loss=0.0, reorder=0.0, seed=None):
+        self.jitter = jitter_ms / 1000
+        self.loss = loss
+        self.reorder = reorder
+        self.rng = random.Random(seed)
+
+    def delay(self, packet_time):
+        """Độ trễ thêm (giây) cho một gói, None nếu gói bị mất"""
+        if self.loss and self.rng.random() < self.loss:
+            return None
+        delay = self.rng.uniform(0, self.jitter) if self.jitter else 0.0
+        if self.reorder and self.rng.random() < self.reorder:
+            delay += 1.5 * packet_time
+        return delay
+
+class LoadResults:
+    """Kết quả gộp của mọi caller trong một lần chạy"""
+
+    def __init__(self):
+        self.turns = 0
+        self.reply_latency = []      # Giây từ gói tiếng nói cuối tới gói phản hồi đầu tiên
+        self.reply_duration = []     # Giây từ gói phản hồi đầu tới gói cuối
+        self.missed_replies = 0
+        self.sent_packets = 0
+        self.dropped_packets = 0     # Bị NetworkImpairment bỏ
+        self.reply_packets = 0
+        self.lost_reply_packets = 0  # Theo jitter buffer phía caller
+
+    def report(self):
+        return {
+            'turns': self.turns,
+            'replies': len(self.reply_latency),
+            'missed_replies': self.missed_replies,
+            'sent_packets': self.sent_packets,
+            'dropped_packets': self.dropped_packets,
+            'reply_packets': self.reply_packets,
+            'lost_reply_packets': self.lost_reply_packets,
+            'reply_latency': summarize(self.reply_latency),
+            'reply_duration': summarize(self.reply_duration),
+        }
+
+class _CallerProtocol(asyncio.DatagramProtocol):
+    def __init__(self, caller):
+        self.caller = caller
+
+    def datagram_received(self, data, addr):
+        self.caller.packet_received(data)
+
+class LoadCaller:
+    """
+    Một caller giả lập không cần microphone/loa: socket UDP và SSRC riêng, gửi
+    các câu nói (đã đóng gói sẵn bằng codec) theo nhịp thời gian thực, gửi im
+    lặng trong lúc chờ và nghe phản hồi. Phản hồi của bot được giải mã, ghép
+    lại qua jitter buffer và ghi ra file WAV mỗi lượt nếu có record_dir.
+    """
+
+    def __init__(self, index, remote, utterances, codec, impairment=None, record_dir=None, rng=None):
+        self.index = index
+        self.remote = remote
+        self.utterances = utterances     # Mỗi câu là danh sách payload RTP
+        self.codec = codec
+        self.impairment = impairment
+        self.record_dir = record_dir
+        rng = rng or random.Random()
+        self.ssrc = rng.getrandbits(32)
+        self.seq = rng.getrandbits(16)
+        self.timestamp = rng.getrandbits(32)
+        self.silence = codec.silence_payload(codec.samples(utterances[0][0]))
+        self.packet_time = codec.samples(self.silence) / codec.clock_rate
+
+        self.transport = None
+        self.jitter_buffer = JitterBuffer(codec.clock_rate)
+        self.reply_audio = []
+        self.reply_packets = 0
+        self.first_reply_time = None
+        self.last_reply_time = None
+        self.listening_since = None      # Lúc gửi gói tiếng nói cuối của lượt hiện tại
+        self.sent_packets = 0
+        self.dropped_packets = 0
+
+    def packet_received(self, data):
+        now = time.perf_counter()
+        self.reply_packets += 1
+        # Gói về khi caller còn đang nói (phản hồi muộn của lượt trước...) không phải phản hồi lượt này
+        if self.listening_since is not None and now >= self.listening_since:
+            self.last_reply_time = now
+            if self.first_reply_time is None:
+                self.first_reply_time = now
+        header = parse_rtp_header(data)
+        if header is None or header.payload_type != self.codec.payload_type:
+            return
+        payload = self.codec.decode(data[header.header_size:])
+        frames = self.jitter_buffer.put(header, payload, time.monotonic())
+        if self.record_dir:
+            # Frame là view vào kho của jitter buffer, phải copy trước lần put kế tiếp
+            self.reply_audio.extend(bytes(frame) for frame in frames)
+
+    def send(self, payload):
+        packet = build_rtp_header(self.seq, self.timestamp, self.ssrc,
+                                  payload_type=self.codec.payload_type) + payload
+        self.seq = (self.seq + 1) & 0xFFFF
+        self.timestamp = (self.timestamp + self.codec.samples(payload)) & 0xFFFFFFFF
+        self.sent_packets += 1
+        delay = self.impairment.delay(self.packet_time) if self.impairment else 0.0
+        if delay is None:
+            self.dropped_packets += 1
+        elif delay:
+            asyncio.get_running_loop().call_later(delay, self.transport.sendto, packet, self.remote)
+        else:
+            self.transport.sendto(packet, self.remote)
+
+    def _save_reply(self, turn):
+        self.reply_audio.extend(bytes(frame) for frame in self.jitter_buffer.flush())
+        if not self.reply_audio:
+            return
+        path = os.path.join(self.record_dir, f"call{self.index:04d}_turn{turn:02d}.wav")
+        with wave.open(path, 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(self.codec.clock_rate)
+            wav_file.writeframes(b''.join(self.reply_audio))
+        self.reply_audio = []
+
+    async def run(self, turns, results, start_delay=0.0, reply_timeout=15.0, reply_gap=0.5):
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: _CallerProtocol(self), local_addr=(config.RTP_LOCAL_IP, 0))
+        next_send = 0.0
+
+        async def tick():
+            # Giữ nhịp thời gian thực theo đồng hồ tuyệt đối, không cộng dồn sai số sleep
+            nonlocal next_send
+            next_send += self.packet_time
+            await asyncio.sleep(max(0, next_send - time.perf_counter()))
+
+        try:
+            await asyncio.sleep(start_delay)
+            next_send = time.perf_counter()
+            for turn in range(turns):
+                self.first_reply_time = None
+                self.last_reply_time = None
+                self.listening_since = None
+                for payload in self.utterances[(self.index + turn) % len(self.utterances)]:
+                    self.send(payload)
+                    last_speech_time = time.perf_counter()
+                    await tick()
+                self.listening_since = last_speech_time
+
+                # Như một cuộc gọi thật, caller vẫn gửi im lặng trong lúc chờ và nghe phản hồi
+                deadline = last_speech_time + reply_timeout
+                while time.perf_counter() < deadline:
+                    self.send(self.silence)
+                    await tick()
+                    if self.last_reply_time is not None and time.perf_counter() - self.last_reply_time > reply_gap:
+                        break
+
+                results.turns += 1
+                if self.first_reply_time is not None:
+                    results.reply_latency.append(self.first_reply_time - last_speech_time)
+                    results.reply_duration.append(self.last_reply_time - self.first_reply_time)
+                else:
+                    results.missed_replies += 1
+                if self.record_dir:
+                    self._save_reply(turn + 1)
+        finally:
+            self.transport.close()
+            results.sent_packets += self.sent_packets
+            results.dropped_packets += self.dropped_packets
+            results.reply_packets += self.reply_packets
+            results.lost_reply_packets += self.jitter_buffer.lost
+
+class LoadGenerator:
+    """
+    Giả lập N cuộc gọi RTP đồng thời tới bot từ một corpus câu nói, dùng để
+    đo tải mà không cần người gọi thật. Corpus được mã hóa bằng codec một lần
+    và dùng chung cho mọi caller. Các caller bắt đầu lệch nhau ngẫu nhiên
+    trong ramp giây để không dồn lượt vào cùng một thời điểm.
+    """
+
+    def __init__(self, remote, utterances, turns=1, codec=None, impairment=None, ramp=1.0,
+                 reply_timeout=15.0, reply_gap=0.5, record_dir=None, seed=None):
+        self.remote = remote
+        self.codec = codec or get_codec()
+        self.utterances = [packetize(pcm, self.codec) for pcm in utterances or [make_tone()]]
+        self.turns = turns
+        self.impairment = impairment
+        self.ramp = ramp
+        self.reply_timeout = reply_timeout
+        self.reply_gap = reply_gap
+        self.record_dir = record_dir
+        self.rng = random.Random(seed)
+        self._next_index = 0
+
+    async def run(self, calls):
+        """Chạy calls caller đồng thời tới khi xong mọi lượt, trả về LoadResults"""
+        if self.record_dir:
+            os.makedirs(self.record_dir, exist_ok=True)
+        results = LoadResults()
+        callers = []
+        for _ in range(calls):
+            callers.append(LoadCaller(self._next_index, self.remote, self.utterances, self.codec,
+                                      self.impairment, self.record_dir, self.rng))
+            self._next_index += 1
+        await asyncio.gather(*(
+            caller.run(self.turns, results, self.rng.uniform(0, self.ramp), self.reply_timeout, self.reply_gap)
+            for caller in callers
+        ))
+        return results
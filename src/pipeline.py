@@ -0,0 +1,187 @@
+import asyncio
+import threading
+import time
+from .tracing import tracer
+
+class StageMetrics:
+    """Số liệu của một stage, cộng dồn qua mọi cuộc gọi trong process"""
+
+    def __init__(self, name):
+        self.name = name
+        self.depth = 0           # Số item đang chờ trong hàng đợi của stage (mọi cuộc gọi)
+        self.max_depth = 0       # Độ sâu lớn nhất của một hàng đợi
+        self.items = 0           # Số item đã được stage lấy ra xử lý
+        self.dropped = 0         # Số item bị bỏ vì hàng đợi đầy (chỉ với audio thời gian thực)
+        self.wait = 0.0          # Tổng số giây các item nằm chờ trong hàng đợi
+
+    def to_dict(self):
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "items": self.items,
+            "dropped": self.dropped,
+            "mean_wait_ms": round(1000 * self.wait / self.items, 2) if self.items else None,
+        }
+
+class PipelineMetrics:
+    """Số liệu các stage theo tên, xuất cùng metrics Prometheus của tracer"""
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = StageMetrics(name)
+            return stage
+
+    def report(self):
+        return {name: stage.to_dict() for name, stage in self.stages.items()}
+
+    def prometheus(self):
+        lines = [
+            "# HELP callbot_stage_queue_depth Items waiting in each pipeline stage queue, summed over calls.",
+            "# TYPE callbot_stage_queue_depth gauge",
+        ]
+        stages = list(self.stages.values())
+        lines += [f'callbot_stage_queue_depth{{stage="{s.name}"}} {s.depth}' for s in stages]
+        lines += ["# HELP callbot_stage_items_total Items taken from each pipeline stage queue.",
+                  "# TYPE callbot_stage_items_total counter"]
+        lines += [f'callbot_stage_items_total{{stage="{s.name}"}} {s.items}' for s in stages]
+        lines += ["# HELP callbot_stage_dropped_total Items dropped because a stage queue was full.",
+                  "# TYPE callbot_stage_dropped_total counter"]
+        lines += [f'callbot_stage_dropped_total{{stage="{s.name}"}} {s.dropped}' for s in stages]
+        lines += ["# HELP callbot_stage_wait_seconds_total Time items spent waiting in each stage queue.",
+                  "# TYPE callbot_stage_wait_seconds_total counter"]
+        lines += [f'callbot_stage_wait_seconds_total{{stage="{s.name}"}} {s.wait:.6f}' for s in stages]
+        return lines
+
+# Số liệu dùng chung trong process
+metrics = PipelineMetrics()
+tracer.collectors.append(metrics.prometheus)
+
+class StageQueue:
+    """
+    Hàng đợi có giới hạn giữa hai stage (maxsize 0: không giới hạn).
+    put() chờ khi đầy (backpressure về stage trước); put_latest() dành cho
+    audio thời gian thực: bỏ item cũ nhất thay vì chờ. Ghi lại độ sâu và thời
+    gian chờ của từng item vào metrics của stage.
+    """
+
+    def __init__(self, stage, maxsize=0):
+        self.metrics = metrics.stage(stage)
+        self._queue = asyncio.Queue(maxsize)
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def empty(self):
+        return self._queue.empty()
+
+    def _added(self):
+        self.metrics.depth += 1
+        self.metrics.max_depth = max(self.metrics.max_depth, self._queue.qsize())
+
+    def _taken(self, entry):
+        self.metrics.depth -= 1
+        self.metrics.items += 1
+        self.metrics.wait += time.monotonic() - entry[0]
+        return entry[1]
+
+    async def put(self, item):
+        await self._queue.put((time.monotonic(), item))
+        self._added()
+
+    def put_latest(self, item):
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.metrics.depth -= 1
+            self.metrics.dropped += 1
+        self._queue.put_nowait((time.monotonic(), item))
+        self._added()
+
+    async def get(self):
+        return self._taken(await self._queue.get())
+
+    def get_nowait(self):
+        return self._taken(self._queue.get_nowait())
+
+    def clear(self):
+        """Bỏ các item còn chờ (stage bị hủy)"""
+        while not self._queue.empty():
+            self._queue.get_nowait()
+            self.metrics.depth -= 1
+
+class FrameRing:
+    """
+    Kho frame PCM cấp phát trước, nằm giữa hai stage audio thời gian thực.
+    write() copy frame vào chỗ kế tiếp (quay về đầu khi phần cuối không đủ
+    chỗ liền mạch) và trả về (offset, length) để xếp hàng thay cho bytes;
+    stage sau đọc lại bằng view(), không copy. Dung lượng đủ cho max_frames
+    frame đang chờ cộng frame đang ghi, nên frame còn trong hàng đợi (tối đa
+    max_frames) không bao giờ bị ghi đè.
+    """
+
+    def __init__(self, max_frames, frame_bytes):
+        self.max_frames = max_frames
+        self.frame_bytes = frame_bytes
+        self._view = memoryview(bytearray((max_frames + 2) * frame_bytes))
+        self._pos = 0
+
+    def write(self, frame):
+        size = len(frame)
+        if size > self.frame_bytes:
+            self._grow(size)
+        if self._pos + size > len(self._view):
+            self._pos = 0
+        start = self._pos
+        self._view[start:start + size] = frame
+        self._pos = start + size
+        return start, size
+
+    def _grow(self, frame_bytes):
+        # Frame dài hơn dự kiến (caller dùng ptime lớn): mở rộng, giữ nguyên offset của các frame đang chờ
+        view = memoryview(bytearray((self.max_frames + 2) * frame_bytes))
+        view[:len(self._view)] = self._view
+        self._view = view
+        self.frame_bytes = frame_bytes
+
+    def view(self, start, end):
+        return self._view[start:end]
+
+class _StageError:
+    def __init__(self, exc):
+        self.exc = exc
+
+async def stage(items, name=None, maxsize=0):
+    """
+    Chạy một async iterator như một stage: task riêng đọc trước và đẩy vào
+    hàng đợi có giới hạn maxsize. Stage sau chạy chậm chỉ làm stage này dừng
+    khi hàng đợi đầy; lỗi của stage được ném lại ở phía tiêu thụ. Đóng
+    generator (aclosing, hoặc bị hủy) sẽ hủy task của stage.
+    """
+    queue = StageQueue(name or "unnamed", maxsize)
+    done = object()
+
+    async def producer():
+        try:
+            async for item in items:
+                await queue.put(item)
+        except Exception as e:
+            await queue.put(_StageError(e))
+        await queue.put(done)
+
+    task = asyncio.ensure_future(producer())
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, _StageError):
+                raise item.exc
+            yield item
+    finally:
+        task.cancel()
+        queue.clear()
@@ -0,0 +1,53 @@
+import asyncio
+from config.config import config
+
+class PlaybackQueue:
+    """
+    Hàng đợi phát audio bất đồng bộ.
+    Producer put() PCM rồi đi tiếp ngay (nhận/giải mã segment kế tiếp) trong
+    khi một task riêng ghi lần lượt ra thiết bị. write có thể là hàm chặn
+    (vd. stream.write của PyAudio, chạy trong thread) hoặc coroutine function.
+    """
+
+    def __init__(self, write, max_chunks=None):
+        self.write = write
+        self._is_async = asyncio.iscoroutinefunction(write)
+        self._queue = asyncio.Queue(max_chunks or config.PLAYBACK_QUEUE_CHUNKS)
+        self._task = None
+
+    async def put(self, pcm):
+        """Xếp PCM vào hàng đợi (chờ nếu hàng đợi đầy)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        if pcm:
+            await self._queue.put(pcm)
+
+    async def _run(self):
+        while True:
+            pcm = await self._queue.get()
+            try:
+                if self._is_async:
+                    await self.write(pcm)
+                else:
+                    await asyncio.to_thread(self.write, bytes(pcm))
+            except Exception as e:
+                print(f"Lỗi khi phát audio: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def drain(self):
+        """Chờ tới khi mọi PCM đã xếp hàng được phát xong"""
+        await self._queue.join()
+
+    def clear(self):
+        """Bỏ các PCM chưa phát"""
+        while not self._queue.empty():
+            self._queue.get_nowait()
+            self._queue.task_done()
+
+    async def aclose(self):
+        self.clear()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,134 @@
+import math
+from functools import lru_cache
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from config.config import config
+
+# Dải thông giữ lại so với Nyquist của sample rate thấp hơn, và độ dốc cửa sổ Kaiser
+ROLLOFF = 0.9
+KAISER_BETA = 8.0
+# Tỉ lệ đơn giản (up * down nhỏ, vd. 8k <-> 24k, 16k <-> 24k) dùng np.convolve theo từng pha
+MAX_CONVOLVE_PHASES = 16
+
+def _filter_center(up, down, taps):
+    return (up * taps - 1) // 2 // down * down
+
+@lru_cache(maxsize=32)
+def _polyphase_filter(up, down, taps):
+    """
+    Bộ lọc thông thấp windowed-sinc cho resample up/down, tách thành up pha;
+    hàng p là các hệ số của pha p theo thứ tự đảo (nhân thẳng với cửa sổ input).
+    """
+    length = up * taps
+    # Tâm bộ lọc là bội của down để độ trễ là số nguyên sample đầu ra (phần thừa để 0)
+    center = _filter_center(up, down, taps)
+    cutoff = ROLLOFF * 0.5 / max(up, down)   # Theo tần số lấy mẫu sau khi chèn (src * up)
+    n = np.arange(2 * center + 1) - center
+    h = np.zeros(length)
+    h[:2 * center + 1] = np.sinc(2 * cutoff * n) * np.kaiser(2 * center + 1, KAISER_BETA)
+    h *= up / h.sum()
+    phases = h.reshape(taps, up).T[:, ::-1]
+    return np.ascontiguousarray(phases, dtype=np.float32)
+
+class StreamResampler:
+    """
+    Resample PCM 16-bit mono theo từng đoạn bằng bộ lọc polyphase FIR
+    (windowed-sinc, chống alias khi hạ sample rate, vd. 24 kHz -> 8 kHz cho
+    G.711). Giữ trạng thái giữa các lần gọi (lịch sử bộ lọc, byte lẻ) nên có
+    thể đưa vào từng chunk HTTP/RTP ngay khi nhận được mà không bị nứt ở ranh
+    giới chunk. Bộ lọc trễ khoảng taps/2 sample input; flush() trả về phần đuôi.
+    """
+
+    def __init__(self, src_rate, dst_rate, taps=None):
+        self.src_rate = src_rate
+        self.dst_rate = dst_rate
+        common = math.gcd(src_rate, dst_rate)
+        self.up = dst_rate // common
+        self.down = src_rate // common
+        # Hạ sample rate cần bộ lọc dài hơn theo tỉ lệ để giữ cùng độ dốc; làm tròn lên bội của down
+        taps = math.ceil((taps or config.RESAMPLE_TAPS) * max(1, self.down / self.up))
+        self.taps = -(-taps // self.down) * self.down
+        self.delay = _filter_center(self.up, self.down, self.taps) / self.up   # Độ trễ nhóm, tính bằng sample input
+        self._filter = _polyphase_filter(self.up, self.down, self.taps)
+        self._convolve = self.up * self.down <= MAX_CONVOLVE_PHASES
+        if self._convolve:
+            # Hệ số pha p theo thứ tự thường, tách tiếp theo input: [p][r] = h_p[r::down]
+            forward = self._filter[:, ::-1]
+            self._subfilters = [[np.ascontiguousarray(forward[p, r::self.down]) for r in range(self.down)]
+                                for p in range(self.up)]
+        self._odd = b''      # Byte lẻ (nửa sample) còn lại
+        self._reset()
+
+    def _reset(self):
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        self._start = -(self.taps - 1)   # Chỉ số (tuyệt đối) của sample đầu trong _history
+        self._next = 0                   # Chỉ số (tuyệt đối) của sample đầu ra kế tiếp
+
+    def process(self, pcm):
+        data = self._odd + bytes(pcm) if self._odd else pcm
+        usable = len(data) - len(data) % 2
+        self._odd = bytes(data[usable:])
+        if usable == 0:
+            return b''
+        if self.src_rate == self.dst_rate:
+            return bytes(data[:usable])
+        x = np.frombuffer(data, dtype=np.int16, count=usable // 2).astype(np.float32)
+        return self._run(x)
+
+    def flush(self):
+        """Đẩy phần audio còn nằm trong bộ lọc ra (cuối luồng), sau đó bắt đầu lại từ đầu"""
+        self._odd = b''
+        if self.src_rate == self.dst_rate:
+            return b''
+        tail = self._run(np.zeros(math.ceil(self.delay) + 1, dtype=np.float32))
+        self._reset()
+        return tail
+
+    def _run(self, x):
+        buffer = np.concatenate((self._history, x))
+        end = self._start + len(buffer)
+        # Sample đầu ra n dùng input tới chỉ số (n * down) // up
+        last = (end * self.up - 1) // self.down
+        if last < self._next:
+            self._history = buffer
+            return b''
+
+        if self._convolve:
+            y = self._run_convolve(buffer, last + 1 - self._next)
+        else:
+            t = np.arange(self._next, last + 1, dtype=np.int64) * self.down
+            windows = sliding_window_view(buffer, self.taps)[t // self.up - (self.taps - 1) - self._start]
+            y = np.einsum('ij,ij->i', windows, self._filter[t % self.up])
+        self._next = last + 1
+
+        keep = (self._next * self.down) // self.up - (self.taps - 1)
+        self._history = buffer[keep - self._start:]
+        self._start = keep
+        return np.clip(np.round(y), -32768, 32767).astype(np.int16).tobytes()
+
+    def _run_convolve(self, buffer, count):
+        """
+        Các sample đầu ra cách nhau up cùng pha bộ lọc và dùng input cách nhau
+        down: mỗi nhóm là tổng của down phép convolve trên input lấy cách down.
+        """
+        y = np.empty(count, dtype=np.float32)
+        for offset in range(min(self.up, count)):
+            t = (self._next + offset) * self.down
+            newest = t // self.up - self._start      # Vị trí trong buffer của input mới nhất cho đầu ra đầu tiên
+            n = (count - offset + self.up - 1) // self.up
+            acc = 0
+            for r, g in enumerate(self._subfilters[t % self.up]):
+                begin = newest - r - (len(g) - 1) * self.down
+                acc = acc + np.convolve(buffer[begin:begin + (n + len(g) - 2) * self.down + 1:self.down], g, 'valid')
+            y[offset::self.up] = acc
+        return y
+
+def resample(pcm, src_rate, dst_rate):
+    """Resample một đoạn PCM 16-bit mono hoàn chỉnh (đã bù độ trễ của bộ lọc)"""
+    if src_rate == dst_rate:
+        return bytes(pcm)
+    resampler = StreamResampler(src_rate, dst_rate)
+    out = resampler.process(pcm) + resampler.flush()
+    skip = round(resampler.delay * dst_rate / src_rate)
+    count = round(len(pcm) // 2 * dst_rate / src_rate)
+    return out[2 * skip:2 * (skip + count)]
@@ -0,0 +1,158 @@
+import numpy as np
+from config.config import config
+from .resample import StreamResampler
+
+# ---- G.711 (ITU-T), theo thuật toán tham chiếu g711.c; bảng tra cứu tính một lần ----
+
+_SEG_END_ULAW = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+_SEG_END_ALAW = np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF])
+
+def _linear_values():
+    """Mọi giá trị int16, xếp theo thứ tự của chỉ số uint16 (để tra bằng view uint16)"""
+    return np.arange(65536, dtype=np.uint32).astype(np.uint16).view(np.int16).astype(np.int32)
+
+def _build_ulaw_encode():
+    pcm = _linear_values() >> 2
+    mask = np.where(pcm < 0, 0x7F, 0xFF)
+    pcm = np.minimum(np.abs(pcm), 8159) + 0x21
+    seg = np.searchsorted(_SEG_END_ULAW, pcm)
+    code = np.where(seg >= 8, 0x7F, (np.minimum(seg, 7) << 4) | ((pcm >> (np.minimum(seg, 7) + 1)) & 0x0F))
+    return (code ^ mask).astype(np.uint8)
+
+def _build_ulaw_decode():
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    t = (((u & 0x0F) << 3) + 0x84) << ((u & 0x70) >> 4)
+    return np.where(u & 0x80, 0x84 - t, t - 0x84).astype('<i2')
+
+def _build_alaw_encode():
+    pcm = _linear_values() >> 3
+    mask = np.where(pcm >= 0, 0xD5, 0x55)
+    pcm = np.where(pcm >= 0, pcm, -pcm - 1)
+    seg = np.searchsorted(_SEG_END_ALAW, pcm)
+    shift = np.where(seg < 2, 1, np.minimum(seg, 7))
+    code = np.where(seg >= 8, 0x7F, (np.minimum(seg, 7) << 4) | ((pcm >> shift) & 0x0F))
+    return (code ^ mask).astype(np.uint8)
+
+def _build_alaw_decode():
+    a = np.arange(256, dtype=np.int32) ^ 0x55
+    t = (a & 0x0F) << 4
+    seg = (a & 0x70) >> 4
+    t = np.where(seg == 0, t + 8, t + 0x108)
+    t = np.where(seg > 1, t << np.maximum(seg - 1, 0), t)
+    return np.where(a & 0x80, t, -t).astype('<i2')
+
+ULAW_ENCODE = _build_ulaw_encode()    # uint16(sample) -> byte μ-law
+ULAW_DECODE = _build_ulaw_decode()    # byte μ-law -> int16
+ALAW_ENCODE = _build_alaw_encode()
+ALAW_DECODE = _build_alaw_decode()
+
+def _encode(table, pcm):
+    samples = np.frombuffer(pcm, dtype='<u2', count=len(pcm) // 2)
+    return table[samples].tobytes()
+
+def _decode(table, payload):
+    return table[np.frombuffer(payload, dtype=np.uint8)].tobytes()
+
+def ulaw_encode(pcm):
+    """PCM 16-bit little-endian -> G.711 μ-law (1 byte mỗi sample)"""
+    return _encode(ULAW_ENCODE, pcm)
+
+def ulaw_decode(payload):
+    """G.711 μ-law -> PCM 16-bit little-endian"""
+    return _decode(ULAW_DECODE, payload)
+
+def alaw_encode(pcm):
+    """PCM 16-bit little-endian -> G.711 A-law (1 byte mỗi sample)"""
+    return _encode(ALAW_ENCODE, pcm)
+
+def alaw_decode(payload):
+    """G.711 A-law -> PCM 16-bit little-endian"""
+    return _decode(ALAW_DECODE, payload)
+
+# ---- Codec RTP ----
+
+def _same(data):
+    # PCM16 không cần mã hóa: giữ nguyên cả memoryview (không copy)
+    return data
+
+class Codec:
+    """Định dạng payload RTP: payload type, clock rate và cách mã hóa PCM 16-bit"""
+
+    def __init__(self, name, payload_type, clock_rate, sample_bytes, silence, encode, decode):
+        self.name = name
+        self.payload_type = payload_type
+        self.clock_rate = clock_rate
+        self.sample_bytes = sample_bytes     # Số byte payload mỗi sample
+        self.silence = silence               # Payload của một sample im lặng
+        self.encode = encode                 # PCM 16-bit tại clock_rate -> payload
+        self.decode = decode                 # payload -> PCM 16-bit tại clock_rate
+
+    def samples(self, payload):
+        """Số sample trong payload (bước tăng timestamp RTP)"""
+        return len(payload) // self.sample_bytes
+
+    def silence_payload(self, samples):
+        return self.silence * samples
+
+    def __repr__(self):
+        return f"{self.name}/{self.clock_rate} (PT {self.payload_type})"
+
+PCMU = Codec("PCMU", 0, 8000, 1, b'\xff', ulaw_encode, ulaw_decode)
+PCMA = Codec("PCMA", 8, 8000, 1, b'\xd5', alaw_encode, alaw_decode)
+# PCM thô như trước khi có G.711: chỉ dùng giữa các thành phần trong repo
+PCM16 = Codec("PCM16", config.RTP_PCM16_PAYLOAD_TYPE, config.AUDIO_RATE, 2, b'\x00\x00', _same, _same)
+
+CODECS = {codec.name: codec for codec in (PCMU, PCMA, PCM16)}
+
+def get_codec(name=None):
+    """Codec theo tên, mặc định codec ưu tiên nhất trong RTP_CODECS"""
+    return CODECS[name or config.RTP_CODECS[0]]
+
+def negotiate(payload_type, names=None):
+    """
+    Codec cho luồng RTP có payload type này nếu nằm trong danh sách cho phép
+    (RTP_CODECS), None nếu không. Bot trả lời bằng đúng codec mà caller gửi.
+    """
+    for name in names or config.RTP_CODECS:
+        codec = CODECS[name]
+        if codec.payload_type == payload_type:
+            return codec
+    return None
+
+class Encoder:
+    """PCM 16-bit tại sample_rate -> payload codec (resample + mã hóa, giữ trạng thái giữa các chunk)"""
+
+    def __init__(self, codec, sample_rate):
+        self.codec = codec
+        self.resampler = StreamResampler(sample_rate, codec.clock_rate) if sample_rate != codec.clock_rate else None
+
+    def encode(self, pcm):
+        if self.resampler is not None:
+            pcm = self.resampler.process(pcm)
+        return self.codec.encode(pcm) if pcm else b''
+
+    def flush(self):
+        """Phần audio còn nằm trong bộ lọc resample (cuối một đoạn phát)"""
+        if self.resampler is None:
+            return b''
+        pcm = self.resampler.flush()
+        return self.codec.encode(pcm) if pcm else b''
+
+    def reset(self):
+        """Bỏ phần audio còn trong bộ lọc (vd. khi bị ngắt lời)"""
+        if self.resampler is not None:
+            self.resampler.flush()
+
+class Decoder:
+    """Payload codec -> PCM 16-bit tại sample_rate (giải mã + resample)"""
+
+    def __init__(self, codec, sample_rate):
+        self.codec = codec
+        self.resampler = StreamResampler(codec.clock_rate, sample_rate) if sample_rate != codec.clock_rate else None
+
+    def decode(self, payload):
+        return self.resample(self.codec.decode(payload))
+
+    def resample(self, pcm):
+        """Chỉ resample PCM đã giải mã (vd. frame ra từ jitter buffer)"""
+        return self.resampler.process(pcm) if self.resampler is not None else pcm
@@ -1,21 +1,67 @@
 import socket
-import pyaudio
-import threading
-import wave
-import webrtcvad
-import numpy as np
-from array import array
 import struct
 import time
-from queue import Queue
+from collections import namedtuple
+from config.config import config
+from .vad import create_vad
+from .audio_device import get_audio_device
+from .capture import UtteranceCapture
+from .rtp_codec import Encoder, get_codec
+
+RTP_HEADER_SIZE = 12
+
+RTPHeader = namedtuple('RTPHeader', [
+    'sequence_number', 'timestamp', 'ssrc', 'marker', 'payload_type', 'header_size'
+])
+
+def build_rtp_header(sequence_number, timestamp, ssrc=0, marker=0, payload_type=0):
+    """Đóng gói RTP header 12 byte (version 2, không padding/extension/CSRC)"""
+    first_byte = 2 << 6
+    second_byte = ((marker & 0x1) << 7) | (payload_type & 0x7F)
+    return struct.pack('!BBHII',
+        first_byte,
+        second_byte,
+        sequence_number & 0xFFFF,
+        timestamp & 0xFFFFFFFF,
+        ssrc & 0xFFFFFFFF)
+
+def write_rtp_header(buffer, sequence_number, timestamp, ssrc=0, marker=0, payload_type=0):
+    """Như build_rtp_header nhưng ghi thẳng vào 12 byte đầu của buffer có sẵn"""
+    struct.pack_into('!BBHII', buffer, 0,
+        2 << 6,
+        ((marker & 0x1) << 7) | (payload_type & 0x7F),
+        sequence_number & 0xFFFF,
+        timestamp & 0xFFFFFFFF,
+        ssrc & 0xFFFFFFFF)
+
+def parse_rtp_header(data):
+    """Đọc RTP header, trả về RTPHeader hoặc None nếu gói không hợp lệ"""
+    if len(data) < RTP_HEADER_SIZE:
+        return None
+
+    first_byte, second_byte, sequence_number, timestamp, ssrc = struct.unpack_from('!BBHII', data)
+    if first_byte >> 6 != 2:
+        return None
+
+    # Bỏ qua CSRC list và header extension nếu có
+    header_size = RTP_HEADER_SIZE + (first_byte & 0x0F) * 4
+    if first_byte & 0x10:
+        if len(data) < header_size + 4:
+            return None
+        _, ext_words = struct.unpack_from('!HH', data, header_size)
+        header_size += 4 + ext_words * 4
+    if len(data) < header_size:
+        return None
+
+    return RTPHeader(sequence_number, timestamp, ssrc,
+                     second_byte >> 7, second_byte & 0x7F, header_size)
 
 class RTPHandler:
     def __init__(self, local_ip="127.0.0.1", local_port=12345,
                  remote_ip="127.0.0.1", remote_port=12346,
-                 chunk_size=1024, sample_rate=24000):
+                 chunk_size=1024, sample_rate=24000, codec=None):
         # Cấu hình âm thanh
         self.CHUNK = chunk_size
-        self.FORMAT = pyaudio.paInt16
         self.CHANNELS = 1
         self.RATE = sample_rate
         
@@ -30,14 +76,15 @@ class RTPHandler:
         self.sock.bind((self.local_ip, self.local_port))
         print(f"Đã bind socket tại {self.local_ip}:{self.local_port}")
         
-        # Khởi tạo PyAudio
-        self.audio = pyaudio.PyAudio()
+        # Codec chiều gửi (mặc định codec đầu tiên trong RTP_CODECS), resample từ RATE
+        self.codec = codec or get_codec()
+        self.encoder = Encoder(self.codec, self.RATE)
+
+        # Stream microphone/loa dùng chung trong process
+        self.device = get_audio_device(self.RATE, self.CHANNELS, self.CHUNK)
         
         # Khởi tạo VAD
-        self.vad = webrtcvad.Vad(3)
-        
-        # Queue cho audio chunks
-        self.audio_queue = Queue()
+        self.vad = create_vad(self.RATE)
         
         # Flags điều khiển
         self.is_recording = False
@@ -47,86 +94,54 @@ class RTPHandler:
         self.sequence_number = 0
         self.timestamp = 0
 
-    def create_rtp_header(self):
-        """Tạo RTP header"""
-        version = 2
-        padding = 0
-        extension = 0
-        csrc_count = 0
-        marker = 0
-        payload_type = 0  # PCM audio
-        
-        first_byte = (version << 6) | (padding << 5) | (extension << 4) | csrc_count
-        second_byte = (marker << 7) | payload_type
-        
-        header = struct.pack('!BBHII',
-            first_byte,
-            second_byte,
-            self.sequence_number,
-            self.timestamp,
-            0)  # SSRC
+    def create_rtp_header(self, samples=None, marker=0):
+        """Tạo RTP header, timestamp tăng theo số sample (theo clock rate của codec) của payload"""
+        header = build_rtp_header(self.sequence_number, self.timestamp, marker=marker,
+                                  payload_type=self.codec.payload_type)
         
         self.sequence_number = (self.sequence_number + 1) & 0xFFFF
-        self.timestamp += self.CHUNK
+        self.timestamp = (self.timestamp + (samples or self.CHUNK)) & 0xFFFFFFFF
         
         return header
 
     def record_audio(self):
         """Ghi âm và gửi qua RTP"""
-        stream = self.audio.open(
-            format=self.FORMAT,
-            channels=self.CHANNELS,
-            rate=self.RATE,
-            input=True,
-            frames_per_buffer=self.CHUNK
-        )
+        self.device.start()
+        self.device.flush_input()
 
         print("* Đang ghi âm và gửi RTP stream...")
-        frames = []
-        silent_chunks = 0
-        has_speech = False
+        capture = UtteranceCapture(self.RATE)
+        # Buffer microphone và gói RTP cấp phát một lần; payload mã hóa được ghi vào sau header
+        data = memoryview(bytearray(self.CHUNK * 2))
+        packet = memoryview(bytearray(RTP_HEADER_SIZE + 2 * len(data)))
+        silent_samples = 0
+        self.vad.reset()
 
         while True:
             try:
-                data = stream.read(self.CHUNK, exception_on_overflow=False)
-                
                 # Chỉ gửi qua RTP, không phát trực tiếp
+                if self.device.read_into(data) == len(data):
+                    payload = self.encoder.encode(data)
+                    size = RTP_HEADER_SIZE + len(payload)
+                    packet[RTP_HEADER_SIZE:size] = payload
+                    write_rtp_header(packet, self.sequence_number, self.timestamp,
+                                     payload_type=self.codec.payload_type)
+                    self.sequence_number = (self.sequence_number + 1) & 0xFFFF
+                    self.timestamp = (self.timestamp + self.codec.samples(payload)) & 0xFFFFFFFF
+                    self.sock.sendto(packet[:size], (self.remote_ip, self.remote_port))
                 
-                if len(data) == self.CHUNK * 2:
-                    
-                    rtp_packet = self.create_rtp_header() + data
-                    self.sock.sendto(rtp_packet, (self.remote_ip, self.remote_port))
-                
-                # Xử lý VAD
-                array_data = array('h', data)
-                volume = sum(abs(x) for x in array_data) / len(array_data)
-
-                if volume > 300:
-                    silent_chunks = 0
-                    has_speech = True
-                    frames.append(data)
-                else:
-                    silent_chunks += 1
-                    if has_speech:
-                        frames.append(data)
-
-                if has_speech and silent_chunks > 60:
-                    break
-                elif not has_speech and silent_chunks > 80:
-                    stream.stop_stream()
-                    stream.close()
-                    return None
+                # Xử lý VAD, tách utterance (có pre-roll, giới hạn độ dài)
+                _, utterance = capture.push(data, self.vad.is_speech(data))
+                if utterance is not None:
+                    return utterance
+                if not capture.active:
+                    silent_samples += len(data) // 2
+                    if silent_samples * 1000 > config.NO_SPEECH_TIMEOUT_MS * self.RATE:
+                        return None
 
             except Exception as e:
                 print(f"Lỗi khi ghi âm: {e}")
-                break
-
-        stream.stop_stream()
-        stream.close()
-
-        if has_speech and len(frames) > 0:
-            return b''.join(frames)
-        return None
+                return None
 
     def send_audio(self, audio_data):
         """Chỉ gửi audio qua RTP, không phát trực tiếp"""
@@ -134,13 +149,23 @@ class RTPHandler:
             return
             
         try:
-            # Chia audio thành các chunk và gửi qua RTP
-            for i in range(0, len(audio_data), self.CHUNK):
-                chunk = audio_data[i:i + self.CHUNK]
-                if len(chunk) == self.CHUNK:
-                    rtp_packet = self.create_rtp_header() + chunk
-                    self.sock.sendto(rtp_packet, (self.remote_ip, self.remote_port))
-                    time.sleep(0.02)  # Delay giữa các chunk
+            # Chia audio thành các chunk CHUNK sample, gói cuối được đệm im lặng
+            chunk_bytes = self.CHUNK * 2
+            packet_time = self.CHUNK / self.RATE
+            next_send = time.monotonic()
+            for i in range(0, len(audio_data), chunk_bytes):
+                chunk = audio_data[i:i + chunk_bytes]
+                if len(chunk) < chunk_bytes:
+                    chunk += bytes(chunk_bytes - len(chunk))
+                payload = self.encoder.encode(chunk)
+                rtp_packet = self.create_rtp_header(self.codec.samples(payload), marker=int(i == 0)) + payload
+                self.sock.sendto(rtp_packet, (self.remote_ip, self.remote_port))
+
+                # Lịch gửi tuyệt đối theo đồng hồ monotonic để không bị trôi
+                next_send += packet_time
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
             
         except Exception as e:
             print(f"Lỗi khi gửi audio: {str(e)}")
@@ -150,11 +175,6 @@ class RTPHandler:
         self.is_recording = False
         self.is_playing = False
         
-        try:
-            self.audio.terminate()
-        except:
-            pass
-            
         try:
             self.sock.close()
         except:
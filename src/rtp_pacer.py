@@ -0,0 +1,230 @@
+import asyncio
+import heapq
+import itertools
+import random
+from collections import deque
+from config.config import config
+from .rtp_handler import build_rtp_header
+from .rtp_codec import Encoder, PCM16
+from .tracing import current_turn
+
+class RTPStream:
+    """
+    Chiều gửi RTP của một cuộc gọi.
+    Giữ SSRC, sequence number, timestamp và hàng đợi packet; thời điểm gửi
+    do RTPPacer quyết định theo lịch tuyệt đối (không cộng dồn sai số sleep).
+    PCM tại sample_rate được resample về clock rate của codec và mã hóa ngay
+    khi xếp hàng; packet_samples tính theo clock rate của codec.
+    """
+
+    def __init__(self, pacer, send, sample_rate, packet_samples, ssrc=None, codec=None):
+        self.pacer = pacer
+        self.send = send
+        self.sample_rate = sample_rate
+        self.codec = codec or PCM16
+        self.payload_type = self.codec.payload_type
+        self.packet_samples = packet_samples
+        self.packet_bytes = packet_samples * self.codec.sample_bytes
+        self.packet_time = packet_samples / self.codec.clock_rate
+        self.ssrc = random.getrandbits(32) if ssrc is None else ssrc
+        self._encoder = Encoder(self.codec, sample_rate)
+
+        self.sequence_number = random.getrandbits(16)
+        self.timestamp = random.getrandbits(32)
+        self.packets_sent = 0
+
+        self._packets = deque()      # (payload, future báo đã gửi xong hoặc None)
+        self._partial = b''          # Phần PCM chưa đủ một gói (play với flush=False)
+        self._next_deadline = None   # Thời điểm (loop.time()) gửi gói kế tiếp
+        self._scheduled = False
+        self._marker = True
+        self._turn = None            # Lượt hội thoại chờ ghi mốc gói RTP đầu tiên
+        self._drain_waiter = None    # (số gói tối đa, future) của drain() đang chờ
+        self.closed = False
+
+    def play(self, pcm, flush=True):
+        """
+        Xếp PCM 16-bit vào hàng đợi gửi, chia thành các gói packet_samples.
+        Với flush=True gói cuối được đệm im lặng; với flush=False phần lẻ được
+        giữ lại và ghép với lần play kế tiếp (dùng khi PCM tới theo từng chunk).
+        Future trả về nhận True khi gói cuối đã gửi, False nếu bị bỏ (clear/close).
+        """
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        if self.closed:
+            done.set_result(False)
+            return done
+        turn = current_turn.get()
+        if turn is not None and "rtp_first_packet" not in turn.marks:
+            self._turn = turn
+        pcm = self._encoder.encode(pcm)
+        if flush:
+            tail = self._encoder.flush()
+            if tail:
+                pcm = bytes(pcm) + tail
+        if self._partial:
+            pcm = self._partial + bytes(pcm)
+            self._partial = b''
+
+        # Cắt bằng memoryview: audio PCM16 từ cache (mmap) không bị copy trước khi gửi
+        view = memoryview(pcm).cast('B')
+        queued = len(self._packets)
+        for i in range(0, len(view), self.packet_bytes):
+            payload = view[i:i + self.packet_bytes]
+            if len(payload) < self.packet_bytes:
+                if not flush:
+                    self._partial = bytes(payload)
+                    break
+                payload = bytes(payload) + self.codec.silence_payload(
+                    (self.packet_bytes - len(payload)) // self.codec.sample_bytes)
+            self._packets.append((payload, None))
+        if not self._packets:
+            done.set_result(True)
+            return done
+        payload, previous = self._packets[-1]
+        if len(self._packets) == queued and previous is not None:
+            # Không có gói mới: chờ gói cuối đang nằm trong hàng đợi
+            return previous
+        self._packets[-1] = (payload, done)
+
+        if not self._scheduled:
+            self._start_talkspurt(loop.time())
+        return done
+
+    def _start_talkspurt(self, now):
+        if self._next_deadline is None or self._next_deadline < now:
+            if self._next_deadline is not None:
+                # Timestamp vẫn tăng trong khoảng im lặng giữa hai lượt phát
+                gap = int((now - self._next_deadline) * self.codec.clock_rate)
+                self.timestamp = (self.timestamp + gap) & 0xFFFFFFFF
+            self._next_deadline = now
+            self._marker = True
+        self._scheduled = True
+        self.pacer._schedule(self, self._next_deadline)
+
+    def _send_next(self, deadline, now):
+        """Gửi một gói, trả về deadline của gói kế tiếp hoặc None nếu hết hàng đợi"""
+        payload, done = self._packets.popleft()
+        header = build_rtp_header(self.sequence_number, self.timestamp, self.ssrc,
+                                  self._marker, self.payload_type)
+        self._marker = False
+        self.sequence_number = (self.sequence_number + 1) & 0xFFFF
+        self.timestamp = (self.timestamp + self.codec.samples(payload)) & 0xFFFFFFFF
+        self.packets_sent += 1
+        try:
+            self.send(header + payload)
+        except OSError as e:
+            print(f"Lỗi khi gửi RTP: {e}")
+        if self._turn is not None:
+            self._turn.mark("rtp_first_packet")
+            self._turn = None
+        if done is not None and not done.done():
+            done.set_result(True)
+
+        next_deadline = deadline + self.packet_time
+        if now - next_deadline > self.pacer.max_late:
+            # Loop bị chặn quá lâu: bắt đầu lại lịch thay vì gửi dồn cả loạt
+            next_deadline = now
+        self._next_deadline = next_deadline
+
+        if self._drain_waiter is not None and len(self._packets) <= self._drain_waiter[0]:
+            self._wake_drain()
+        if self._packets:
+            return next_deadline
+        self._scheduled = False
+        return None
+
+    def _wake_drain(self):
+        _, waiter = self._drain_waiter
+        self._drain_waiter = None
+        if not waiter.done():
+            waiter.set_result(None)
+
+    async def drain(self, max_queued):
+        """Chờ tới khi hàng đợi còn không quá max_queued giây audio (backpressure cho stage TTS)"""
+        limit = int(max_queued / self.packet_time)
+        while len(self._packets) > limit and not self.closed:
+            waiter = asyncio.get_running_loop().create_future()
+            self._drain_waiter = (limit, waiter)
+            await waiter
+
+    def clear(self):
+        """Bỏ các gói chưa gửi (vd. khi caller ngắt lời)"""
+        self._partial = b''
+        self._encoder.reset()
+        self._turn = None
+        while self._packets:
+            _, done = self._packets.popleft()
+            if done is not None and not done.done():
+                done.set_result(False)
+        if self._drain_waiter is not None:
+            self._wake_drain()
+
+    @property
+    def playing(self):
+        return bool(self._packets)
+
+    def close(self):
+        self.clear()
+        self.closed = True
+
+class RTPPacer:
+    """
+    Bộ định thời dùng chung cho chiều gửi của mọi cuộc gọi.
+    Các stream được xếp trong một heap theo deadline trên đồng hồ monotonic của
+    event loop; chỉ có một timer được đặt cho deadline sớm nhất, mỗi lần kích
+    hoạt sẽ gửi mọi gói đã đến hạn của tất cả các stream.
+    """
+
+    def __init__(self, packet_ms=None, max_late=None):
+        self.packet_ms = packet_ms or config.RTP_PACKET_MS
+        self.max_late = max_late or config.RTP_PACER_MAX_LATE
+        self._heap = []
+        self._counter = itertools.count()
+        self._timer = None
+        self._timer_deadline = None
+        self.packets_sent = 0
+        self.max_lateness = 0.0
+
+    def open_stream(self, send, sample_rate, packet_ms=None, ssrc=None, codec=None):
+        """Stream gửi PCM tại sample_rate, đóng gói bằng codec (mặc định PCM16 như trước)"""
+        codec = codec or PCM16
+        packet_samples = codec.clock_rate * (packet_ms or self.packet_ms) // 1000
+        return RTPStream(self, send, sample_rate, packet_samples, ssrc, codec)
+
+    def _schedule(self, stream, deadline):
+        heapq.heappush(self._heap, (deadline, next(self._counter), stream))
+        if self._timer is None or deadline < self._timer_deadline:
+            self._arm()
+
+    def _arm(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._heap:
+            self._timer_deadline = self._heap[0][0]
+            self._timer = asyncio.get_running_loop().call_at(self._timer_deadline, self._fire)
+
+    def _fire(self):
+        self._timer = None
+        now = asyncio.get_running_loop().time()
+        # Gửi mọi gói đến hạn (dung sai 1 ms để gom các stream có lịch gần nhau)
+        while self._heap and self._heap[0][0] <= now + 0.001:
+            deadline, _, stream = heapq.heappop(self._heap)
+            if stream.closed or not stream._packets:
+                stream._scheduled = False
+                continue
+            self.max_lateness = max(self.max_lateness, now - deadline)
+            self.packets_sent += 1
+            next_deadline = stream._send_next(deadline, now)
+            if next_deadline is not None:
+                heapq.heappush(self._heap, (next_deadline, next(self._counter), stream))
+        self._arm()
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for _, _, stream in self._heap:
+            stream.close()
+        self._heap = []
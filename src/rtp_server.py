@@ -0,0 +1,379 @@
+import asyncio
+import socket
+import time
+from config.config import config
+from .rtp_handler import parse_rtp_header
+from .rtp_pacer import RTPPacer
+from .vad import create_vad
+from .jitter_buffer import JitterBuffer
+from .capture import UtteranceCapture
+from .rtp_codec import Decoder, negotiate
+from .tracing import tracer, current_turn
+from .pipeline import StageQueue, FrameRing
+
+class CallSession:
+    """
+    Trạng thái của một cuộc gọi RTP.
+    Mỗi cặp (địa chỉ remote, SSRC) có buffer audio, trạng thái VAD
+    và hàng đợi utterance riêng. Các stage chạy ở task riêng, nối bằng hàng
+    đợi có giới hạn: ingest (đọc socket, jitter buffer, giải mã G.711) ->
+    audio (resample, VAD/endpointing, tách utterance) -> lượt hội thoại, nên
+    việc đọc socket không bao giờ phải chờ VAD hay STT/LLM/TTS. Audio được
+    giải mã theo codec của caller và resample về sample rate của pipeline;
+    phản hồi được gửi lại bằng đúng codec đó.
+    """
+
+    def __init__(self, server, addr, ssrc, codec):
+        self.server = server
+        self.addr = addr
+        self.ssrc = ssrc
+        self.key = (addr, ssrc)
+        self.call_id = f"{addr[0]}:{addr[1]}/{ssrc:08x}"
+        self.codec = codec
+
+        # Tách utterance (pre-roll, giới hạn độ dài) và trạng thái VAD
+        self.capture = UtteranceCapture(server.sample_rate)
+        self.vad = create_vad(server.sample_rate)
+        # Jitter buffer làm việc trên PCM đã giải mã, theo clock rate của codec
+        self.jitter_buffer = JitterBuffer(codec.clock_rate)
+        self.decoder = Decoder(codec, server.sample_rate)
+        # Chunk cho VAD/capture được ghép tại chỗ trong buffer cấp phát trước
+        self._chunk = memoryview(bytearray(server.chunk_size * 2))
+        self._chunk_fill = 0
+        self.stt_stream = None
+        # Ingest -> audio: (offset, length) của frame PCM đã giải mã trong ring của cuộc gọi;
+        # stage audio chậm thì bỏ frame cũ nhất
+        frame_ms = config.RTP_PACKET_MS
+        max_frames = max(1, config.PIPELINE_AUDIO_QUEUE_MS // frame_ms)
+        self.audio_frames = StageQueue("audio", max_frames)
+        self.frame_ring = FrameRing(max_frames, codec.clock_rate * frame_ms // 1000 * 2)
+        self.audio_task = None
+
+        # Chiều gửi: SSRC, sequence, timestamp do pacer dùng chung quản lý
+        self.rtp_stream = server.pacer.open_stream(
+            lambda packet: server.sendto(packet, addr), server.sample_rate, codec=codec
+        )
+
+        self.created_at = time.monotonic()
+        self.last_packet_time = self.created_at
+        self.packets_received = 0
+
+        self.utterances = StageQueue("turn")
+        self.task = None
+        self.reply = None            # Task đang xử lý utterance (có thể bị hủy khi ngắt lời)
+        self.busy = False
+        self.speech_samples = 0      # Số sample tiếng nói liên tục gần nhất
+        self.carried = []            # Task STT của các đoạn bị cắt vì quá dài, chờ ghép vào lượt kế tiếp
+        self.barge_ins = 0
+
+    def handle_packet(self, header, payload):
+        """Stage ingest: giải mã gói vào jitter buffer, chuyển các frame đã sắp xếp lại cho stage audio"""
+        self.last_packet_time = time.monotonic()
+        if header.payload_type != self.codec.payload_type:
+            # DTMF (RFC 4733), comfort noise... không phải audio của codec đã chọn
+            self.server.ignored_packets += 1
+            return
+        self.packets_received += 1
+        for frame in self.jitter_buffer.put(header, self.codec.decode(payload), self.last_packet_time):
+            # Frame là view vào kho của jitter buffer, chỉ hợp lệ tới gói kế tiếp:
+            # copy một lần vào ring của cuộc gọi, hàng đợi chỉ mang vị trí
+            self.audio_frames.put_latest(self.frame_ring.write(frame))
+
+    async def _audio_worker(self):
+        """Stage audio: gom mọi frame đang chờ, resample từng đoạn liền mạch của ring rồi chạy VAD/endpointing theo chunk"""
+        while True:
+            frames = [await self.audio_frames.get()]
+            while not self.audio_frames.empty():
+                frames.append(self.audio_frames.get_nowait())
+            try:
+                # Không có await từ đây tới hết vòng: ingest không thể ghi đè các frame đang đọc
+                start, end = frames[0][0], frames[0][0] + frames[0][1]
+                for offset, length in frames[1:]:
+                    if offset != end:
+                        self._resample_and_push(start, end)
+                        start = offset
+                    end = offset + length
+                self._resample_and_push(start, end)
+            except Exception as e:
+                print(f"Lỗi xử lý audio của cuộc gọi {self.call_id}: {e}")
+
+    def _resample_and_push(self, start, end):
+        pcm = self.decoder.resample(self.frame_ring.view(start, end))
+        if pcm:
+            self._push_pcm(memoryview(pcm))
+
+    def _push_pcm(self, pcm):
+        """
+        Gom PCM thành các chunk chunk_size sample (VAD và capture đếm theo chunk).
+        Chunk nằm trọn trong pcm được chuyển đi dưới dạng view; chỉ phần vắt qua
+        hai lần gọi mới được copy vào buffer chunk. handle_payload không giữ lại view.
+        """
+        chunk = self._chunk
+        chunk_bytes = len(chunk)
+        pos = 0
+        if self._chunk_fill:
+            take = min(chunk_bytes - self._chunk_fill, len(pcm))
+            chunk[self._chunk_fill:self._chunk_fill + take] = pcm[:take]
+            self._chunk_fill += take
+            pos = take
+            if self._chunk_fill < chunk_bytes:
+                return
+            self._chunk_fill = 0
+            self.handle_payload(chunk)
+        while len(pcm) - pos >= chunk_bytes:
+            self.handle_payload(pcm[pos:pos + chunk_bytes])
+            pos += chunk_bytes
+        rest = len(pcm) - pos
+        chunk[:rest] = pcm[pos:]
+        self._chunk_fill = rest
+
+    def handle_payload(self, audio_data):
+        """Cập nhật VAD cho một frame, đẩy utterance vào hàng đợi khi đủ im lặng"""
+        is_speech = self.vad.is_speech(audio_data)
+        if is_speech:
+            self.speech_samples += len(audio_data) // 2
+            if config.BARGE_IN and self.speech_samples * 1000 >= config.BARGE_IN_MIN_SPEECH_MS * self.server.sample_rate:
+                self.barge_in()
+        else:
+            self.speech_samples = 0
+
+        audio, utterance = self.capture.push(audio_data, is_speech)
+        if audio is not None:
+            # Đầu utterance: STT streaming nhận cả pre-roll
+            if self.stt_stream is None and self.server.stt_stream_factory:
+                self.stt_stream = self.server.stt_stream_factory(self)
+            if self.stt_stream:
+                self.stt_stream.feed(audio, is_speech)
+
+        # Đẩy utterance khi đủ độ im lặng hoặc đã dài tới MAX_UTTERANCE_MS
+        if utterance is not None:
+            if self.capture.forced:
+                # Caller vẫn đang nói: phần đã cắt không được tính vào ngưỡng ngắt lời
+                self.speech_samples = 0
+            if self.capture.forced and self.server.transcribe:
+                # Đoạn bị cắt vì quá dài: chuyển thành text ngay, ghép vào lượt kế tiếp thay vì trả lời riêng
+                self.carried.append(asyncio.ensure_future(self.server.transcribe(self, utterance, self.stt_stream)))
+            else:
+                # Lượt hội thoại bắt đầu tính từ lúc phát hiện hết tiếng nói
+                self.utterances.put_latest((utterance, self.stt_stream, tracer.begin(self.call_id)))
+            self.stt_stream = None
+
+    async def take_carried_text(self):
+        """Text của các đoạn bị cắt trước utterance hiện tại, theo thứ tự; chờ STT của chúng xong"""
+        tasks = list(self.carried)
+        if not tasks:
+            return ''
+        # wait() không hủy các task khi lượt bị ngắt lời: text được giữ cho lượt sau
+        await asyncio.wait(tasks)
+        del self.carried[:len(tasks)]
+        texts = [task.result() for task in tasks if not task.cancelled() and task.exception() is None]
+        return " ".join(text for text in texts if text)
+
+    def on_partial(self, text, is_final):
+        """Transcript tạm từ STT streaming: câu trọn vẹn thì endpointer chờ im lặng ngắn hơn"""
+        if self.stt_stream is not None and self.stt_stream.covers_speech():
+            self.capture.endpointer.on_transcript(text)
+
+    def barge_in(self):
+        """Caller nói trong lúc bot đang trả lời: dừng phát và hủy STT/LLM/TTS đang chạy"""
+        replying = self.reply is not None and not self.reply.done()
+        if not replying and not self.rtp_stream.playing:
+            return
+        self.barge_ins += 1
+        self.rtp_stream.clear()
+        if replying:
+            self.reply.cancel()
+
+    async def send_audio(self, audio_data):
+        """Gửi PCM về phía caller qua RTP, chờ tới khi gói cuối được pacer gửi đi"""
+        await self.rtp_stream.play(audio_data)
+
+    def queue_audio(self, audio_data, flush=False):
+        """
+        Xếp một chunk PCM vào hàng đợi gửi mà không chờ; phần lẻ chưa đủ gói
+        được giữ lại cho chunk kế tiếp. Trả về future của gói cuối đã xếp.
+        """
+        return self.rtp_stream.play(audio_data, flush=flush)
+
+    async def _worker(self):
+        """Xử lý tuần tự các utterance của cuộc gọi này"""
+        while True:
+            audio_data, stt_stream, turn = await self.utterances.get()
+            self.busy = True
+            # Task xử lý lượt (và các task nó tạo ra) nhận turn qua contextvar
+            token = current_turn.set(turn)
+            try:
+                self.reply = asyncio.ensure_future(self.server.on_utterance(self, audio_data, stt_stream))
+            finally:
+                current_turn.reset(token)
+            status = "error"
+            try:
+                # wait() không ném lỗi khi reply bị hủy do ngắt lời
+                await asyncio.wait([self.reply])
+                if self.reply.cancelled():
+                    status = "interrupted"
+                    print(f"Caller {self.addr} (SSRC {self.ssrc:#010x}) ngắt lời bot")
+                elif self.reply.exception():
+                    print(f"Lỗi khi xử lý cuộc gọi {self.addr} (SSRC {self.ssrc:#010x}): {self.reply.exception()}")
+                else:
+                    status = "ok"
+            finally:
+                if not self.reply.done():
+                    self.reply.cancel()
+                self.reply = None
+                self.busy = False
+                tracer.finish(turn, status)
+                print(f"Lượt {turn.turn_id} [{self.call_id}] ({status}): {turn.summary()}")
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self.audio_task = loop.create_task(self._audio_worker())
+        self.task = loop.create_task(self._worker())
+
+    def close(self):
+        for task in (self.audio_task, self.task):
+            if task:
+                task.cancel()
+        self.audio_task = self.task = None
+        for task in self.carried:
+            task.cancel()
+        self.carried.clear()
+        self.audio_frames.clear()
+        self.utterances.clear()
+        self.rtp_stream.close()
+        if self.stt_stream:
+            asyncio.ensure_future(self.stt_stream.aclose())
+            self.stt_stream = None
+
+class RTPServer:
+    """
+    RTP endpoint asyncio phục vụ nhiều cuộc gọi đồng thời trên một port.
+    Gói tin được tách theo (địa chỉ remote, SSRC); mỗi cuộc gọi có
+    một CallSession và task xử lý riêng nên không chặn event loop.
+    """
+
+    def __init__(self, local_ip, local_port, on_utterance,
+                 on_session_start=None, on_session_end=None, stt_stream_factory=None, transcribe=None,
+                 chunk_size=1024, sample_rate=24000,
+                 max_calls=None, session_timeout=None, codecs=None):
+        self.local_ip = local_ip
+        self.local_port = local_port
+        self.on_utterance = on_utterance
+        self.on_session_start = on_session_start
+        self.on_session_end = on_session_end
+        self.stt_stream_factory = stt_stream_factory
+        # transcribe(session, audio, stt_stream) -> text: STT riêng cho các đoạn bị cắt vì quá dài;
+        # không có thì mỗi đoạn được trả lời như một lượt
+        self.transcribe = transcribe
+        self.chunk_size = chunk_size
+        self.sample_rate = sample_rate
+        self.max_calls = max_calls or config.MAX_CALLS
+        self.session_timeout = session_timeout or config.RTP_SESSION_TIMEOUT
+        self.codecs = codecs or config.RTP_CODECS  # Codec chấp nhận, theo thứ tự ưu tiên
+
+        self.sessions = {}
+        self.pacer = RTPPacer()
+        self.sock = None
+        # Buffer nhận cấp phát một lần, mọi gói được đọc vào đây bằng recvfrom_into
+        self._recv_buffer = bytearray(config.RTP_MAX_PACKET_SIZE)
+        self._recv_view = memoryview(self._recv_buffer)
+        self.invalid_packets = 0
+        self.dropped_packets = 0
+        self.rejected_packets = 0
+        self.unsupported_packets = 0   # Cuộc gọi mới với payload type không được chấp nhận
+        self.ignored_packets = 0       # Gói khác codec của cuộc gọi (DTMF, comfort noise...)
+        self._reaper = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # Tăng buffer nhận của kernel để không mất gói khi nhiều cuộc gọi gửi dồn
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, config.RTP_RECV_BUFFER)
+        self.sock.setblocking(False)
+        self.sock.bind((self.local_ip, self.local_port))
+        loop.add_reader(self.sock.fileno(), self._read_packets)
+        self._loop = loop
+        self._reaper = loop.create_task(self._reap_idle_sessions())
+        print(f"RTP server lắng nghe tại {self.local_ip}:{self.local_port}")
+
+    def _read_packets(self):
+        """Đọc hết các gói đang chờ trong socket vào buffer dùng chung, không cấp phát bytes"""
+        view = self._recv_view
+        while True:
+            try:
+                size, addr = self.sock.recvfrom_into(self._recv_buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                print(f"Lỗi socket RTP: {e}")
+                return
+            packet = view[:size]
+            header = parse_rtp_header(packet)
+            if header is None:
+                self.invalid_packets += 1
+                continue
+            session = self.get_session(addr, header.ssrc, header.payload_type)
+            if session is not None:
+                # Payload là view vào buffer nhận: jitter buffer copy vào kho frame của nó
+                session.handle_packet(header, packet[header.header_size:])
+
+    def get_session(self, addr, ssrc, payload_type):
+        """Lấy session theo (addr, ssrc), tạo mới nếu chưa có (codec chọn theo payload type của gói đầu)"""
+        key = (addr, ssrc)
+        session = self.sessions.get(key)
+        if session is None:
+            codec = negotiate(payload_type, self.codecs)
+            if codec is None:
+                self.unsupported_packets += 1
+                return None
+            if len(self.sessions) >= self.max_calls:
+                self.rejected_packets += 1
+                return None
+            session = CallSession(self, addr, ssrc, codec)
+            self.sessions[key] = session
+            if self.on_session_start:
+                self.on_session_start(session)
+            session.start()
+            print(f"Cuộc gọi mới từ {addr[0]}:{addr[1]} (SSRC {ssrc:#010x}, {codec.name}), "
+                  f"đang có {len(self.sessions)} cuộc gọi")
+        return session
+
+    def end_session(self, session):
+        if self.sessions.pop(session.key, None) is None:
+            return
+        session.close()
+        tracer.end_call(session.call_id)
+        if self.on_session_end:
+            self.on_session_end(session)
+        print(f"Kết thúc cuộc gọi {session.addr[0]}:{session.addr[1]} (SSRC {session.ssrc:#010x}), "
+              f"ngắt lời: {session.barge_ins}, thống kê RTP: {session.jitter_buffer.stats()}")
+
+    def sendto(self, packet, addr):
+        if self.sock is not None:
+            try:
+                self.sock.sendto(packet, addr)
+            except BlockingIOError:
+                # Buffer gửi của kernel đầy: bỏ gói như với UDP
+                self.dropped_packets += 1
+
+    async def _reap_idle_sessions(self):
+        """Đóng các session không nhận gói nào trong session_timeout giây"""
+        while True:
+            await asyncio.sleep(1)
+            now = time.monotonic()
+            for session in list(self.sessions.values()):
+                busy = session.busy or session.utterances.qsize() > 0 or session.carried
+                if not busy and now - session.last_packet_time > self.session_timeout:
+                    self.end_session(session)
+
+    def close(self):
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+        for session in list(self.sessions.values()):
+            self.end_session(session)
+        self.pacer.close()
+        if self.sock is not None:
+            self._loop.remove_reader(self.sock.fileno())
+            self.sock.close()
+            self.sock = None
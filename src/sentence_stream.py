@@ -0,0 +1,58 @@
+import re
+from config.config import config
+from .pipeline import stage
+
+class SentenceEmitter:
+    """
+    Gom token từ LLM thành các câu hoàn chỉnh để đưa vào TextNormalizer/TTS.
+    Một câu kết thúc ở dấu . ! ? … (kèm ngoặc/nháy đóng) theo sau bởi khoảng
+    trắng, hoặc ở xuống dòng. Câu quá ngắn được gộp với câu sau để TTS không
+    phải tổng hợp từng mẩu nhỏ.
+    """
+
+    BOUNDARY = re.compile(r'[.!?…]+["\')\]]*\s+|\n+')
+
+    def __init__(self, min_chars=None):
+        self.min_chars = config.SENTENCE_MIN_CHARS if min_chars is None else min_chars
+        self.buffer = ''
+        self._search_from = 0
+
+    def push(self, token):
+        """Thêm token, trả về danh sách câu đã hoàn chỉnh"""
+        self.buffer += token
+        sentences = []
+        while True:
+            match = self.BOUNDARY.search(self.buffer, self._search_from)
+            if not match:
+                break
+            sentence = self.buffer[:match.end()].strip()
+            if len(sentence) < self.min_chars:
+                self._search_from = match.end()
+                continue
+            sentences.append(sentence)
+            self.buffer = self.buffer[match.end():]
+            self._search_from = 0
+        return sentences
+
+    def flush(self):
+        """Trả về phần còn lại khi stream kết thúc"""
+        rest = self.buffer.strip()
+        self.buffer = ''
+        self._search_from = 0
+        return [rest] if rest else []
+
+async def iter_sentences(tokens, min_chars=None):
+    """Chuyển async iterator token thành async iterator câu"""
+    emitter = SentenceEmitter(min_chars)
+    async for token in tokens:
+        for sentence in emitter.push(token):
+            yield sentence
+    for sentence in emitter.flush():
+        yield sentence
+
+def prefetch(items, name=None, maxsize=0):
+    """
+    Đọc trước một async iterator trong task riêng (một stage của pipeline).
+    Người tiêu thụ (TTS, gửi RTP) chạy chậm không làm dừng việc sinh câu tiếp theo.
+    """
+    return stage(items, name, maxsize)
@@ -1,39 +1,57 @@
-import requests
-import wave
-import io
-from openai import OpenAI
+import asyncio
 from config.config import config
+from .http_transport import transport
+from . import clients
+from . import tracing
+from .stt_upload import prepare_upload
+from .streaming_stt import IncrementalRecognizer, WebSocketRecognizer
 
 class SpeechProcessor:
     def __init__(self):
         self.language = config.STT_LANGUAGE
         self.stt_api_url = config.STT_API_URL
-        self.client = OpenAI(api_key=config.OPENAI_API_KEY)
+        self._warned_incremental = False
+
+    @property
+    def client(self):
+        # Chỉ import openai khi thật sự dùng STT của OpenAI
+        return clients.async_openai()
+
+    def open_stream(self, on_partial=None, sample_rate=None):
+        """Mở phiên STT streaming theo config.STT_STREAMING, None nếu tắt streaming"""
+        sample_rate = sample_rate or config.AUDIO_RATE
+        if config.STT_STREAMING == "websocket":
+            return WebSocketRecognizer(config.STT_WEBSOCKET_URL, sample_rate, self.language, on_partial)
+        if config.STT_STREAMING == "incremental":
+            if config.STT_PROVIDER != "local":
+                # Mỗi partial gửi lại toàn bộ phần đã nói: với API tính tiền theo audio thì quá đắt
+                if not self._warned_incremental:
+                    self._warned_incremental = True
+                    print("STT_STREAMING \"incremental\" chỉ dùng với STT_PROVIDER \"local\", gửi cả utterance thay vào đó")
+                return None
+            return IncrementalRecognizer(self.speech_to_text, sample_rate,
+                                         config.STT_PARTIAL_INTERVAL_MS, on_partial)
+        return None
 
     async def speech_to_text(self, audio_data: bytes) -> str:
+        tracing.mark("stt_sent")
         try:
+            # Cắt im lặng, resample và mã hóa ngoài event loop
+            upload = await asyncio.to_thread(prepare_upload, audio_data, config.AUDIO_RATE)
             if config.STT_PROVIDER == "local":
-                return await self._local_speech_to_text(audio_data)
+                return await self._local_speech_to_text(upload)
             else:
-                return await self._openai_speech_to_text(audio_data)
+                return await self._openai_speech_to_text(upload)
         except Exception as e:
             print(f"Lỗi khi xử lý speech-to-text: {e}")
             return ''
+        finally:
+            tracing.mark("stt_done")
 
-    async def _local_speech_to_text(self, audio_data: bytes) -> str:
-        # Chuyển đổi audio data thành định dạng WAV
-        wav_buffer = io.BytesIO()
-        with wave.open(wav_buffer, 'wb') as wav_file:
-            wav_file.setnchannels(config.AUDIO_CHANNELS)
-            wav_file.setsampwidth(2)
-            wav_file.setframerate(config.AUDIO_RATE)
-            wav_file.writeframes(audio_data)
-        
-        wav_buffer.seek(0)
-        
-        # Gửi file audio đến API speech-to-text local
-        files = {'file': ('audio.wav', wav_buffer, 'audio/wav')}
-        response = requests.post(self.stt_api_url, files=files)
+    async def _local_speech_to_text(self, upload) -> str:
+        # Gửi file audio (đã chuẩn bị trong bộ nhớ) đến API speech-to-text local
+        files = {'file': upload.as_file()}
+        response = await transport.post(self.stt_api_url, files=files)
         
         if response.status_code == 200:
             result = response.json()
@@ -42,26 +60,13 @@ class SpeechProcessor:
             print(f"Lỗi API speech-to-text local: {response.status_code}")
             return ''
 
-    async def _openai_speech_to_text(self, audio_data: bytes) -> str:
+    async def _openai_speech_to_text(self, upload) -> str:
         try:
-            import tempfile
-            
-            # Tạo temporary file
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_wav:
-                with wave.open(temp_wav.name, 'wb') as wav_file:
-                    wav_file.setnchannels(config.AUDIO_CHANNELS)
-                    wav_file.setsampwidth(2)
-                    wav_file.setframerate(config.AUDIO_RATE)
-                    wav_file.writeframes(audio_data)
-                
-                # Mở file để gửi đến OpenAI
-                with open(temp_wav.name, 'rb') as audio_file:
-                    response = self.client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=audio_file,
-                        language=config.STT_LANGUAGE
-                    )
-            
+            response = await self.client.audio.transcriptions.create(
+                model="whisper-1",
+                file=upload.as_file(),
+                language=config.STT_LANGUAGE
+            )
             return response.text
             
         except Exception as e:
@@ -0,0 +1,183 @@
+import asyncio
+import json
+from config.config import config
+from . import tracing
+
+class StreamingRecognizer:
+    """
+    Phiên nhận dạng streaming cho một utterance.
+    Audio được đưa vào bằng feed() ngay khi thu được (phải gọi trên thread của
+    event loop); partial hypothesis được báo qua on_partial(text, is_final),
+    finish() trả về transcript cuối cùng.
+    """
+
+    def __init__(self, sample_rate, on_partial=None):
+        self.sample_rate = sample_rate
+        self.on_partial = on_partial
+        self.partial = ''
+
+    def feed(self, pcm, is_speech=True):
+        raise NotImplementedError
+
+    async def finish(self):
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+    def covers_speech(self):
+        """Partial gần nhất đã bao phủ toàn bộ phần tiếng nói đã đưa vào"""
+        return True
+
+    def _emit(self, text, is_final):
+        self.partial = text
+        if self.on_partial:
+            try:
+                self.on_partial(text, is_final)
+            except Exception as e:
+                print(f"Lỗi trong on_partial: {e}")
+
+class IncrementalRecognizer(StreamingRecognizer):
+    """
+    Streaming trên một API nhận dạng cả file (STT_API_URL hoặc OpenAI).
+    Khi đang nói, cứ mỗi interval_ms audio mới sẽ nhận dạng lại phần đã nói
+    để có partial. Ngay khi chuyển sang im lặng, phần đã nói được gửi đi luôn,
+    nên khi recorder kết thúc utterance (sau khoảng im lặng) transcript
+    thường đã sẵn sàng và finish() không phải chờ thêm một round trip.
+    """
+
+    def __init__(self, transcribe, sample_rate, interval_ms=1000, on_partial=None):
+        super().__init__(sample_rate, on_partial)
+        self.transcribe = transcribe
+        self.interval_bytes = sample_rate * 2 * interval_ms // 1000
+        self.audio = bytearray()
+        self.speech_end = 0         # Vị trí (byte) ngay sau chunk có tiếng nói cuối cùng
+        self._was_speech = False
+        self._last_request_end = 0
+        self._hypothesis = ''
+        self._hypothesis_end = 0    # Phần audio mà hypothesis hiện tại đã bao phủ
+        self._task = None
+        self._pending_request = False
+
+    def feed(self, pcm, is_speech=True):
+        self.audio += pcm
+        if is_speech:
+            self.speech_end = len(self.audio)
+            self._was_speech = True
+            if self.speech_end - self._last_request_end >= self.interval_bytes:
+                self._request()
+        elif self._was_speech:
+            # Vừa hết tiếng nói: nhận dạng ngay phần đã nói, không chờ hết khoảng im lặng
+            self._was_speech = False
+            self._request()
+
+    def _request(self):
+        if self._task and not self._task.done():
+            self._pending_request = True
+            return
+        end = self.speech_end
+        if end == 0 or end == self._hypothesis_end:
+            return
+        self._last_request_end = end
+        self._task = asyncio.ensure_future(self._transcribe(end))
+
+    def covers_speech(self):
+        return self._hypothesis_end >= self.speech_end
+
+    async def _transcribe(self, end):
+        text = await self.transcribe(bytes(self.audio[:end]))
+        self._hypothesis, self._hypothesis_end = text, end
+        self._emit(text, False)
+        if self._pending_request:
+            self._pending_request = False
+            self._task = None
+            self._request()
+
+    async def finish(self):
+        tracing.mark("stt_sent")
+        # Chờ tới khi hypothesis bao phủ toàn bộ phần có tiếng nói
+        while self._hypothesis_end < self.speech_end:
+            if self._task is None or self._task.done():
+                self._request()
+            await self._task
+        self._emit(self._hypothesis, True)
+        tracing.mark("stt_done")
+        return self._hypothesis
+
+    async def aclose(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+class WebSocketRecognizer(StreamingRecognizer):
+    """
+    Streaming qua websocket của STT service local (STT_WEBSOCKET_URL).
+    Giao thức: gửi {"type": "start", ...} rồi các frame PCM nhị phân,
+    kết thúc bằng {"type": "end"}; server trả về các message JSON
+    {"text": ..., "final": bool}.
+    """
+
+    def __init__(self, url, sample_rate, language, on_partial=None):
+        super().__init__(sample_rate, on_partial)
+        self.url = url
+        self.language = language
+        self.final = None
+        self._outgoing = asyncio.Queue()
+        self._final_event = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+
+    def feed(self, pcm, is_speech=True):
+        self._outgoing.put_nowait(bytes(pcm))
+
+    async def _run(self):
+        import websockets
+        try:
+            async with websockets.connect(self.url) as websocket:
+                await websocket.send(json.dumps({
+                    "type": "start",
+                    "sample_rate": self.sample_rate,
+                    "language": self.language
+                }))
+                reader = asyncio.ensure_future(self._read(websocket))
+                try:
+                    while True:
+                        chunk = await self._outgoing.get()
+                        if chunk is None:
+                            await websocket.send(json.dumps({"type": "end"}))
+                            break
+                        await websocket.send(chunk)
+                    await reader
+                finally:
+                    reader.cancel()
+        except Exception as e:
+            print(f"Lỗi STT streaming: {e}")
+        finally:
+            self._final_event.set()
+
+    async def _read(self, websocket):
+        async for message in websocket:
+            data = json.loads(message)
+            if "error" in data:
+                print(f"Lỗi STT streaming: {data['error']}")
+                return
+            text = data.get("text", "")
+            if data.get("final"):
+                self.final = text
+                self._emit(text, True)
+                return
+            self._emit(text, False)
+
+    async def finish(self):
+        tracing.mark("stt_sent")
+        self._outgoing.put_nowait(None)
+        try:
+            await asyncio.wait_for(self._final_event.wait(), config.STT_FINAL_TIMEOUT)
+        except asyncio.TimeoutError:
+            print("Hết thời gian chờ transcript cuối, dùng partial gần nhất")
+        if self.final is None:
+            self.final = self.partial
+        tracing.mark("stt_done")
+        return self.final
+
+    async def aclose(self):
+        if not self._task.done():
+            self._task.cancel()
@@ -0,0 +1,170 @@
+import io
+import threading
+import wave
+import numpy as np
+from config.config import config
+from . import tracing
+from .resample import resample
+from .vad import create_vad
+
+# Định dạng upload: (tên file, MIME, (format, subtype) của soundfile)
+FORMATS = {
+    "wav": ("audio.wav", "audio/wav", None),
+    "flac": ("audio.flac", "audio/flac", ("FLAC", "PCM_16")),
+    "opus": ("audio.ogg", "audio/ogg", ("OGG", "OPUS")),
+}
+
+WAV_HEADER_BYTES = 44
+
+class Upload:
+    """Audio của một request STT đã qua cắt im lặng, resample và mã hóa"""
+
+    def __init__(self, data, format, sample_rate, duration_ms, original_bytes, trimmed_ms):
+        self.data = data
+        self.format = format
+        self.filename, self.content_type, _ = FORMATS[format]
+        self.sample_rate = sample_rate
+        self.duration_ms = duration_ms          # Độ dài audio được gửi
+        self.original_bytes = original_bytes    # Kích thước WAV tại AUDIO_RATE nếu gửi nguyên utterance
+        self.trimmed_ms = trimmed_ms            # Phần im lặng đầu/cuối đã cắt
+
+    @property
+    def saved_bytes(self):
+        return self.original_bytes - len(self.data)
+
+    def as_file(self):
+        """Tuple (tên file, nội dung, MIME) cho multipart của httpx/OpenAI SDK"""
+        return (self.filename, self.data, self.content_type)
+
+    def to_dict(self):
+        return {
+            "format": self.format,
+            "sample_rate": self.sample_rate,
+            "duration_ms": self.duration_ms,
+            "trimmed_ms": self.trimmed_ms,
+            "original_bytes": self.original_bytes,
+            "sent_bytes": len(self.data),
+            "saved_bytes": self.saved_bytes,
+        }
+
+class UploadStats:
+    """Tổng số byte trước/sau khi chuẩn bị của mọi request STT trong process"""
+
+    def __init__(self):
+        self.requests = 0
+        self.original_bytes = 0
+        self.sent_bytes = 0
+        self.trimmed_ms = 0
+        self._lock = threading.Lock()
+
+    def add(self, upload):
+        with self._lock:
+            self.requests += 1
+            self.original_bytes += upload.original_bytes
+            self.sent_bytes += len(upload.data)
+            self.trimmed_ms += upload.trimmed_ms
+
+    def report(self):
+        with self._lock:
+            saved = self.original_bytes - self.sent_bytes
+            return {
+                "requests": self.requests,
+                "original_bytes": self.original_bytes,
+                "sent_bytes": self.sent_bytes,
+                "saved_bytes": saved,
+                "saved_percent": round(100 * saved / self.original_bytes, 1) if self.original_bytes else None,
+                "trimmed_ms": self.trimmed_ms,
+            }
+
+# Thống kê dùng chung trong process
+stats = UploadStats()
+
+def speech_bounds(samples, sample_rate, padding_ms=None):
+    """
+    (start, end) theo chỉ số sample của đoạn từ frame có tiếng nói đầu tiên tới
+    frame cuối cùng theo VAD, nới thêm padding_ms mỗi bên; None nếu không có.
+    """
+    padding_ms = config.STT_TRIM_PADDING_MS if padding_ms is None else padding_ms
+    # VAD riêng cho mỗi lần gọi: hàm này chạy song song trên nhiều thread
+    vad = create_vad(sample_rate)
+    n_frames = len(samples) // vad.frame_samples
+    if n_frames == 0:
+        return None
+    frames = samples[:n_frames * vad.frame_samples].reshape(n_frames, vad.frame_samples)
+    speech = np.flatnonzero(vad.classify(frames))
+    if len(speech) == 0:
+        return None
+    padding = sample_rate * padding_ms // 1000
+    start = max(0, int(speech[0]) * vad.frame_samples - padding)
+    end = min(len(samples), (int(speech[-1]) + 1) * vad.frame_samples + padding)
+    return start, end
+
+def encode(samples, sample_rate, format):
+    """Mảng int16 -> file audio trong bộ nhớ (bytes)"""
+    buffer = io.BytesIO()
+    if format == "wav":
+        with wave.open(buffer, 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(sample_rate)
+            wav_file.writeframes(samples.tobytes())
+        return buffer.getvalue()
+
+    import soundfile
+    container, subtype = FORMATS[format][2]
+    soundfile.write(buffer, samples, sample_rate, format=container, subtype=subtype)
+    return buffer.getvalue()
+
+_missing_encoder = False
+
+def upload_format(format=None):
+    """Định dạng sẽ dùng: flac/opus cần soundfile, nếu chưa cài thì gửi WAV"""
+    global _missing_encoder
+    format = format or config.STT_UPLOAD_FORMAT
+    if format not in FORMATS:
+        raise ValueError(f"STT_UPLOAD_FORMAT không hợp lệ: {format}")
+    if format == "wav":
+        return format
+    try:
+        import soundfile  # noqa: F401
+    except ImportError:
+        if not _missing_encoder:
+            _missing_encoder = True
+            print(f"Chưa cài soundfile, gửi STT dạng WAV thay cho {format}")
+        return "wav"
+    return format
+
+def prepare_upload(pcm, sample_rate=None, target_rate=None, format=None, trim=None):
+    """
+    Chuẩn bị utterance PCM 16-bit mono cho STT: cắt im lặng đầu/cuối theo VAD
+    (gồm khoảng im lặng mà capture chờ trước khi kết thúc utterance), resample
+    về STT_SAMPLE_RATE và mã hóa theo STT_UPLOAD_FORMAT, hoàn toàn trong bộ nhớ.
+    Tốn CPU theo độ dài utterance: gọi qua asyncio.to_thread.
+    """
+    sample_rate = sample_rate or config.AUDIO_RATE
+    target_rate = target_rate or config.STT_SAMPLE_RATE
+    trim = config.STT_TRIM_SILENCE if trim is None else trim
+    format = upload_format(format)
+
+    samples = np.frombuffer(pcm, dtype=np.int16, count=len(pcm) // 2)
+    total = len(samples)
+    if trim:
+        bounds = speech_bounds(samples, sample_rate)
+        # Không thấy tiếng nói: gửi nguyên để STT tự quyết định
+        if bounds is not None:
+            samples = samples[bounds[0]:bounds[1]]
+    kept = len(samples)
+    if target_rate != sample_rate and kept:
+        samples = np.frombuffer(resample(memoryview(samples).cast('B'), sample_rate, target_rate), dtype=np.int16)
+
+    upload = Upload(
+        encode(samples, target_rate, format),
+        format,
+        target_rate,
+        duration_ms=1000 * kept // sample_rate,
+        original_bytes=WAV_HEADER_BYTES + 2 * total,
+        trimmed_ms=1000 * (total - kept) // sample_rate,
+    )
+    stats.add(upload)
+    tracing.annotate("stt_upload", upload.to_dict())
+    return upload
@@ -1,6 +1,7 @@
-from underthesea import text_normalize as TTSnorm
 import re
 from datetime import datetime
+from functools import lru_cache
+from config.config import config
 
 class TextNormalizer:
     # Định nghĩa các từ điển chuyển đổi số
@@ -8,7 +9,7 @@ class TextNormalizer:
         '0': 'không', '1': 'một', '2': 'hai', '3': 'ba', '4': 'bốn',
         '5': 'năm', '6': 'sáu', '7': 'bảy', '8': 'tám', '9': 'chín'
     }
-    
+
     TENS = {
         '1': 'mười',
         '2': 'hai mươi',
@@ -21,130 +22,242 @@ class TextNormalizer:
         '9': 'chín mươi'
     }
 
+    # Đơn vị của từng nhóm 3 chữ số dưới một tỷ, từ phải sang trái
+    SCALES = ['', 'nghìn', 'triệu']
+
+    CURRENCIES = {
+        'đ': 'đồng', '₫': 'đồng', 'vnđ': 'đồng', 'vnd': 'đồng', 'đồng': 'đồng',
+        'usd': 'đô la', '$': 'đô la', '€': 'ơ rô', 'eur': 'ơ rô',
+    }
+
+    # Các pattern được compile một lần khi import
+    EMOJI_PATTERN = re.compile("["
+        u"\U0001F600-\U0001F64F"  # emoticons
+        u"\U0001F300-\U0001F5FF"  # symbols & pictographs
+        u"\U0001F680-\U0001F6FF"  # transport & map symbols
+        u"\U0001F1E0-\U0001F1FF"  # flags (iOS)
+        u"\U00002702-\U000027B0"
+        u"\U000024C2-\U0001F251"
+        "]+", flags=re.UNICODE)
+
+    # Mọi dạng số trong một pattern: thứ tự nhánh là thứ tự ưu tiên.
+    # Lookahead đầu tiên loại nhanh các vị trí không thể bắt đầu một số.
+    NUMBER_PATTERN = re.compile(r"""
+        (?=[\d$€+nN])(?:
+            (?P<date>(?:\b[nN]gày\s+)?\b\d{1,2}[-/]\d{1,2}[-/]\d{4}\b)
+          | (?P<time>\b(?P<hour>[01]?\d|2[0-3])(?:[:hH](?P<minute>[0-5]\d)(?::(?P<second>[0-5]\d))?|[hH])\b)
+          | (?P<phone>(?:\+84\s?|\b0)\d{2,3}(?:[ .]?\d{3}){2}\d?\b)
+          | (?P<prefix_currency>[$€])\s?(?P<prefix_amount>\d+(?:[.,]\d+)*)
+          | (?P<amount>\b\d+(?:[.,]\d+)*)(?P<suffix>\s?(?i:%|k\b|tr\b|đồng\b|vnđ\b|vnd\b|usd\b|eur\b|[đ₫€](?!\w)))?
+        )
+    """, re.VERBOSE)
+
+    THOUSANDS_PATTERN = re.compile(r'^\d{1,3}(?:\.\d{3})+$|^\d{1,3}(?:,\d{3}){2,}$')
+    PUNCTUATION_RUN = re.compile(r'([.!?])\1+')
+    PUNCTUATION_SPACE = re.compile(r'\s*([.,!?])')
+    ABBREVIATIONS = re.compile(r'\bA\.?I\b')
+
+    # Ký tự đặc biệt được thay/bỏ trong một lần quét (nhanh hơn str.translate với chuỗi Unicode)
+    CHAR_REPLACEMENTS = {
+        "…": "...",  # Thêm xử lý cho dấu ba chấm
+    }
+    SPECIAL_CHARS = re.compile(
+        '["\''
+        '…'
+        '\ufe0f'  # Loại bỏ variation selector
+        '⭐★☆'     # Loại bỏ các dạng ngôi sao
+        '♥❤'       # Loại bỏ các dạng trái tim
+        ']')
+
+    @staticmethod
+    def _read_two(tens, units):
+        """Đọc hai chữ số cuối của một nhóm"""
+        if tens == '0':
+            return TextNormalizer.DIGITS[units]
+        if units == '0':
+            return TextNormalizer.TENS[tens]
+        if units == '5':
+            return f"{TextNormalizer.TENS[tens]} lăm"
+        return f"{TextNormalizer.TENS[tens]} {TextNormalizer.DIGITS[units]}"
+
+    @staticmethod
+    def _read_group(group, full):
+        """
+        Đọc một nhóm 3 chữ số. full=True khi nhóm đứng sau một nhóm khác
+        (đọc cả "không trăm", "linh": 1005 -> một nghìn không trăm linh năm).
+        """
+        hundreds, tens, units = group.rjust(3, '0')
+        words = []
+        if hundreds != '0' or full:
+            words.append(f"{TextNormalizer.DIGITS[hundreds]} trăm")
+        if tens == '0':
+            if units != '0':
+                if words:
+                    words.append('linh')
+                words.append(TextNormalizer.DIGITS[units])
+        else:
+            words.append(TextNormalizer._read_two(tens, units))
+        return ' '.join(words)
+
     @staticmethod
     def number_to_words(number):
         """Convert a number to Vietnamese words"""
         if not isinstance(number, str):
             number = str(number)
-            
-        # Xử lý số có 1 chữ số
-        if len(number) == 1:
-            return TextNormalizer.DIGITS[number]
-            
-        # Xử lý số có 2 chữ số
-        if len(number) == 2:
-            if number[0] == '1':
-                if number[1] == '0':
-                    return 'mười'
-                if number[1] == '5':
-                    return 'mười lăm'
-                return f"mười {TextNormalizer.DIGITS[number[1]]}"
-            
-            if number[1] == '0':
-                return TextNormalizer.TENS[number[0]]
-            if number[1] == '5':
-                return f"{TextNormalizer.TENS[number[0]]} lăm"
-            return f"{TextNormalizer.TENS[number[0]]} {TextNormalizer.DIGITS[number[1]]}"
-            
-        # Với số lớn hơn, có thể thêm xử lý tùy nhu cầu
-        return number
+        number = number.lstrip('0')
+        if not number:
+            return TextNormalizer.DIGITS['0']
+        return TextNormalizer._read_number(number, full=False)
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _read_number(number, full):
+        """Đọc chuỗi chữ số theo nhóm nghìn/triệu, phần trên 9 chữ số đọc theo "tỷ" """
+        if len(number) > 9:
+            head, tail = number[:-9], number[-9:]
+            words = f"{TextNormalizer._read_number(head, full)} tỷ"
+            if tail.strip('0'):
+                words += f" {TextNormalizer._read_number(tail, True)}"
+            return words
+
+        # Chia thành các nhóm 3 chữ số từ phải sang trái
+        groups = [number[max(0, end - 3):end] for end in range(len(number), 0, -3)]
+        words = []
+        for index in range(len(groups) - 1, -1, -1):
+            group = groups[index]
+            if group.strip('0'):
+                words.append(TextNormalizer._read_group(group, full=full or bool(words)))
+                if index:
+                    words.append(TextNormalizer.SCALES[index])
+        return ' '.join(words)
+
+    @staticmethod
+    def digits_to_words(digits):
+        """Đọc từng chữ số (số điện thoại, mã số)"""
+        return ' '.join(TextNormalizer.DIGITS[d] for d in digits if d.isdigit())
+
+    @staticmethod
+    def amount_to_words(amount):
+        """Đọc số có dấu phân cách nghìn (1.500.000) hoặc phần thập phân (3,5 / 3.5)"""
+        if TextNormalizer.THOUSANDS_PATTERN.match(amount):
+            return TextNormalizer.number_to_words(amount.replace('.', '').replace(',', ''))
+        integer, fraction = TextNormalizer._split_decimal(amount)
+        words = TextNormalizer.number_to_words(integer)
+        if fraction:
+            # Phần thập phân có số 0 ở đầu được đọc từng chữ số (0,05 -> không phẩy không năm)
+            fraction_words = (TextNormalizer.digits_to_words(fraction) if fraction.startswith('0')
+                              else TextNormalizer.number_to_words(fraction))
+            words = f"{words} phẩy {fraction_words}"
+        return words
+
+    @staticmethod
+    def _split_decimal(amount):
+        """Tách phần nguyên và phần thập phân ở dấu . hoặc , đầu tiên"""
+        for index, char in enumerate(amount):
+            if char in '.,':
+                return amount[:index], amount[index + 1:].replace('.', '').replace(',', '')
+        return amount, ''
 
     @staticmethod
     def convert_date(match):
         """Convert date string to words"""
-        date_str = match.group(0)
+        # Bỏ chữ "ngày" đứng trước (nếu có) để không đọc lặp
+        date_str = match.group(0).split()[-1]
         try:
             # Hỗ trợ cả định dạng / và -
             if '/' in date_str:
                 date = datetime.strptime(date_str, '%d/%m/%Y')
             else:
                 date = datetime.strptime(date_str, '%d-%m-%Y')
-                
+
             day = TextNormalizer.number_to_words(date.day)
             month = TextNormalizer.number_to_words(date.month)
             year = TextNormalizer.number_to_words(date.year)
-            
+
             return f"ngày {day} tháng {month} năm {year}"
         except:
-            return date_str
+            return ' '.join(TextNormalizer.number_to_words(part)
+                            for part in re.split(r'[-/]', date_str))
+
+    @staticmethod
+    def _convert_number(match):
+        if match.group('date'):
+            return TextNormalizer.convert_date(match)
+
+        if match.group('time'):
+            words = f"{TextNormalizer.number_to_words(match.group('hour'))} giờ"
+            if match.group('minute') and (match.group('minute') != '00' or match.group('second')):
+                words += f" {TextNormalizer.number_to_words(match.group('minute'))} phút"
+            if match.group('second'):
+                words += f" {TextNormalizer.number_to_words(match.group('second'))} giây"
+            return words
+
+        if match.group('phone'):
+            phone = match.group('phone')
+            prefix = 'cộng tám tư ' if phone.startswith('+84') else ''
+            return prefix + TextNormalizer.digits_to_words(phone[3:] if prefix else phone)
+
+        if match.group('prefix_currency'):
+            amount = TextNormalizer.amount_to_words(match.group('prefix_amount'))
+            return f"{amount} {TextNormalizer.CURRENCIES[match.group('prefix_currency')]}"
+
+        amount = match.group('amount')
+        suffix = (match.group('suffix') or '').strip().lower()
+        if len(amount) > 15 and amount.isdigit():
+            # Số quá dài (số tài khoản, mã): đọc từng chữ số
+            return TextNormalizer.digits_to_words(amount)
+        words = TextNormalizer.amount_to_words(amount)
+        if suffix == '%':
+            return f"{words} phần trăm"
+        if suffix == 'k':
+            return f"{words} nghìn"
+        if suffix == 'tr':
+            return f"{words} triệu"
+        if suffix:
+            return f"{words} {TextNormalizer.CURRENCIES[suffix]}"
+        return words
 
     @staticmethod
     def normalize_numbers(text):
-        """Convert number strings like "02" to words"""
-        # Xử lý ngày tháng trước
-        text = re.sub(r'\b\d{2}[-/]\d{2}[-/]\d{4}\b', TextNormalizer.convert_date, text)
-        
-        # Sau đó xử lý các số riêng lẻ
-        def convert_number(match):
-            num = match.group(0)
-            # Bỏ các số 0 ở đầu
-            num = str(int(num))
-            return TextNormalizer.number_to_words(num)
-            
-        # Tìm và thay thế các số
-        text = re.sub(r'\b\d+\b', convert_number, text)
-        return text
-    
+        """Đọc số thành chữ: ngày, giờ, số điện thoại, tiền tệ, phần trăm, thập phân, số nguyên"""
+        return TextNormalizer.NUMBER_PATTERN.sub(TextNormalizer._convert_number, text)
+
     @staticmethod
     def normalize_punctuation(text):
         """Add spaces before punctuation and normalize multiple punctuation"""
-        text = re.sub(r'([.,!?])', r' \1', text)  # Add space before punctuation
-        text = re.sub(r'\s+([.,!?])', r' \1', text)  # Remove extra spaces
-        text = re.sub(r'\.+', '.', text)  # Replace multiple dots
-        text = re.sub(r'!+', '!', text)  # Replace multiple exclamation marks
-        text = re.sub(r'\?+', '?', text)  # Replace multiple question marks
+        text = TextNormalizer.PUNCTUATION_RUN.sub(_first_char, text)  # Replace repeated . ! ?
+        text = TextNormalizer.PUNCTUATION_SPACE.sub(_space_before, text)  # One space before punctuation
         return text.strip()
 
     @staticmethod
     def remove_emojis(text):
         """Remove emojis and special characters from text"""
-        # Pattern để match emoji và một số ký tự đặc biệt
-        emoji_pattern = re.compile("["
-            u"\U0001F600-\U0001F64F"  # emoticons
-            u"\U0001F300-\U0001F5FF"  # symbols & pictographs
-            u"\U0001F680-\U0001F6FF"  # transport & map symbols
-            u"\U0001F1E0-\U0001F1FF"  # flags (iOS)
-            u"\U00002702-\U000027B0"
-            u"\U000024C2-\U0001F251"
-            "]+", flags=re.UNICODE)
-        return emoji_pattern.sub('', text)
+        return TextNormalizer.EMOJI_PATTERN.sub('', text)
 
     @staticmethod
     def normalize_vietnamese_text(text):
-        """Normalize Vietnamese text for TTS"""
-        # Loại bỏ emoji và ký tự đặc biệt
-        text = TextNormalizer.remove_emojis(text)
-        
+        """Normalize Vietnamese text for TTS (kết quả được cache theo câu)"""
+        return _normalize_cached(text)
+
+    @staticmethod
+    def _normalize(text):
+        # Loại bỏ emoji và ký tự đặc biệt trong một lần quét
+        text = TextNormalizer.SPECIAL_CHARS.sub(_replace_char, TextNormalizer.remove_emojis(text))
+
         # Chuẩn hóa cơ bản với underthesea
-        text = TTSnorm(text)
-        
-        # Xử lý số và ngày tháng
+        text = _tts_norm(text)
+
+        # Viết tắt (trước khi tách dấu câu để "A.I" vẫn khớp)
+        text = TextNormalizer.ABBREVIATIONS.sub('Ây Ai', text)
+
+        # Xử lý số, ngày tháng, giờ, tiền tệ
         text = TextNormalizer.normalize_numbers(text)
-        
+
         # Xử lý dấu câu
         text = TextNormalizer.normalize_punctuation(text)
-        
-        # Các thay thế đặc biệt
-        replacements = {
-            '"': '',
-            "'": '',
-            "AI": "Ây Ai",
-            "A.I": "Ây Ai",
-            "…": "...",  # Thêm xử lý cho dấu ba chấm
-            "️": "",     # Loại bỏ variation selector
-            "⭐": "",    # Loại bỏ ngôi sao
-            "★": "",     # Loại bỏ ngôi sao khác dạng
-            "☆": "",     # Loại bỏ ngôi sao rỗng
-            "♥": "",     # Loại bỏ trái tim
-            "❤": "",     # Loại bỏ trái tim khác dạng
-        }
-        
-        for old, new in replacements.items():
-            text = text.replace(old, new)
-            
+
         # Loại bỏ khoảng trắng thừa
-        text = ' '.join(text.split())
-        return text.strip()
+        return ' '.join(text.split())
 
     @staticmethod
     def check_end_conversation(text):
@@ -152,4 +265,24 @@ class TextNormalizer:
         if "##END##" in text:
             # Remove the marker and return cleaned text and True flag
             return text.replace("##END##", "").strip(), True
-        return text, False 
\ No newline at end of file
+        return text, False
+
+def _tts_norm(text):
+    # underthesea import mất vài giây: chỉ import ở câu đầu tiên cần chuẩn hóa
+    global _tts_norm
+    from underthesea import text_normalize
+    _tts_norm = text_normalize
+    return text_normalize(text)
+
+# Hàm thay thế thay cho template r'\1' (không phải expand template mỗi lần khớp)
+def _first_char(match):
+    return match.group(1)
+
+def _space_before(match):
+    return ' ' + match.group(1)
+
+def _replace_char(match):
+    return TextNormalizer.CHAR_REPLACEMENTS.get(match.group(), '')
+
+# Bot hay lặp lại cùng một câu (chào hỏi, xác nhận, câu báo lỗi)
+_normalize_cached = lru_cache(maxsize=config.TEXT_NORMALIZER_CACHE_SIZE)(TextNormalizer._normalize)
@@ -0,0 +1,200 @@
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from config.config import config
+
+# Các mốc của một lượt hội thoại theo thứ tự, tính từ lúc phát hiện hết tiếng nói
+STAGES = (
+    "speech_end",        # VAD/capture xác định người dùng đã nói xong
+    "stt_sent",          # Gửi request STT (cả utterance hoặc phần cuối khi streaming)
+    "stt_done",          # Có transcript cuối
+    "llm_sent",          # Gửi request LLM
+    "llm_first_token",
+    "llm_last_token",
+    "normalized",        # Câu đầu tiên đã qua TextNormalizer
+    "tts_sent",          # Gửi câu đầu tiên cho TTS (hoặc đọc từ cache)
+    "tts_first_byte",    # Chunk PCM đầu tiên từ TTS
+    "rtp_first_packet",  # Gói RTP đầu tiên của phản hồi được gửi
+    "audio_played",      # Chế độ microphone: audio phản hồi bắt đầu phát ra loa
+)
+
+# Lượt hội thoại hiện tại, tự truyền qua các task asyncio tạo ra từ task xử lý lượt
+current_turn = contextvars.ContextVar("current_turn", default=None)
+
+class Turn:
+    """Các mốc thời gian (giây, time.monotonic) của một lượt hội thoại"""
+
+    __slots__ = ('call_id', 'turn_id', 'start', 'wall_time', 'marks', 'status', 'info')
+
+    def __init__(self, call_id, turn_id, start=None):
+        self.call_id = call_id
+        self.turn_id = turn_id
+        self.start = time.monotonic() if start is None else start
+        self.wall_time = time.time()
+        self.marks = {"speech_end": self.start}
+        self.status = None
+        self.info = {}               # Thông tin thêm của lượt (vd. kích thước upload STT)
+
+    def mark(self, stage):
+        """Ghi mốc stage ở lần đầu tiên (các lần sau bị bỏ qua); gọi được từ mọi thread"""
+        if stage not in self.marks:
+            self.marks[stage] = time.monotonic()
+
+    def annotate(self, key, value):
+        """Ghi thông tin thêm cho lượt (lần sau ghi đè lần trước)"""
+        self.info[key] = value
+
+    def latencies(self):
+        """{stage: ms kể từ speech_end} theo thứ tự STAGES"""
+        return {stage: round((self.marks[stage] - self.start) * 1000, 1)
+                for stage in STAGES if stage in self.marks}
+
+    def to_dict(self):
+        record = {
+            "call_id": self.call_id,
+            "turn_id": self.turn_id,
+            "time": round(self.wall_time, 3),
+            "status": self.status,
+            "latency_ms": self.latencies(),
+        }
+        if self.info:
+            record["info"] = self.info
+        return record
+
+    def summary(self):
+        return " ".join(f"{stage}={ms:.0f}ms" for stage, ms in self.latencies().items() if stage != "speech_end")
+
+def mark(stage):
+    """Ghi mốc stage cho lượt hiện tại (không làm gì nếu ngoài một lượt hội thoại)"""
+    turn = current_turn.get()
+    if turn is not None:
+        turn.mark(stage)
+
+def annotate(key, value):
+    """Ghi thông tin thêm cho lượt hiện tại (không làm gì nếu ngoài một lượt hội thoại)"""
+    turn = current_turn.get()
+    if turn is not None:
+        turn.annotate(key, value)
+
+class Histogram:
+    """Histogram tích lũy kiểu Prometheus (giây)"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        return list(itertools.accumulate(self.counts))
+
+class Tracer:
+    """
+    Gom các lượt hội thoại đã xong vào histogram độ trễ theo từng mốc, xuất
+    dạng text của Prometheus (ghi file cho textfile collector) và ghi mỗi lượt
+    thành một dòng JSONL.
+    """
+
+    def __init__(self, trace_file=None, metrics_file=None, buckets=None, enabled=None, metrics_interval=None):
+        self.enabled = config.TRACING if enabled is None else enabled
+        self.trace_file = trace_file if trace_file is not None else config.TRACE_FILE
+        self.metrics_file = metrics_file if metrics_file is not None else config.TRACE_METRICS_FILE
+        self.buckets = buckets or config.TRACE_BUCKETS
+        self.metrics_interval = config.TRACE_METRICS_INTERVAL if metrics_interval is None else metrics_interval
+        self._metrics_written = 0
+        self.histograms = {stage: Histogram(self.buckets) for stage in STAGES[1:]}
+        self.turns = {}              # status -> số lượt
+        self._turn_ids = {}          # call_id -> số lượt đã bắt đầu
+        self._lock = threading.Lock()
+        self._trace = None
+        self.collectors = []         # Hàm trả về thêm các dòng metrics (vd. độ sâu hàng đợi các stage)
+
+    def begin(self, call_id, start=None):
+        """Bắt đầu lượt mới của cuộc gọi (lúc phát hiện hết tiếng nói)"""
+        turn_id = self._turn_ids.get(call_id, 0) + 1
+        self._turn_ids[call_id] = turn_id
+        return Turn(call_id, turn_id, start)
+
+    def end_call(self, call_id):
+        self._turn_ids.pop(call_id, None)
+
+    def finish(self, turn, status="ok"):
+        """Ghi nhận lượt đã xong: cập nhật histogram, ghi JSONL và file metrics"""
+        turn.status = status
+        if not self.enabled:
+            return
+        with self._lock:
+            self.turns[status] = self.turns.get(status, 0) + 1
+            for stage, at in turn.marks.items():
+                if stage in self.histograms:
+                    self.histograms[stage].observe(at - turn.start)
+            if self.trace_file:
+                if self._trace is None:
+                    self._trace = _open_append(self.trace_file)
+                self._trace.write(json.dumps(turn.to_dict(), ensure_ascii=False) + "\n")
+                self._trace.flush()
+        # File metrics được ghi lại tối đa mỗi metrics_interval giây
+        now = time.monotonic()
+        if self.metrics_file and now - self._metrics_written >= self.metrics_interval:
+            self._metrics_written = now
+            self.write_prometheus(self.metrics_file)
+
+    def prometheus(self):
+        """Metrics dạng text exposition của Prometheus"""
+        lines = [
+            "# HELP callbot_turn_stage_seconds Time from end of user speech to each stage of the reply.",
+            "# TYPE callbot_turn_stage_seconds histogram",
+        ]
+        with self._lock:
+            for stage, histogram in self.histograms.items():
+                if not histogram.count:
+                    continue
+                for bound, count in zip(histogram.buckets, histogram.cumulative()):
+                    lines.append(f'callbot_turn_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'callbot_turn_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'callbot_turn_stage_seconds_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'callbot_turn_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+            lines.append("# HELP callbot_turns_total Finished conversation turns by status.")
+            lines.append("# TYPE callbot_turns_total counter")
+            for status, count in self.turns.items():
+                lines.append(f'callbot_turns_total{{status="{status}"}} {count}')
+        for collector in self.collectors:
+            lines += collector()
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Ghi metrics ra file (ghi file tạm rồi đổi tên để collector không đọc file dở)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp = f"{path}.tmp"
+        with open(temp, "w") as f:
+            f.write(self.prometheus())
+        os.replace(temp, path)
+
+    def close(self):
+        if self.enabled and self.metrics_file:
+            self.write_prometheus(self.metrics_file)
+        if self._trace is not None:
+            self._trace.close()
+            self._trace = None
+
+def _open_append(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return open(path, "a", encoding="utf-8")
+
+# Tracer dùng chung trong process
+tracer = Tracer()
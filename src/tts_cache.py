@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from config.config import config
+
+class DiskStore:
+    """
+    Kho PCM trên đĩa, mỗi mục một file, LRU giới hạn theo tổng số byte.
+    Đọc qua mmap và trả về memoryview nên audio được phục vụ thẳng từ page cache,
+    không copy vào heap của Python.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes or config.TTS_CACHE_DISK_BYTES
+        self._entries = OrderedDict()  # key -> số byte, cũ nhất ở đầu
+        self._used = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.pcm")
+
+    def _scan(self):
+        # Nạp các file còn lại từ lần chạy trước, thứ tự LRU theo mtime
+        found = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(".pcm"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue
+                found.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._used += size
+        self._evict()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size == 0:
+                    return None
+                pcm = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                self._entries[key] = size
+                self._used += size
+        return pcm
+
+    def put(self, key, pcm):
+        size = len(pcm)
+        if size > self.max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Ghi file tạm rồi đổi tên để không bao giờ đọc phải file ghi dở
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(pcm)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._used += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+        self._evict()
+
+    def _evict(self):
+        # Xóa file ít dùng nhất cho tới khi về dưới giới hạn.
+        # File đang được mmap vẫn đọc được sau khi xóa (chỉ mất tên)
+        while True:
+            with self._lock:
+                if self._used <= self.max_bytes or not self._entries:
+                    return
+                key, size = self._entries.popitem(last=False)
+                self._used -= size
+                self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        return {
+            'disk_entries': len(self._entries),
+            'disk_bytes': self._used,
+            'disk_evictions': self.evictions,
+        }
+
+class TTSCache:
+    """
+    Cache audio TTS hai tầng: LRU trong bộ nhớ (giới hạn theo byte) phía trước
+    DiskStore. Khóa là (text đã chuẩn hóa, voice, provider, sample rate);
+    giá trị là PCM 16-bit mono tại sample rate đó.
+    Chỉ câu tổng hợp trước hoặc câu đã được hỏi tới ít nhất disk_min_uses lần
+    mới được ghi xuống đĩa; câu trả lời dùng một lần chỉ nằm trong bộ nhớ.
+    """
+
+    def __init__(self, memory_bytes=None, directory=None, disk_bytes=None, disk_min_uses=None):
+        self.memory_bytes = memory_bytes or config.TTS_CACHE_MEMORY_BYTES
+        self.directory = directory or config.TTS_CACHE_DIR
+        self.disk_bytes = disk_bytes or config.TTS_CACHE_DISK_BYTES
+        self.disk_min_uses = disk_min_uses or config.TTS_CACHE_DISK_MIN_USES
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._uses = OrderedDict()  # key -> số lần được hỏi, giới hạn TTS_CACHE_USE_ENTRIES
+        self._disk = None
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def disk(self):
+        if self._disk is None and self.directory:
+            self._disk = DiskStore(self.directory, self.disk_bytes)
+        return self._disk
+
+    @staticmethod
+    def key(text, voice, provider, sample_rate):
+        normalized = ' '.join(text.split())
+        raw = json.dumps([normalized, voice, provider, sample_rate], ensure_ascii=False)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _lookup(self, key):
+        """(PCM trong bộ nhớ hoặc None, có cần ghi xuống đĩa không); đếm số lần được hỏi"""
+        with self._lock:
+            uses = self._uses.pop(key, 0) + 1
+            self._uses[key] = uses
+            if len(self._uses) > config.TTS_CACHE_USE_ENTRIES:
+                self._uses.popitem(last=False)
+            pcm = self._memory.get(key)
+            if pcm is None:
+                return None, False
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+        promote = uses >= self.disk_min_uses and self.disk is not None and key not in self.disk
+        return pcm, promote
+
+    def _from_disk(self, key):
+        pcm = self.disk.get(key) if self.disk else None
+        if pcm is None:
+            self.misses += 1
+            return None
+        self.disk_hits += 1
+        self._remember(key, pcm)
+        return pcm
+
+    def get(self, key):
+        """PCM (bytes hoặc memoryview) nếu có trong cache, ngược lại None. Đọc đĩa ngay tại chỗ"""
+        pcm, promote = self._lookup(key)
+        if pcm is not None:
+            if promote:
+                self.disk.put(key, pcm)
+            return pcm
+        return self._from_disk(key)
+
+    async def aget(self, key):
+        """Như get() nhưng open/mmap và ghi đĩa chạy ngoài event loop"""
+        pcm, promote = self._lookup(key)
+        if pcm is not None:
+            if promote:
+                # Không chờ: cache hit được phát ngay, file được ghi ở thread pool
+                asyncio.get_running_loop().run_in_executor(None, self.disk.put, key, pcm)
+            return pcm
+        return await asyncio.to_thread(self._from_disk, key)
+
+    def put(self, key, pcm, persist=False):
+        """persist=True (câu tổng hợp trước) luôn ghi xuống đĩa"""
+        if not pcm:
+            return
+        if self.disk and (persist or self._uses.get(key, 0) >= self.disk_min_uses):
+            self.disk.put(key, pcm)
+        self._remember(key, pcm)
+
+    def _remember(self, key, pcm):
+        size = len(pcm)
+        if size > self.memory_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_used -= len(old)
+            self._memory[key] = pcm
+            self._memory_used += size
+            while self._memory_used > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_used -= len(evicted)
+
+    def stats(self):
+        stats = {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'memory_entries': len(self._memory),
+            'memory_bytes': self._memory_used,
+        }
+        if self._disk is not None:
+            stats.update(self._disk.stats())
+        return stats
+
+# Cache dùng chung trong process
+tts_cache = TTSCache()
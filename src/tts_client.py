@@ -0,0 +1,120 @@
+import asyncio
+import base64
+from config.config import config
+from . import clients
+from . import tracing
+from .tts_cache import tts_cache
+from .tts_websocket import tts_websocket
+from .resample import StreamResampler
+
+class TTSClient:
+    """
+    Tổng hợp giọng nói thành PCM 16-bit mono tại sample_rate của cuộc gọi.
+    Mọi câu đều đi qua TTSCache trước; cache hit không gọi mạng.
+    """
+
+    def __init__(self, sample_rate=None, provider=None, cache=tts_cache, websocket=tts_websocket):
+        self.sample_rate = sample_rate or config.AUDIO_RATE
+        self.provider = provider or config.TTS_PROVIDER
+        self.cache = cache
+        if self.provider == "local":
+            self.voice = config.TTS_VOICE
+            self.websocket = websocket
+        else:
+            self.voice = config.TTS_OPENAI_VOICE
+
+    @property
+    def client(self):
+        return clients.async_openai()
+
+    def cache_key(self, text):
+        return self.cache.key(text, self.voice, self.provider, self.sample_rate)
+
+    async def synthesize(self, text, persist=False):
+        """PCM của cả câu"""
+        parts = [pcm async for pcm in self.stream(text, persist)]
+        if len(parts) == 1:
+            return parts[0]
+        return b''.join(parts)
+
+    async def stream(self, text, persist=False):
+        """PCM theo từng đoạn ngay khi provider trả về; lưu cả câu vào cache khi xong"""
+        tracing.mark("tts_sent")
+        key = self.cache_key(text)
+        pcm = await self.cache.aget(key)
+        if pcm is not None:
+            tracing.mark("tts_first_byte")
+            yield pcm
+            return
+
+        parts = []
+        complete = True
+        provider_stream = self._local_stream(text) if self.provider == "local" else self._openai_stream(text)
+        async for pcm in provider_stream:
+            if pcm is None:
+                # Provider báo lỗi một đoạn: vẫn phát phần còn lại nhưng không cache
+                complete = False
+                continue
+            parts.append(pcm)
+            tracing.mark("tts_first_byte")
+            yield pcm
+        if complete:
+            await asyncio.to_thread(self.cache.put, key, b''.join(parts), persist)
+
+    async def _openai_stream(self, text):
+        """Yêu cầu PCM thô và resample từng chunk ngay khi body HTTP về tới"""
+        resampler = StreamResampler(config.TTS_OPENAI_SAMPLE_RATE, self.sample_rate)
+        async with self.client.audio.speech.with_streaming_response.create(
+            model="tts-1",
+            voice=self.voice,
+            input=text,
+            response_format="pcm"
+        ) as response:
+            async for chunk in response.iter_bytes(config.TTS_STREAM_CHUNK_BYTES):
+                pcm = resampler.process(chunk)
+                if pcm:
+                    yield pcm
+        # Phần đuôi còn nằm trong bộ lọc resample
+        tail = resampler.flush()
+        if tail:
+            yield tail
+
+    async def _local_stream(self, text):
+        # TTS local trả về PCM tại AUDIO_RATE
+        resampler = StreamResampler(config.AUDIO_RATE, self.sample_rate)
+        request_data = {
+            "text": text,
+            "language": config.TTS_LANGUAGE,
+            "sample_file": self.voice
+        }
+        async for data in self.websocket.request(request_data):
+            if "error" in data:
+                raise RuntimeError(data['error'])
+
+            if data.get("status") == "error":
+                print(f"Lỗi xử lý câu: {data.get('error')}")
+                yield None
+                continue
+
+            # Giải mã base64 ngoài event loop để không chặn các cuộc gọi khác
+            pcm = await asyncio.to_thread(base64.b64decode, data["audio_base64"])
+            pcm = resampler.process(pcm)
+            if pcm:
+                yield pcm
+        tail = resampler.flush()
+        if tail:
+            yield tail
+
+    async def prerender(self, phrases, normalize=None):
+        """Tổng hợp trước các câu cố định (lời chào, câu báo lỗi...) vào cache"""
+        rendered = 0
+        for phrase in phrases:
+            text = normalize(phrase) if normalize else phrase
+            if not text or await self.cache.aget(self.cache_key(text)) is not None:
+                continue
+            try:
+                await self.synthesize(text, persist=True)
+                rendered += 1
+            except Exception as e:
+                print(f"Lỗi khi tổng hợp trước \"{phrase}\": {e}")
+        print(f"Đã tổng hợp trước {rendered}/{len(phrases)} câu vào TTS cache")
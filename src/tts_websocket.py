@@ -0,0 +1,132 @@
+import asyncio
+import json
+from collections import deque
+from config.config import config
+
+# Message báo request bị hủy do mất kết nối
+_DISCONNECTED = object()
+
+class TTSWebSocket:
+    """
+    Kết nối websocket dùng lâu dài tới TTS server local.
+    Nhiều request được gửi nối tiếp trên cùng một kết nối (pipelining); server
+    trả lời theo đúng thứ tự gửi nên message được chuyển cho request đầu hàng
+    đợi cho tới segment cuối (index == total - 1) rồi sang request kế tiếp.
+    Mất kết nối thì tự kết nối lại với backoff ở request sau.
+    """
+
+    def __init__(self, url=None, max_pending=None, reconnect_delay=None,
+                 max_reconnect_delay=None, connect_attempts=None):
+        self.url = url or config.TTS_WEBSOCKET_URL
+        self.max_pending = max_pending or config.TTS_WS_MAX_PENDING
+        self.reconnect_delay = reconnect_delay or config.TTS_WS_RECONNECT_DELAY
+        self.max_reconnect_delay = max_reconnect_delay or config.TTS_WS_MAX_RECONNECT_DELAY
+        self.connect_attempts = connect_attempts or config.TTS_WS_CONNECT_ATTEMPTS
+
+        self._ws = None
+        self._reader = None
+        self._pending = deque()      # Queue nhận message của từng request, theo thứ tự gửi
+        self._connect_lock = None
+        self._send_lock = None
+        self._slots = None
+        self.reconnects = 0
+
+    def _ensure_primitives(self):
+        # Tạo trong event loop đang chạy (client có thể được khởi tạo trước asyncio.run)
+        if self._slots is None:
+            self._connect_lock = asyncio.Lock()
+            self._send_lock = asyncio.Lock()
+            self._slots = asyncio.Semaphore(self.max_pending)
+
+    async def _connect(self):
+        import websockets
+
+        async with self._connect_lock:
+            if self._ws is not None:
+                return self._ws
+            delay = self.reconnect_delay
+            for attempt in range(1, self.connect_attempts + 1):
+                try:
+                    ws = await websockets.connect(self.url, max_size=None)
+                    break
+                except (OSError, websockets.WebSocketException) as e:
+                    if attempt == self.connect_attempts:
+                        raise ConnectionError(f"Không kết nối được TTS websocket: {e}") from e
+                    print(f"Lỗi kết nối TTS websocket ({e}), thử lại sau {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.max_reconnect_delay)
+            if self._reader is not None:
+                self.reconnects += 1
+            # Mỗi kết nối có hàng đợi request riêng, reader cũ không đụng tới request mới
+            self._ws = ws
+            self._pending = deque()
+            self._reader = asyncio.create_task(self._read_loop(ws, self._pending))
+            return ws
+
+    @staticmethod
+    def _is_last(data):
+        return "error" in data or data.get("index") == data.get("total", 0) - 1
+
+    async def _read_loop(self, ws, pending):
+        try:
+            async for message in ws:
+                data = json.loads(message)
+                if not pending:
+                    continue
+                pending[0].put_nowait(data)
+                if self._is_last(data):
+                    pending.popleft()
+        except Exception as e:
+            print(f"Mất kết nối TTS websocket: {e}")
+        finally:
+            if self._ws is ws:
+                self._ws = None
+            # Các request đang chờ trên kết nối này sẽ được gửi lại hoặc báo lỗi
+            while pending:
+                pending.popleft().put_nowait(_DISCONNECTED)
+
+    async def request(self, request_data):
+        """Gửi một request, yield từng message của request đó tới segment cuối"""
+        self._ensure_primitives()
+        async with self._slots:
+            for attempt in range(2):
+                ws = await self._connect()
+                queue = asyncio.Queue()
+                async with self._send_lock:
+                    # Gửi và xếp hàng phải cùng thứ tự với câu trả lời của server
+                    pending = self._pending
+                    pending.append(queue)
+                    try:
+                        await ws.send(json.dumps(request_data))
+                    except Exception:
+                        if queue in pending:
+                            pending.remove(queue)
+                        if self._ws is ws:
+                            self._ws = None
+                        if attempt:
+                            raise
+                        continue
+
+                received = False
+                while True:
+                    data = await queue.get()
+                    if data is _DISCONNECTED:
+                        break
+                    received = True
+                    yield data
+                    if self._is_last(data):
+                        return
+                # Chỉ gửi lại khi chưa nhận segment nào, tránh phát lặp audio
+                if received or attempt:
+                    raise ConnectionError("Mất kết nối TTS websocket giữa chừng")
+
+    async def aclose(self):
+        ws, self._ws = self._ws, None
+        if ws is not None:
+            await ws.close()
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+
+# Kết nối dùng chung trong process
+tts_websocket = TTSWebSocket()
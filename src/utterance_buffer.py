@@ -0,0 +1,43 @@
+import numpy as np
+from config.config import config
+
+class UtteranceBuffer:
+    """
+    Buffer PCM 16-bit mono của một utterance trên một mảng int16 cấp phát trước.
+    Mỗi frame được copy thẳng vào mảng (dung lượng nhân đôi khi đầy) thay vì
+    giữ list các bytes rồi join ở cuối, nên không tạo object mới cho mỗi gói.
+    """
+
+    def __init__(self, capacity=None):
+        self._data = np.empty(capacity or config.UTTERANCE_BUFFER_SAMPLES, dtype=np.int16)
+        self._length = 0
+
+    def __len__(self):
+        """Số byte PCM đang có"""
+        return self._length * 2
+
+    def __bool__(self):
+        return self._length > 0
+
+    def append(self, pcm):
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        end = self._length + len(samples)
+        if end > len(self._data):
+            grown = np.empty(max(end, 2 * len(self._data)), dtype=np.int16)
+            grown[:self._length] = self._data[:self._length]
+            self._data = grown
+        self._data[self._length:end] = samples
+        self._length = end
+
+    @property
+    def samples(self):
+        """Mảng int16 (view, không copy) của phần đã ghi"""
+        return self._data[:self._length]
+
+    def view(self):
+        """memoryview byte (không copy) của phần đã ghi, dùng trực tiếp như bytes"""
+        return memoryview(self._data[:self._length]).cast('B')
+
+    def clear(self):
+        """Xóa nội dung nhưng giữ lại mảng đã cấp phát"""
+        self._length = 0
@@ -0,0 +1,190 @@
+import numpy as np
+from config.config import config
+
+# Độ dài frame hợp lệ (ms) và sample rate mà webrtcvad hỗ trợ
+FRAME_MS_CHOICES = (10, 20, 30)
+WEBRTC_RATES = (8000, 16000, 32000, 48000)
+
+def frame_size(sample_rate, frame_ms):
+    """Số sample trong một frame frame_ms tại sample_rate"""
+    if frame_ms not in FRAME_MS_CHOICES:
+        raise ValueError(f"frame_ms phải là một trong {FRAME_MS_CHOICES}, nhận {frame_ms}")
+    samples = sample_rate * frame_ms // 1000
+    if samples * 1000 != sample_rate * frame_ms:
+        raise ValueError(f"{frame_ms} ms không chia hết tại {sample_rate} Hz")
+    return samples
+
+class VAD:
+    """
+    VAD theo frame.
+    Nhận PCM 16-bit mono với độ dài tùy ý, cắt thành các frame 10/20/30 ms
+    tại sample rate cấu hình và phân loại từng frame. Phần dư chưa đủ một
+    frame được giữ lại cho lần gọi sau.
+    """
+
+    def __init__(self, sample_rate, frame_ms=20):
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_samples = frame_size(sample_rate, frame_ms)
+        self.frame_bytes = self.frame_samples * 2
+        self._pending = b''
+        self.last_decision = False
+
+    def classify(self, frames):
+        """Phân loại mảng frame int16 dạng (n_frames, frame_samples), trả về mảng bool"""
+        raise NotImplementedError
+
+    def process(self, pcm):
+        """Đưa PCM vào VAD, trả về danh sách quyết định cho các frame hoàn chỉnh"""
+        if self._pending:
+            pcm = self._pending + bytes(pcm)
+        n_frames = len(pcm) // self.frame_bytes
+        used = n_frames * self.frame_bytes
+        self._pending = bytes(pcm[used:])
+        if n_frames == 0:
+            return []
+
+        frames = np.frombuffer(pcm, dtype=np.int16, count=used // 2).reshape(n_frames, self.frame_samples)
+        decisions = self.classify(frames).tolist()
+        self.last_decision = decisions[-1]
+        return decisions
+
+    def is_speech(self, pcm):
+        """Quyết định cho cả một chunk: có tiếng nói nếu bất kỳ frame nào có tiếng nói"""
+        decisions = self.process(pcm)
+        if not decisions:
+            return self.last_decision
+        return any(decisions)
+
+    def reset(self):
+        self._pending = b''
+        self.last_decision = False
+
+class EnergyVAD(VAD):
+    """VAD theo biên độ trung bình của frame, vector hóa bằng NumPy"""
+
+    def __init__(self, sample_rate, frame_ms=20, threshold=300):
+        super().__init__(sample_rate, frame_ms)
+        self.threshold = threshold
+
+    def classify(self, frames):
+        # Đổi sang int32 để abs(-32768) không bị tràn
+        return np.abs(frames.astype(np.int32)).mean(axis=1) > self.threshold
+
+class AdaptiveVAD(VAD):
+    """
+    VAD theo biên độ so với noise floor của chính cuộc gọi.
+    Noise floor là mức thấp nhất của các frame trong noise_window_ms gần nhất
+    (minimum statistics): tiếng ồn đều của đường dây dần thành nền, còn tiếng
+    nói luôn có khoảng lặng giữa các âm tiết nên không kéo nền lên. Có
+    hysteresis (ngưỡng bắt đầu onset_db cao hơn ngưỡng duy trì offset_db) và
+    hangover (giữ trạng thái tiếng nói thêm hangover_ms sau frame to cuối),
+    nên các quãng ngắt giữa hai từ không làm quyết định nhấp nháy.
+    """
+
+    def __init__(self, sample_rate, frame_ms=20, min_level=None, onset_db=None, offset_db=None,
+                 hangover_ms=None, noise_window_ms=None):
+        super().__init__(sample_rate, frame_ms)
+        self.min_level = min_level or config.VAD_MIN_LEVEL
+        onset_db = config.VAD_ONSET_DB if onset_db is None else onset_db
+        offset_db = config.VAD_OFFSET_DB if offset_db is None else offset_db
+        self.onset = 10 ** (onset_db / 20)
+        self.offset = 10 ** (offset_db / 20)
+        hangover_ms = config.VAD_HANGOVER_MS if hangover_ms is None else hangover_ms
+        self.hangover_frames = hangover_ms // frame_ms
+        noise_window_ms = noise_window_ms or config.VAD_NOISE_WINDOW_MS
+        self._levels = np.empty(max(1, noise_window_ms // frame_ms))
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        # Ô chưa có frame nào là vô cùng: nền là mức thấp nhất đã gặp kể từ lúc bắt đầu
+        self._levels.fill(np.inf)
+        self._pos = 0
+        self.noise_floor = 0.0
+        self._speech = False
+        self._hangover = 0
+
+    def classify(self, frames):
+        levels = np.abs(frames.astype(np.int32)).mean(axis=1).tolist()
+        # Mỗi chunk chỉ có vài frame: ghi từng mức vào ring rẻ hơn tạo mảng chỉ số
+        ring = self._levels
+        for level in levels:
+            ring[self._pos] = level
+            self._pos = (self._pos + 1) % len(ring)
+        self.noise_floor = float(ring.min())
+
+        onset = max(self.min_level, self.noise_floor * self.onset)
+        offset = max(self.min_level * self.offset / self.onset, self.noise_floor * self.offset)
+        decisions = np.empty(len(levels), dtype=bool)
+        for i, level in enumerate(levels):
+            if level > (offset if self._speech else onset):
+                self._speech = True
+                self._hangover = self.hangover_frames
+            elif self._speech:
+                if self._hangover > 0:
+                    self._hangover -= 1
+                else:
+                    self._speech = False
+            decisions[i] = self._speech
+        return decisions
+
+class WebRTCVAD(VAD):
+    """
+    VAD dùng webrtcvad.
+    Nếu sample rate không được webrtcvad hỗ trợ (vd. 24 kHz), mỗi frame
+    được resample về 16 kHz với cùng độ dài thời gian trước khi phân loại.
+    min_level (nếu có) là cổng năng lượng: frame có biên độ trung bình không
+    vượt min_level không được tính là tiếng nói dù webrtcvad nói có.
+    """
+
+    def __init__(self, sample_rate, frame_ms=20, aggressiveness=3, min_level=None):
+        super().__init__(sample_rate, frame_ms)
+        import webrtcvad
+        self.vad = webrtcvad.Vad(aggressiveness)
+        self.min_level = min_level
+
+        if sample_rate in WEBRTC_RATES:
+            self.vad_rate = sample_rate
+            self._positions = None
+        else:
+            self.vad_rate = 16000
+            # Nội suy tuyến tính: vị trí của từng sample đầu ra trong frame gốc
+            out_samples = frame_size(self.vad_rate, frame_ms)
+            self._positions = np.arange(out_samples) * (self.frame_samples / out_samples)
+            self._left = self._positions.astype(np.intp)
+            self._right = np.minimum(self._left + 1, self.frame_samples - 1)
+            self._weight = self._positions - self._left
+
+    def classify(self, frames):
+        loud = None
+        if self.min_level:
+            loud = np.abs(frames.astype(np.int32)).mean(axis=1) > self.min_level
+        if self._positions is not None:
+            left = frames[:, self._left].astype(np.float32)
+            right = frames[:, self._right].astype(np.float32)
+            frames = (left + (right - left) * self._weight).astype(np.int16)
+        decisions = np.fromiter(
+            (self.vad.is_speech(frame.tobytes(), self.vad_rate) for frame in frames),
+            dtype=bool, count=len(frames)
+        )
+        return decisions & loud if loud is not None else decisions
+
+def create_vad(sample_rate=None, mode=None, frame_ms=None, threshold=None):
+    """
+    Tạo VAD theo config (VAD_MODE: "adaptive", "energy" hoặc "webrtc").
+    Với "adaptive", threshold (nếu có) là mức tối thiểu để bắt đầu tiếng nói;
+    với "webrtc" là cổng năng lượng đặt trước quyết định của webrtcvad.
+    """
+    sample_rate = sample_rate or config.AUDIO_RATE
+    mode = mode or config.VAD_MODE
+    frame_ms = frame_ms or config.VAD_FRAME_MS
+
+    if mode == "adaptive":
+        return AdaptiveVAD(sample_rate, frame_ms, min_level=threshold)
+    if mode == "webrtc":
+        return WebRTCVAD(sample_rate, frame_ms, config.VAD_AGGRESSIVENESS, min_level=threshold)
+    threshold = threshold or config.SILENCE_THRESHOLD
+    if mode == "energy":
+        return EnergyVAD(sample_rate, frame_ms, threshold)
+    raise ValueError(f"VAD_MODE không hợp lệ: {mode}")
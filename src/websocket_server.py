@@ -3,13 +3,14 @@ import websockets
 from .audio_handler import AudioHandler
 from .speech_processor import SpeechProcessor
 from .chatbot_client import ChatbotClient
+from .chat_session import chat_sessions
 from config.config import config
 
 class CallbotServer:
     def __init__(self):
         self.audio_handler = AudioHandler()
         self.speech_processor = SpeechProcessor()
-        self.chatbot_client = ChatbotClient()
+        self.chatbot_client = ChatbotClient(config)
         
     async def handle_conversation(self, websocket):
         try:
@@ -25,7 +26,7 @@ class CallbotServer:
                     break
                 
                 # Lấy phản hồi từ chatbot
-                bot_response = await self.chatbot_client.get_response(user_text)
+                bot_response = await self.chatbot_client.get_response(user_text, chat_sessions.get(id(websocket)))
                 
                 # Chuyển đổi text to speech
                 audio_response = await self.speech_processor.text_to_speech(bot_response)
@@ -34,4 +35,6 @@ class CallbotServer:
                 self.audio_handler.play_audio(audio_response)
                 
         except Exception as e:
-            print(f"Error in conversation: {e}") 
\ No newline at end of file
+            print(f"Error in conversation: {e}")
+        finally:
+            chat_sessions.end(id(websocket)) 
\ No newline at end of file
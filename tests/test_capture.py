@@ -0,0 +1,54 @@
+import numpy as np
+from src.capture import UtteranceCapture
+
+RATE = 16000
+CHUNK = 320   # 20 ms
+
+def chunk(value):
+    return np.full(CHUNK, value, dtype=np.int16).tobytes()
+
+def capture(**kwargs):
+    options = dict(silence_ms=100, pre_roll_ms=40, max_utterance_ms=1000)
+    options.update(kwargs)
+    return UtteranceCapture(RATE, **options)
+
+def test_utterance_includes_pre_roll_and_ends_after_silence():
+    c = capture()
+    for value in (1, 2, 3):
+        assert c.push(chunk(value), False) == (None, None)
+    audio, utterance = c.push(chunk(9), True)
+    # Pre-roll 40 ms = hai chunk gần nhất, sau đó là chunk có tiếng nói
+    assert audio == chunk(2) + chunk(3) + chunk(9)
+    assert utterance is None
+    results = [c.push(chunk(0), False)[1] for _ in range(5)]
+    utterance = results[4]
+    assert results[:4] == [None] * 4
+    assert utterance == chunk(2) + chunk(3) + chunk(9) + chunk(0) * 5
+    assert not c.active
+    assert not c.forced
+
+def test_utterances_are_copied_out_of_a_reused_buffer():
+    c = capture()
+    store = c._buffer._data
+    c.push(chunk(5), True)
+    first = [c.push(chunk(0), False)[1] for _ in range(5)][-1]
+    c.push(chunk(7), True)
+    second = [c.push(chunk(0), False)[1] for _ in range(5)][-1]
+    assert isinstance(first, bytes) and isinstance(second, bytes)
+    assert first.startswith(chunk(5)) and second.startswith(chunk(7))
+    assert c._buffer._data is store
+
+def test_forced_split_keeps_the_turn_open():
+    c = capture(max_utterance_ms=200)
+    pieces = []
+    for _ in range(25):
+        _, utterance = c.push(chunk(4), True)
+        if utterance is not None:
+            pieces.append((len(utterance) // 2, c.forced))
+    assert pieces == [(3200, True), (3200, True)]
+    # Lượt nói vẫn mở: im lặng sau đó kết thúc đoạn cuối theo endpointer
+    assert c.active
+    results = [c.push(chunk(0), False)[1] for _ in range(5)]
+    assert results[-1] is not None and not c.forced
+    assert len(results[-1]) // 2 == 5 * CHUNK + 5 * CHUNK
+    assert c.forced_splits == 2
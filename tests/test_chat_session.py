@@ -0,0 +1,57 @@
+import asyncio
+import time
+import pytest
+from config.config import config
+from src.chat_session import ChatSessionManager
+from src.chatbot_client import ChatbotClient
+
+@pytest.fixture(autouse=True)
+def openai_bot(monkeypatch):
+    # Session OpenAI có ConversationMemory (đếm token)
+    monkeypatch.setattr(config, "BOT_TYPE", "openai")
+
+def test_running_token_total_matches_sessions_after_sweep():
+    manager = ChatSessionManager(ttl=60, max_sessions=10, max_tokens=10**6)
+    first = manager.get("a")
+    first.memory.append("user", "xin chào bạn")
+    second = manager.get("b")
+    second.memory.append("user", "tôi muốn đặt bàn tối nay")
+    manager.sweep()
+    assert manager.tokens == first.tokens + second.tokens
+    manager.end("a")
+    assert manager.tokens == second.tokens
+
+def test_sweep_frees_idle_sessions_without_new_calls():
+    manager = ChatSessionManager(ttl=0.01, max_sessions=10, max_tokens=10**6)
+    manager.get("a").memory.append("user", "xin chào")
+    time.sleep(0.02)
+    manager.sweep()
+    assert len(manager) == 0
+    assert manager.tokens == 0
+    assert manager.evicted == 1
+
+def test_token_limit_evicts_least_recently_used_first():
+    manager = ChatSessionManager(ttl=60, max_sessions=10, max_tokens=10**6)
+    manager.get("old").memory.append("user", "câu hỏi cũ")
+    new = manager.get("new")
+    new.memory.append("user", "câu hỏi mới")
+    manager.max_tokens = new.tokens
+    manager.sweep()
+    assert "old" not in manager
+    assert "new" in manager
+    assert manager.tokens == new.tokens
+
+def test_fallback_apology_is_not_saved_to_history(monkeypatch):
+    async def failing_tokens(self, session):
+        raise RuntimeError("API lỗi")
+        yield
+
+    monkeypatch.setattr(ChatbotClient, "_stream_openai_tokens", failing_tokens)
+    bot = ChatbotClient(config)
+    session = ChatSessionManager(ttl=60, max_sessions=10, max_tokens=10**6).get("a")
+
+    async def collect():
+        return [sentence async for sentence in bot.stream_response("xin chào", session)]
+
+    assert asyncio.run(collect()) == ["Xin lỗi, tôi đang gặp sự cố kỹ thuật."]
+    assert session.memory.last["role"] == "user"
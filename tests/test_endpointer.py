@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+from src.endpointer import Endpointer, estimate_pitch, falling_contour, sentence_complete
+
+RATE = 16000
+CHUNK = RATE // 50   # 20 ms
+
+def endpointer(**kwargs):
+    options = dict(silence_ms=500, short_silence_ms=200, prosody_ms=0, min_words=3)
+    options.update(kwargs)
+    return Endpointer(RATE, **options)
+
+def silence_until_end(endpointer, limit_ms=2000):
+    """Số ms im lặng tới khi endpointer báo hết lượt"""
+    for step in range(1, limit_ms // 20 + 1):
+        if endpointer.push(CHUNK, False):
+            return step * 20
+    return None
+
+@pytest.mark.parametrize("text, complete", [
+    ("Tôi muốn đặt bàn.", True),
+    ("Cho tôi hỏi giá vé nhé", True),
+    ("Bạn có rảnh không?", True),
+    ("Tôi muốn đặt bàn và", False),
+    ("Tôi muốn đặt bàn,", False),
+    ("Để tôi nghĩ...", False),
+    ("Tôi muốn", False),
+    ("", False),
+])
+def test_sentence_complete(text, complete):
+    assert sentence_complete(text) is complete
+
+def test_ends_after_silence_ms():
+    e = endpointer()
+    e.push(CHUNK, True)
+    assert silence_until_end(e) == 500
+
+def test_speech_restarts_the_silence_count():
+    e = endpointer()
+    e.push(CHUNK, True)
+    for _ in range(10):
+        assert not e.push(CHUNK, False)
+    e.push(CHUNK, True)
+    assert silence_until_end(e) == 500
+
+def test_single_punctuated_partial_does_not_shorten():
+    # Whisper gần như luôn thêm dấu chấm: một partial chưa đủ tin cậy
+    e = endpointer()
+    e.push(CHUNK, True)
+    e.push(CHUNK, False)
+    e.on_transcript("Tôi muốn đặt bàn.")
+    assert e.timeout_ms == 500
+
+def test_stable_complete_partial_shortens():
+    e = endpointer()
+    e.push(CHUNK, True)
+    e.push(CHUNK, False)
+    e.on_transcript("Tôi muốn đặt bàn.")
+    e.on_transcript("Tôi muốn đặt bàn")   # Cùng các từ, khác dấu câu
+    assert e.timeout_ms == 500            # Bản sau không có dấu kết câu
+    e.on_transcript("Tôi muốn đặt bàn.")
+    assert e.timeout_ms == 200
+    assert silence_until_end(e) == 180    # Đã im lặng 20 ms trước đó
+
+def test_short_partials_never_shorten():
+    e = endpointer()
+    e.push(CHUNK, True)
+    e.push(CHUNK, False)
+    e.on_transcript("Vâng ạ.")
+    e.on_transcript("Vâng ạ.")
+    assert e.timeout_ms == 500
+
+def test_partial_during_speech_only_counts_for_stability():
+    e = endpointer()
+    e.push(CHUNK, True)
+    e.on_transcript("Tôi muốn đặt bàn.")
+    assert e.timeout_ms == 500
+    e.push(CHUNK, False)
+    e.on_transcript("Tôi muốn đặt bàn.")
+    assert e.timeout_ms == 200
+
+def test_speech_after_partial_drops_the_hint():
+    e = endpointer()
+    e.push(CHUNK, True)
+    e.push(CHUNK, False)
+    e.on_transcript("Tôi muốn đặt bàn.")
+    e.on_transcript("Tôi muốn đặt bàn.")
+    e.push(CHUNK, True)
+    assert e.timeout_ms == 500
+
+def test_reset_forgets_previous_utterance():
+    e = endpointer()
+    e.push(CHUNK, True)
+    e.push(CHUNK, False)
+    e.on_transcript("Tôi muốn đặt bàn.")
+    e.reset()
+    e.push(CHUNK, True)
+    e.push(CHUNK, False)
+    e.on_transcript("Tôi muốn đặt bàn.")
+    assert e.timeout_ms == 500
+
+def voiced(pitch_start, pitch_end, seconds=0.4, amplitude=(8000, 8000)):
+    t = np.arange(int(RATE * seconds)) / RATE
+    pitch = np.linspace(pitch_start, pitch_end, len(t))
+    phase = 2 * np.pi * np.cumsum(pitch) / RATE
+    envelope = np.linspace(*amplitude, len(t))
+    # Vài họa âm cho giống giọng nói
+    signal = sum(np.sin(k * phase) / k for k in (1, 2, 3))
+    return (envelope * signal).astype(np.int16)
+
+def test_estimate_pitch():
+    assert estimate_pitch(voiced(200, 200, 0.05), RATE) == pytest.approx(200, rel=0.03)
+    assert estimate_pitch(np.random.default_rng(0).normal(0, 1000, 800).astype(np.int16), RATE) is None
+
+def test_falling_contour():
+    assert falling_contour(voiced(220, 150, amplitude=(9000, 4000)), RATE)
+    assert not falling_contour(voiced(150, 220, amplitude=(9000, 4000)), RATE)
+    assert not falling_contour(voiced(200, 200), RATE)
+
+def test_prosody_and_transcript_together_shorten():
+    e = endpointer(prosody_ms=400)
+    audio = voiced(220, 150, amplitude=(9000, 4000))
+    e.push(CHUNK, True)
+    e.push(CHUNK, False, np.concatenate((audio, np.zeros(CHUNK, dtype=np.int16))))
+    assert e.final_prosody
+    # Ngữ điệu một mình không đủ
+    assert e.timeout_ms == 500
+    e.on_transcript("Tôi muốn đặt bàn.")
+    assert e.timeout_ms == 200
+    assert e.reason == "transcript + ngữ điệu"
@@ -0,0 +1,27 @@
+from src.pipeline import FrameRing
+
+def frame(value, size=320):
+    return bytes([value]) * size
+
+def test_queued_frames_are_never_overwritten():
+    ring = FrameRing(max_frames=4, frame_bytes=320)
+    queued = []
+    for value in range(50):
+        # Hàng đợi giữ tối đa max_frames frame mới nhất (put_latest bỏ frame cũ nhất)
+        queued = (queued + [(value, ring.write(frame(value)))])[-4:]
+        for expected, (start, length) in queued:
+            assert bytes(ring.view(start, start + length)) == frame(expected)
+
+def test_consecutive_frames_are_contiguous_until_wraparound():
+    ring = FrameRing(max_frames=4, frame_bytes=320)
+    offsets = [ring.write(frame(value))[0] for value in range(7)]
+    assert offsets == [0, 320, 640, 960, 1280, 1600, 0]
+    assert bytes(ring.view(0, 640)) == frame(6) + frame(1)
+
+def test_larger_frame_grows_ring_and_keeps_pending_offsets():
+    ring = FrameRing(max_frames=4, frame_bytes=320)
+    start, length = ring.write(frame(1))
+    big_start, big_length = ring.write(frame(2, 960))
+    assert bytes(ring.view(start, start + length)) == frame(1)
+    assert bytes(ring.view(big_start, big_start + big_length)) == frame(2, 960)
+    assert ring.frame_bytes == 960
@@ -0,0 +1,105 @@
+import numpy as np
+from src.jitter_buffer import JitterBuffer
+from src.rtp_handler import RTPHeader
+
+RATE = 8000
+FRAME = 160   # 20 ms tại 8 kHz
+
+def header(seq, timestamp=None):
+    timestamp = seq * FRAME if timestamp is None else timestamp
+    return RTPHeader(seq & 0xFFFF, timestamp & 0xFFFFFFFF, 1, False, 0, 12)
+
+def payload(value):
+    return np.full(FRAME, value, dtype=np.int16).tobytes()
+
+def put(buffer, seq, timestamp=None, value=None):
+    # Mặc định mỗi frame mang giá trị 100 + seq để kiểm tra thứ tự (và frame che lỗi)
+    value = 100 + seq % 1000 if value is None else value
+    return [bytes(frame) for frame in buffer.put(header(seq, timestamp), payload(value), 0.02 * seq)]
+
+def values(frames):
+    return [int(np.frombuffer(frame, dtype=np.int16)[0]) - 100 for frame in frames]
+
+def test_in_order_packets_are_released_immediately():
+    buffer = JitterBuffer(RATE, min_depth=2)
+    out = []
+    for seq in range(5):
+        out += put(buffer, seq)
+    assert values(out) == [0, 1, 2, 3, 4]
+    assert buffer.lost == 0
+
+def test_reordered_packets_come_out_in_sequence():
+    buffer = JitterBuffer(RATE, min_depth=2)
+    out = []
+    for seq in (0, 2, 1, 3, 5, 4):
+        out += put(buffer, seq)
+    assert values(out) == [0, 1, 2, 3, 4, 5]
+    assert buffer.reordered == 2
+    assert buffer.lost == 0
+
+def test_missing_packet_is_concealed_after_target_depth():
+    buffer = JitterBuffer(RATE, min_depth=2, max_repeats=3)
+    out = []
+    for seq in (0, 1, 3, 4, 5):
+        out += put(buffer, seq)
+    assert buffer.lost == 1
+    # Gói 2 được che bằng frame 1 (101) giảm nửa âm lượng
+    assert values(out) == [0, 1, 50 - 100, 3, 4, 5]
+    assert buffer.concealed_samples == FRAME
+
+def test_late_and_duplicate_packets_are_dropped():
+    buffer = JitterBuffer(RATE, min_depth=2)
+    for seq in range(4):
+        put(buffer, seq)
+    assert put(buffer, 1) == []
+    assert buffer.late == 1
+    put(buffer, 6)
+    assert put(buffer, 6) == []
+    assert buffer.duplicates == 1
+
+def test_large_forward_jump_resyncs_without_concealing_the_gap():
+    buffer = JitterBuffer(RATE, min_depth=2, resync_packets=100)
+    for seq in range(10):
+        put(buffer, seq)
+    # SSRC khởi động lại ở sequence/timestamp khác xa
+    start = 20000
+    out = put(buffer, start, timestamp=12345)
+    assert out == []
+    out = []
+    for seq in range(start + 1, start + 5):
+        out += put(buffer, seq, timestamp=12345 + (seq - start) * FRAME)
+    assert values(out) == [(seq % 1000) for seq in range(start + 1, start + 5)]
+    assert buffer.resyncs == 1
+    assert buffer.lost == 0
+    assert buffer.concealed_samples == 0
+
+def test_large_backward_jump_resyncs_instead_of_dropping_everything_as_late():
+    buffer = JitterBuffer(RATE, min_depth=2, resync_packets=100)
+    for seq in range(5000, 5010):
+        put(buffer, seq)
+    out = []
+    for seq in range(100, 110):
+        out += put(buffer, seq)
+    # Chỉ gói đầu tiên (chưa được xác nhận) bị bỏ
+    assert values(out) == list(range(101, 110))
+    assert buffer.late == 1
+    assert buffer.resyncs == 1
+
+def test_single_stray_packet_does_not_resync():
+    buffer = JitterBuffer(RATE, min_depth=2, resync_packets=100)
+    out = []
+    for seq in range(10):
+        out += put(buffer, seq)
+    assert put(buffer, 30000) == []
+    for seq in range(10, 15):
+        out += put(buffer, seq)
+    assert values(out) == list(range(15))
+    assert buffer.resyncs == 0
+
+def test_sequence_wraparound_is_not_a_jump():
+    buffer = JitterBuffer(RATE, min_depth=2, resync_packets=100)
+    out = []
+    for seq in range(65530, 65540):
+        out += put(buffer, seq, value=100 + seq - 65530)
+    assert values(out) == list(range(10))
+    assert buffer.resyncs == 0
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from src.resample import StreamResampler, resample
+
+def tone(freq, rate, seconds=0.5, amplitude=10000):
+    t = np.arange(int(rate * seconds)) / rate
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.int16).tobytes()
+
+def rms(pcm):
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float64)
+    return np.sqrt(np.mean(samples ** 2))
+
+@pytest.mark.parametrize("src, dst", [(24000, 8000), (8000, 24000), (24000, 16000), (16000, 24000), (44100, 8000)])
+def test_length_follows_rate_ratio(src, dst):
+    pcm = tone(440, src)
+    out = resample(pcm, src, dst)
+    assert len(out) // 2 == round(len(pcm) // 2 * dst / src)
+
+@pytest.mark.parametrize("src, dst", [(24000, 8000), (8000, 24000), (24000, 16000)])
+def test_passband_tone_keeps_its_level(src, dst):
+    pcm = tone(440, src)
+    out = resample(pcm, src, dst)
+    # Bỏ phần đầu/cuối (bộ lọc khởi động)
+    middle = slice(len(out) // 4 * 2, len(out) * 3 // 4 // 2 * 2)
+    assert rms(out[middle]) == pytest.approx(rms(pcm), rel=0.02)
+
+def test_downsampling_rejects_aliases():
+    # 5 kHz không biểu diễn được ở 8 kHz: phải bị lọc thay vì thành alias 3 kHz
+    out = resample(tone(5000, 24000), 24000, 8000)
+    assert 20 * np.log10(rms(tone(5000, 24000)) / max(rms(out), 1e-9)) > 40
+
+@pytest.mark.parametrize("chunk", [1, 160, 1023, 4096])
+def test_streaming_in_chunks_matches_one_shot(chunk):
+    pcm = tone(700, 24000)
+    whole = StreamResampler(24000, 8000)
+    expected = whole.process(pcm) + whole.flush()
+    stream = StreamResampler(24000, 8000)
+    # Cả chunk lẻ số byte: nửa sample được giữ tới lần sau
+    pieces = [stream.process(pcm[i:i + chunk]) for i in range(0, len(pcm), chunk)]
+    assert b''.join(pieces) + stream.flush() == expected
+
+def test_round_trip_through_8k_is_transparent_below_nyquist():
+    pcm = resample(resample(tone(300, 24000), 24000, 8000), 8000, 24000)
+    again = resample(resample(pcm, 24000, 8000), 8000, 24000)
+    reference = np.frombuffer(pcm, dtype=np.int16).astype(np.float64)
+    signal = np.frombuffer(again, dtype=np.int16).astype(np.float64)
+    noise = np.sum((reference - signal)[1000:-1000] ** 2)
+    assert noise == 0 or 10 * np.log10(np.sum(reference[1000:-1000] ** 2) / noise) > 40
+
+def test_same_rate_is_a_copy():
+    pcm = tone(440, 8000)
+    assert resample(pcm, 8000, 8000) == pcm
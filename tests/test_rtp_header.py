@@ -0,0 +1,39 @@
+import struct
+from src.rtp_handler import RTP_HEADER_SIZE, build_rtp_header, parse_rtp_header, write_rtp_header
+
+def test_build_and_parse_round_trip():
+    packet = build_rtp_header(65535, 0xFFFFFFFF, 0x12345678, marker=1, payload_type=8) + b'payload'
+    header = parse_rtp_header(packet)
+    assert header.sequence_number == 65535
+    assert header.timestamp == 0xFFFFFFFF
+    assert header.ssrc == 0x12345678
+    assert header.marker == 1
+    assert header.payload_type == 8
+    assert packet[header.header_size:] == b'payload'
+
+def test_values_wrap_to_field_width():
+    header = parse_rtp_header(build_rtp_header(65536 + 7, 2 ** 32 + 9, payload_type=0))
+    assert (header.sequence_number, header.timestamp) == (7, 9)
+
+def test_write_matches_build():
+    buffer = bytearray(RTP_HEADER_SIZE + 4)
+    write_rtp_header(buffer, 10, 20, 30, marker=0, payload_type=0)
+    assert bytes(buffer[:RTP_HEADER_SIZE]) == build_rtp_header(10, 20, 30)
+
+def test_csrc_list_and_extension_are_skipped():
+    # 2 CSRC và một header extension dài 1 word
+    first_byte = (2 << 6) | 0x10 | 2
+    packet = struct.pack('!BBHII', first_byte, 0, 1, 2, 3) + bytes(8) + struct.pack('!HH', 0xBEDE, 1) + bytes(4)
+    header = parse_rtp_header(packet + b'audio')
+    assert header.header_size == RTP_HEADER_SIZE + 8 + 4 + 4
+    assert (packet + b'audio')[header.header_size:] == b'audio'
+
+def test_invalid_packets_are_rejected():
+    assert parse_rtp_header(b'') is None
+    assert parse_rtp_header(bytes(RTP_HEADER_SIZE - 1)) is None
+    # Version 1
+    assert parse_rtp_header(struct.pack('!BBHII', 1 << 6, 0, 1, 2, 3)) is None
+    # Khai báo CSRC nhưng gói bị cắt
+    assert parse_rtp_header(struct.pack('!BBHII', (2 << 6) | 3, 0, 1, 2, 3)) is None
+    # Khai báo extension nhưng thiếu header của extension
+    assert parse_rtp_header(struct.pack('!BBHII', (2 << 6) | 0x10, 0, 1, 2, 3)) is None
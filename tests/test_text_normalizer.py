@@ -0,0 +1,51 @@
+import re
+import pytest
+from src.text_normalizer import TextNormalizer
+
+def numbers(text):
+    # Phần đọc số và dấu câu không cần underthesea
+    return TextNormalizer.normalize_punctuation(TextNormalizer.normalize_numbers(text))
+
+@pytest.mark.parametrize("text, expected", [
+    ("3.5%", "ba phẩy năm phần trăm"),
+    ("2,75 triệu", "hai phẩy bảy mươi lăm triệu"),
+    ("0,05", "không phẩy không năm"),
+    ("12.5 kg", "mười hai phẩy năm kg"),
+    ("$3.99", "ba phẩy chín mươi chín đô la"),
+])
+def test_decimals_are_read_with_phay(text, expected):
+    assert numbers(text) == expected
+
+@pytest.mark.parametrize("text, expected", [
+    ("1.200.000", "một triệu hai trăm nghìn"),
+    ("1,200,000", "một triệu hai trăm nghìn"),
+    ("2.000.000.000đ", "hai tỷ đồng"),
+])
+def test_thousands_separators_are_not_decimals(text, expected):
+    assert numbers(text) == expected
+
+@pytest.mark.parametrize("number, expected", [
+    (0, "không"),
+    (5, "năm"),
+    (15, "mười lăm"),
+    (21, "hai mươi một"),
+    (105, "một trăm linh năm"),
+    (1005, "một nghìn không trăm linh năm"),
+    (1000000, "một triệu"),
+])
+def test_number_to_words(number, expected):
+    assert TextNormalizer.number_to_words(number) == expected
+
+def test_sentence_final_period_is_kept_after_numbers():
+    # Mỗi câu được tổng hợp riêng: dấu chấm cuối câu giữ nguyên, không còn chữ số hay dấu thập phân
+    text = numbers("Lãi suất là 3.5% một năm.")
+    assert text == "Lãi suất là ba phẩy năm phần trăm một năm ."
+    assert not re.search(r"\d", text)
+
+def test_dates_and_times():
+    assert numbers("Ngày 05/09/2024 lúc 14:30.") == (
+        "ngày năm tháng chín năm hai nghìn không trăm hai mươi bốn lúc mười bốn giờ ba mươi phút .")
+    assert numbers("31-12-2023") == "ngày ba mươi một tháng mười hai năm hai nghìn không trăm hai mươi ba"
+
+def test_phone_numbers_are_read_digit_by_digit():
+    assert numbers("0912 345 678") == "không chín một hai ba bốn năm sáu bảy tám"
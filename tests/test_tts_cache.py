@@ -0,0 +1,58 @@
+import asyncio
+import os
+from src.tts_cache import DiskStore, TTSCache
+
+def pcm(size, value=1):
+    return bytes([value]) * size
+
+def disk_files(directory):
+    return sorted(name for _, _, names in os.walk(directory) for name in names)
+
+def test_one_off_sentences_stay_in_memory(tmp_path):
+    cache = TTSCache(memory_bytes=10**6, directory=str(tmp_path), disk_min_uses=3)
+    key = cache.key("câu trả lời chỉ dùng một lần", "alloy", "openai", 8000)
+    assert cache.get(key) is None
+    cache.put(key, pcm(100))
+    assert disk_files(tmp_path) == []
+    assert bytes(cache.get(key)) == pcm(100)
+
+def test_prerendered_phrases_are_persisted(tmp_path):
+    cache = TTSCache(memory_bytes=10**6, directory=str(tmp_path))
+    cache.put("ab" * 20, pcm(100), persist=True)
+    assert disk_files(tmp_path) == ["ab" * 20 + ".pcm"]
+
+def test_phrase_seen_often_is_promoted_to_disk(tmp_path):
+    cache = TTSCache(memory_bytes=10**6, directory=str(tmp_path), disk_min_uses=3)
+    key = "cd" * 20
+    assert cache.get(key) is None
+    cache.put(key, pcm(100))
+    cache.get(key)
+    assert disk_files(tmp_path) == []
+    # Lần hỏi thứ ba ghi xuống đĩa
+    cache.get(key)
+    assert key in cache.disk
+    # Process mới đọc lại được từ đĩa
+    fresh = TTSCache(memory_bytes=10**6, directory=str(tmp_path))
+    assert bytes(fresh.get(key)) == pcm(100)
+    assert fresh.disk_hits == 1
+
+def test_disk_store_evicts_least_recently_used_by_bytes(tmp_path):
+    store = DiskStore(str(tmp_path), max_bytes=250)
+    store.put("aa" * 20, pcm(100, 1))
+    store.put("bb" * 20, pcm(100, 2))
+    store.get("aa" * 20)
+    store.put("cc" * 20, pcm(100, 3))
+    assert "bb" * 20 not in store
+    assert store.get("bb" * 20) is None
+    assert bytes(store.get("aa" * 20)) == pcm(100, 1)
+    assert store.stats() == {'disk_entries': 2, 'disk_bytes': 200, 'disk_evictions': 1}
+    # Giới hạn được áp dụng cả với file còn lại từ lần chạy trước
+    assert DiskStore(str(tmp_path), max_bytes=150).stats()['disk_entries'] == 1
+
+def test_aget_reads_disk_off_the_event_loop(tmp_path):
+    cache = TTSCache(memory_bytes=10**6, directory=str(tmp_path))
+    cache.put("ef" * 20, pcm(100), persist=True)
+    fresh = TTSCache(memory_bytes=10**6, directory=str(tmp_path))
+    assert bytes(asyncio.run(fresh.aget("ef" * 20))) == pcm(100)
+    assert asyncio.run(fresh.aget("00" * 20)) is None
+    assert (fresh.disk_hits, fresh.misses) == (1, 1)
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from src.vad import WebRTCVAD, create_vad
+
+RATE = 8000
+
+def voiced(peak, seconds=1):
+    # Âm hữu thanh tổng hợp: cơ bản 150 Hz và các họa âm
+    t = np.arange(RATE * seconds) / RATE
+    signal = sum(np.sin(2 * np.pi * f * t) / (k + 1) for k, f in enumerate((150, 300, 450, 600, 750)))
+    return (signal / np.abs(signal).max() * peak).astype(np.int16).tobytes()
+
+def test_webrtc_energy_gate_rejects_quiet_speech():
+    pytest.importorskip("webrtcvad")
+    # Biên độ trung bình khoảng 460: webrtcvad coi là tiếng nói, cổng 600 thì không
+    quiet = voiced(1000)
+    assert WebRTCVAD(RATE, 20, 0).is_speech(quiet)
+    assert not WebRTCVAD(RATE, 20, 0, min_level=600).is_speech(quiet)
+    assert WebRTCVAD(RATE, 20, 0, min_level=600).is_speech(voiced(1500))
+
+def test_create_vad_passes_barge_in_threshold_to_webrtc(monkeypatch):
+    pytest.importorskip("webrtcvad")
+    from config.config import config
+    monkeypatch.setattr(config, "VAD_MODE", "webrtc")
+    assert create_vad(RATE, threshold=600).min_level == 600
+    assert create_vad(RATE).min_level is None